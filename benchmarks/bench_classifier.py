@@ -0,0 +1,143 @@
+"""Failure classifier throughput, and the share of model calls it avoids.
+
+Usage: python benchmarks/bench_classifier.py [--logs DIR] [--extra-rules 1000,10000]
+
+Without --logs a synthetic corpus of error windows is used, mixing failures
+the bundled rules know with build and test errors they don't. With --logs
+every file of DIR is a job log, cut down to its error window first.
+--extra-rules adds that many made-up literal rules to show how throughput
+holds up as the rule set grows, next to a loop trying one pattern per rule.
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import failure_classifier  # noqa: E402
+from log_analyzer import cleanup_logs  # noqa: E402
+
+KNOWN_ERRORS = [
+    "FATAL ERROR: Reached heap limit Allocation failed - JavaScript heap out of memory",
+    "toomanyrequests: You have reached your pull rate limit. You may increase the limit by authenticating",
+    "ModuleNotFoundError: No module named 'yaml'",
+    "========= 3 failed, 412 passed, 2 skipped in 48.02s =========",
+    "npm ERR! code ETIMEDOUT",
+    'npm ERR! Missing script: "lint"',
+    "OSError: [Errno 28] No space left on device",
+    "##[error]The job running on runner GitHub Actions 12 has exceeded the maximum execution time of 360 minutes.",
+]
+UNKNOWN_ERRORS = [
+    "src/app.ts(12,5): error TS2322: Type 'string' is not assignable to type 'number'.",
+    "--- FAIL: TestParseConfig (0.00s)\n    config_test.go:41: expected 3 entries, got 2",
+    "error[E0308]: mismatched types\n  --> src/main.rs:14:9",
+    "Error: Input required and not supplied: token",
+    "ERROR: Could not find a version that satisfies the requirement torch==9.9",
+]
+
+
+def synthetic_window(error, lines):
+    body = [
+        f"2024-05-21T18:04:11.{i:07d}Z [{i}/{lines}] Compiling src/module_{i}.ts"
+        for i in range(lines)
+    ]
+    return "\n".join(
+        ["2024-05-21T18:04:10.0000000Z ##[group]Run make ci"]
+        + body
+        + [
+            f"2024-05-21T18:04:12.0000000Z {error}",
+            "2024-05-21T18:04:12.1000000Z ##[error]Process completed with exit code 1.",
+        ]
+    )
+
+
+def synthetic_corpus(count, lines):
+    rng = random.Random(0)
+    errors = KNOWN_ERRORS + UNKNOWN_ERRORS
+    return [synthetic_window(rng.choice(errors), lines) for _ in range(count)]
+
+
+def read_corpus(directory):
+    corpus = []
+    for name in sorted(os.listdir(directory)):
+        with open(os.path.join(directory, name), errors="replace") as f:
+            corpus.append(cleanup_logs(f.read(), name))
+    return corpus
+
+
+def extra_rules(count):
+    rng = random.Random(count)
+    return [
+        {
+            "name": f"extra-{i}",
+            "literals": [
+                f"E{rng.randrange(10**6):06d}: {rng.choice(['fault', 'abort', 'panic'])} in {rng.choice(['loader', 'linker', 'runtime'])}"
+            ],
+            "analysis": "",
+        }
+        for i in range(count)
+    ]
+
+
+def one_pattern_per_rule(rules):
+    patterns = []
+    for rule in rules:
+        parts = [re.escape(literal) for literal in rule.get("literals", [])]
+        if rule.get("regex"):
+            parts.append(rule["regex"])
+        patterns.append(re.compile("|".join(parts)))
+
+    def match(logs):
+        # the same part of the window the classifier looks at
+        logs = failure_classifier.error_tail(logs)
+        return next((p for p in patterns if p.search(logs)), None)
+
+    return match
+
+
+def throughput(match, corpus, size):
+    start = time.perf_counter()
+    matched = sum(1 for logs in corpus if match(logs) is not None)
+    elapsed = time.perf_counter() - start
+    return size / elapsed / 2**20, matched
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--logs", help="directory of job logs to use as the corpus")
+    parser.add_argument("--windows", type=int, default=2000)
+    parser.add_argument("--lines", type=int, default=200)
+    parser.add_argument("--extra-rules", default="1000,10000")
+    args = parser.parse_args()
+
+    if args.logs:
+        corpus = read_corpus(args.logs)
+    else:
+        corpus = synthetic_corpus(args.windows, args.lines)
+    size = sum(len(logs.encode()) for logs in corpus)
+    print(f"{len(corpus)} error windows, {size / 2**20:.1f}MB")
+
+    rules = failure_classifier.create_failure_classifier().rules
+    print(f"{'rules':>8} {'compile':>9} {'combined':>12} {'per rule':>12}")
+    for extra in [0] + [int(n) for n in args.extra_rules.split(",") if n]:
+        rule_set = rules + extra_rules(extra)
+        start = time.perf_counter()
+        classifier = failure_classifier.FailureClassifier(rule_set)
+        compiled = time.perf_counter() - start
+        combined, matched = throughput(classifier.match, corpus, size)
+        per_rule, _ = throughput(one_pattern_per_rule(rule_set), corpus, size)
+        print(
+            f"{len(rule_set):>8} {compiled:>8.2f}s {combined:>8.1f}MB/s {per_rule:>8.1f}MB/s"
+        )
+        if not extra:
+            avoided = matched
+
+    print(f"model calls avoided: {avoided}/{len(corpus)} ({avoided / len(corpus):.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""Measure event journal append throughput and fsync batching.
+
+Usage: python benchmarks/bench_journal.py [threads] [appends_per_thread]
+
+Appends the recorded workflow_job payload from many threads, each waiting for
+its record to be on disk like /webhook does, into a temporary directory.
+"""
+
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from event_journal import EventJournal  # noqa: E402
+
+PAYLOAD_PATH = os.path.join(
+    os.path.dirname(__file__), "payloads", "workflow_job_failure.json"
+)
+
+
+def main():
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    per_thread = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    with open(PAYLOAD_PATH) as f:
+        payload = json.load(f)
+
+    with tempfile.TemporaryDirectory() as directory:
+        journal = EventJournal(directory)
+        journal.open()
+
+        def append():
+            for _ in range(per_thread):
+                journal.append("workflow_job", payload)
+
+        workers = [threading.Thread(target=append) for _ in range(threads)]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - start
+        stats = journal.stats()
+
+    total = threads * per_thread
+    print(f"appends:          {total} in {elapsed:.2f}s")
+    print(f"throughput:       {total / elapsed:.0f} appends/s")
+    print(f"records / fsync:  {stats['records_per_fsync']}")
+    print(f"journal size:     {stats['bytes'] / 1024 ** 2:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Measure knowledge base open, lookup and sketch times as it grows.
+
+Usage: python benchmarks/bench_knowledge_base.py [entries]
+
+Fills a knowledge base in a temporary directory with random sketches (the
+SQLite rows are only read for matches, so they are left out), then times
+opening it and looking up a window, against the cost of sketching a window.
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from knowledge_base import RECORD, KnowledgeBase, simhash  # noqa: E402
+
+WINDOW = "\n".join(
+    [f"tests/test_app.py::test_case_{i} PASSED [{i}%]" for i in range(150)]
+    + [
+        ">   assert response.status_code == 200",
+        "E   assert 302 == 200",
+        "FAILED tests/test_app.py::test_login - assert 302 == 200",
+        "##[error]Process completed with exit code 1.",
+    ]
+)
+
+
+def timed(function, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    return (time.perf_counter() - start) / repeat * 1000, result
+
+
+def main():
+    entries = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    sketch_ms, sketch = timed(lambda: simhash(WINDOW), 20)
+    print(f"simhash of a {len(WINDOW.splitlines())}-line window: {sketch_ms:.2f}ms")
+
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as directory:
+        records = np.zeros(entries, dtype=RECORD)
+        records["sketch"] = rng.integers(0, 2**64, entries, dtype=np.uint64)
+        records["id"] = np.arange(1, entries + 1)
+        records.tofile(os.path.join(directory, "sketches.bin"))
+
+        open_ms, knowledge_base = timed(lambda: KnowledgeBase(directory), 20)
+        first_ms, _ = timed(lambda: knowledge_base.stats(), 1)
+        lookup_ms, _ = timed(lambda: knowledge_base.nearest(WINDOW, sketch=sketch), 20)
+        print(
+            f"{entries} entries: open {open_ms:.3f}ms, first map {first_ms:.2f}ms,"
+            f" lookup {lookup_ms:.2f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Compare peak memory and wall time of the buffered and streaming log paths.
+
+Usage: python benchmarks/bench_log_window.py [size_mb ...]   (default: 10 100 1024)
+"""
+
+import asyncio
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from log_analyzer import aiter_log_lines, extract_error_window_async  # noqa: E402
+
+CHUNK_SIZE = 64 * 1024
+LINE = b"2024-05-21T18:04:11.1234567Z npm info run build output line %d\n"
+
+
+def synthetic_chunks(size_mb):
+    # a group header every 500 lines, with the failure at the very end of the log
+    target = size_mb * 1024 * 1024
+    written = 0
+    buffer = []
+    buffered = 0
+    i = 0
+    while written + buffered < target:
+        if i % 500 == 0:
+            line = b"2024-05-21T18:04:11.1234567Z ##[group]Run step %d\n" % i
+        else:
+            line = LINE % i
+        buffer.append(line)
+        buffered += len(line)
+        i += 1
+        if buffered >= CHUNK_SIZE:
+            written += buffered
+            yield b"".join(buffer)
+            buffer = []
+            buffered = 0
+    buffer.append(
+        b"2024-05-21T18:04:12.0000000Z ##[error]Process completed with exit code 1.\n"
+    )
+    buffer.append(b"2024-05-21T18:04:12.1000000Z ##[group]Post job cleanup.\n")
+    yield b"".join(buffer)
+
+
+class SyntheticResponse:
+    encoding = "utf-8"
+
+    def __init__(self, size_mb):
+        self.size_mb = size_mb
+
+    async def iter_content(self, chunk_size):
+        # the shape of the aiohttp-backed streamed response
+        for chunk in synthetic_chunks(self.size_mb):
+            yield chunk
+
+
+def legacy_cleanup_logs(logs):
+    # the original implementation: hold the whole log, then scan it twice
+    logs = logs.split("\n")
+    group_indices = [i for i, line in enumerate(logs) if "##[group]" in line]
+    error_index = [i for i, line in enumerate(logs) if "##[error]" in line]
+    group_indices = [i for i in group_indices if i <= error_index[0]]
+    return "\n".join(logs[group_indices[-1] : error_index[0] + 1])
+
+
+def buffered(size_mb):
+    # what response.text followed by cleanup_logs does
+    text = b"".join(synthetic_chunks(size_mb)).decode("utf-8")
+    return legacy_cleanup_logs(text)
+
+
+def streaming(size_mb):
+    # the path fetch_error_window_async takes in production
+    lines = aiter_log_lines(SyntheticResponse(size_mb))
+    return asyncio.run(extract_error_window_async(lines, "bench"))
+
+
+def measure(func, size_mb):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(size_mb)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10, 100, 1024]
+    print(f"{'size':>8} {'mode':>10} {'time (s)':>10} {'peak (MB)':>10}")
+    for size_mb in sizes:
+        results = []
+        for name, func in [("buffered", buffered), ("streaming", streaming)]:
+            result, elapsed, peak = measure(func, size_mb)
+            results.append(result)
+            print(f"{size_mb:>6}MB {name:>10} {elapsed:>10.2f} {peak / 2**20:>10.1f}")
+        assert results[0] == results[1], "streaming window differs from cleanup_logs"
+
+
+if __name__ == "__main__":
+    main()
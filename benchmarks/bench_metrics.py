@@ -0,0 +1,67 @@
+"""Cost of recording metrics on the webhook path, and of rendering /metrics.
+
+Usage: python benchmarks/bench_metrics.py [iterations] [threads]
+"""
+
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from metrics import Registry  # noqa: E402
+
+
+def per_call(function, iterations, threads=1):
+    def run():
+        for _ in range(iterations):
+            function()
+
+    workers = [threading.Thread(target=run) for _ in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return (time.perf_counter() - start) / (iterations * threads) * 1e6
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    registry = Registry()
+    counter = registry.counter("retries_total", "Retries.", ("reason",))
+    histogram = registry.histogram(
+        "request_seconds", "Latency.", ("method", "endpoint", "status")
+    )
+
+    def timed():
+        with histogram.time("GET", "/repos/:owner/:repo/actions/jobs/:id/logs", "200"):
+            pass
+
+    cases = {
+        "counter.inc": lambda: counter.inc("status"),
+        "histogram.observe": lambda: histogram.observe(
+            0.042, "GET", "/repos/:owner/:repo/actions/jobs/:id/logs", "200"
+        ),
+        "histogram.time": timed,
+    }
+    print(f"{'':<20} {'1 thread':>10} {f'{threads} threads':>12}")
+    for name, function in cases.items():
+        single = per_call(function, iterations)
+        contended = per_call(function, iterations // threads, threads)
+        print(f"{name:<20} {single:>8.2f}us {contended:>10.2f}us")
+
+    for endpoint in range(200):
+        for status in ("200", "404", "502"):
+            histogram.observe(0.042, "GET", f"/endpoint/{endpoint}", status)
+    start = time.perf_counter()
+    text = registry.render()
+    print(
+        f"render: {len(text.splitlines())} lines in {(time.perf_counter() - start) * 1000:.1f}ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
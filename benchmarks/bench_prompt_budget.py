@@ -0,0 +1,78 @@
+"""Compare prompt size, and optionally model latency, before and after token budgeting.
+
+Usage: python benchmarks/bench_prompt_budget.py [--live] [budget]
+
+--live sends both prompts to OpenAI (needs OPENAI_API_KEY) to time the round trip.
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from token_budget import count_tokens, reduce_window  # noqa: E402
+
+WINDOW_LINES = [100, 1000, 10000, 50000]
+
+
+def synthetic_window(lines):
+    body = []
+    for i in range(lines):
+        if i % 10 == 0:
+            body.append("2024-05-21T18:04:11.1234567Z Downloading dependencies...")
+        else:
+            body.append(
+                f"2024-05-21T18:04:11.1234567Z [{i}/{lines}] Compiling src/module_{i}.ts"
+            )
+    return "\n".join(
+        ["2024-05-21T18:04:10.0000000Z ##[group]Run npm run build"]
+        + body
+        + [
+            "2024-05-21T18:04:12.0000000Z src/app.ts(12,5): error TS2322: Type 'string' is not assignable to type 'number'.",
+            "2024-05-21T18:04:12.1000000Z ##[error]Process completed with exit code 2.",
+        ]
+    )
+
+
+def time_completion(content):
+    import openai
+
+    openai.api_key = os.getenv("OPENAI_API_KEY")
+    start = time.perf_counter()
+    try:
+        openai.ChatCompletion.create(
+            model="gpt-3.5-turbo",
+            messages=[{"role": "user", "content": content}],
+            temperature=0,
+        )
+    except Exception as e:
+        return f"failed ({type(e).__name__})"
+    return f"{time.perf_counter() - start:.2f}s"
+
+
+def main():
+    args = sys.argv[1:]
+    live = "--live" in args
+    args = [arg for arg in args if arg != "--live"]
+    budget = int(args[0]) if args else 3000
+
+    header = (
+        f"{'lines':>7} {'tokens before':>14} {'tokens after':>13} {'reduce (ms)':>12}"
+    )
+    if live:
+        header += f" {'llm before':>12} {'llm after':>12}"
+    print(header)
+    for lines in WINDOW_LINES:
+        window = synthetic_window(lines)
+        start = time.perf_counter()
+        reduced = reduce_window(window, budget)
+        elapsed = (time.perf_counter() - start) * 1000
+        row = f"{lines:>7} {count_tokens(window):>14} {count_tokens(reduced):>13} {elapsed:>12.1f}"
+        if live:
+            row += f" {time_completion(window):>12} {time_completion(reduced):>12}"
+        print(row)
+
+
+if __name__ == "__main__":
+    main()
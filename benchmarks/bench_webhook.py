@@ -0,0 +1,99 @@
+"""Measure per-request CPU time and response size of /webhook on recorded payloads.
+
+Usage: python benchmarks/bench_webhook.py [iterations]
+
+Runs the webhook view in a request context with the journal and queue stubbed
+out, next to the previous handling that parsed the whole payload and echoed it
+back in the response. Successful jobs and comments without a mention are
+derived from the recorded payloads.
+"""
+
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+os.environ.setdefault("GITFAILGUARD_DATA_DIR", tempfile.mkdtemp())
+
+from flask import Flask, jsonify, request  # noqa: E402
+import webhook_handler  # noqa: E402
+
+PAYLOAD_DIR = os.path.join(os.path.dirname(__file__), "payloads")
+
+
+class StubJournal:
+    def append(self, kind, payload, entry_id=None):
+        json.dumps(payload)
+        return entry_id
+
+    def finish(self, entry_id, state):
+        pass
+
+
+class StubQueue:
+    def submit(self, kind, handler, *args):
+        return True
+
+
+def echoing_webhook():
+    # the handling before responses were made compact, for comparison
+    data = request.json
+    webhook_handler.journal.append("event", data, "id")
+    return jsonify({"status": "queued", "data": data}), 202
+
+
+def cases():
+    with open(os.path.join(PAYLOAD_DIR, "workflow_job_failure.json"), "rb") as f:
+        failed = f.read()
+    with open(os.path.join(PAYLOAD_DIR, "issue_comment.json"), "rb") as f:
+        mention = f.read()
+    return {
+        "workflow_job failure": ("workflow_job", failed),
+        "workflow_job success": (
+            "workflow_job",
+            failed.replace(b'"failure"', b'"success"'),
+        ),
+        "issue_comment mention": ("issue_comment", mention),
+        "issue_comment plain": (
+            "issue_comment",
+            mention.replace(b"@GitFailGuard", b"GitFailGuard"),
+        ),
+    }
+
+
+def measure(app, view, event, body, iterations):
+    sent = 0
+    start = time.process_time()
+    for i in range(iterations):
+        headers = {"X-GitHub-Event": event, "X-GitHub-Delivery": f"bench-{i}"}
+        with app.test_request_context(
+            "/webhook", data=body, content_type="application/json", headers=headers
+        ):
+            response, _ = view()
+            sent += len(response.get_data())
+    elapsed = time.process_time() - start
+    return elapsed / iterations * 1e6, sent // iterations
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    app = Flask(__name__)
+    webhook_handler.journal = StubJournal()
+    webhook_handler.job_queue = StubQueue()
+
+    print(f"{'':<24} {'echoing':>18} {'compact':>18}")
+    for name, (event, body) in cases().items():
+        webhook_handler.recent_deliveries.ids.clear()
+        before = measure(app, echoing_webhook, event, body, iterations)
+        webhook_handler.recent_deliveries.ids.clear()
+        after = measure(app, webhook_handler.webhook, event, body, iterations)
+        print(
+            f"{name:<24} {before[0]:>7.1f}us {before[1]:>6}B "
+            f"{after[0]:>7.1f}us {after[1]:>6}B"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Measure how shared work queue throughput grows with the number of replicas.
+
+Usage: python benchmarks/bench_work_queue.py [--events N] [--repos N] [--work SECONDS] [--redis URL]
+
+Each replica is a process claiming batches with a few threads, each batch taking
+--work seconds like an analysis waiting on GitHub and the model would. Uses a
+SQLite queue in a temporary directory, or Redis with --redis (its keys are left
+under a bench-* prefix).
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from work_queue import RedisWorkQueue, SqliteWorkQueue  # noqa: E402
+
+
+def open_queue(target):
+    if target.startswith("redis"):
+        import redis
+
+        prefix = target.rsplit("#", 1)[1]
+        client = redis.Redis.from_url(target.split("#")[0], decode_responses=True)
+        return RedisWorkQueue(client, prefix=prefix)
+    return SqliteWorkQueue(target)
+
+
+def replica(target, threads, work, batch_size):
+    work_queue = open_queue(target)
+    owner = uuid.uuid4().hex
+
+    def consume():
+        idle = 0
+        while idle < 3:
+            claimed = work_queue.claim(owner, batch_size)
+            if claimed is None:
+                idle += 1
+                time.sleep(0.05)
+                continue
+            idle = 0
+            key, events = claimed
+            time.sleep(work)
+            for event in events:
+                work_queue.finish(event["id"], key, "completed")
+            work_queue.release(key, owner)
+
+    workers = [threading.Thread(target=consume) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+
+def run(target, replicas, args):
+    work_queue = open_queue(target)
+    for i in range(args.events):
+        work_queue.put(
+            uuid.uuid4().hex, "workflow_job", f"org/repo-{i % args.repos}", {}
+        )
+    processes = [
+        multiprocessing.Process(
+            target=replica, args=(target, args.threads, args.work, args.batch_size)
+        )
+        for _ in range(replicas)
+    ]
+    start = time.perf_counter()
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    # the replicas idle 0.15s before noticing the queue is empty
+    return args.events / (time.perf_counter() - start - 0.15)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--events", type=int, default=2000)
+    parser.add_argument("--repos", type=int, default=200)
+    parser.add_argument("--work", type=float, default=0.05)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=1)
+    parser.add_argument("--replicas", default="1,2,4,8")
+    parser.add_argument("--redis")
+    args = parser.parse_args()
+
+    baseline = None
+    with tempfile.TemporaryDirectory() as directory:
+        for replicas in map(int, args.replicas.split(",")):
+            if args.redis:
+                target = f"{args.redis}#bench-{uuid.uuid4().hex[:8]}"
+            else:
+                target = os.path.join(directory, f"queue-{replicas}.sqlite3")
+            throughput = run(target, replicas, args)
+            baseline = baseline or throughput / replicas
+            print(
+                f"{replicas:>2} replicas: {throughput:>7.0f} events/s"
+                f" ({throughput / baseline / replicas:.0%} of linear)"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Replay recorded webhook payloads against a running GitFailGuard and report throughput.
+
+Usage: python benchmarks/load_test.py [--url URL] [--concurrency N] [--requests N] [--secret SECRET] [payload.json ...]
+
+Payloads default to benchmarks/payloads/*.json. Failed workflow_job payloads get
+queued for a full analysis, so point this at a test instance. Payloads are
+signed with --secret, GITHUB_WEBHOOK_SECRET by default, the way GitHub does.
+"""
+
+import argparse
+import glob
+import hashlib
+import hmac
+import json
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+PAYLOAD_DIR = os.path.join(os.path.dirname(__file__), "payloads")
+
+
+def load_payloads(paths):
+    payloads = []
+    for path in paths or sorted(glob.glob(os.path.join(PAYLOAD_DIR, "*.json"))):
+        with open(path, "rb") as f:
+            body = f.read()
+        data = json.loads(body)
+        event = "workflow_job" if "workflow_job" in data else "issue_comment"
+        payloads.append((event, body))
+    return payloads
+
+
+def sign(secret, body):
+    """X-Hub-Signature-256 header GitHub sends for body."""
+    digest = hmac.new(secret.encode("utf-8"), body, hashlib.sha256).hexdigest()
+    return f"sha256={digest}"
+
+
+def percentile(sorted_values, pct):
+    index = int(round((pct / 100) * (len(sorted_values) - 1)))
+    return sorted_values[index]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("payloads", nargs="*")
+    parser.add_argument("--url", default="http://localhost:5000/webhook")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument(
+        "--secret",
+        default=os.getenv("GITHUB_WEBHOOK_SECRET"),
+        help="webhook secret to sign payloads with (default: GITHUB_WEBHOOK_SECRET)",
+    )
+    args = parser.parse_args()
+
+    payloads = load_payloads(args.payloads)
+    # the body is the same for every request, so is its signature
+    signatures = [
+        sign(args.secret, body) if args.secret else None for _, body in payloads
+    ]
+    local = threading.local()
+    latencies = []
+    statuses = Counter()
+    lock = threading.Lock()
+
+    def send(i):
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        event, body = payloads[i % len(payloads)]
+        headers = {
+            "Content-Type": "application/json",
+            "X-GitHub-Event": event,
+            "X-GitHub-Delivery": f"load-test-{i}-{time.time_ns()}",
+        }
+        signature = signatures[i % len(payloads)]
+        if signature:
+            headers["X-Hub-Signature-256"] = signature
+        start = time.perf_counter()
+        try:
+            status = local.session.post(
+                args.url, data=body, headers=headers, timeout=30
+            ).status_code
+        except requests.RequestException as e:
+            status = type(e).__name__
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            statuses[status] += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        list(pool.map(send, range(args.requests)))
+    duration = time.perf_counter() - start
+
+    latencies.sort()
+    print(f"requests:    {len(latencies)} in {duration:.2f}s")
+    print(f"throughput:  {len(latencies) / duration:.1f} req/s")
+    print(f"latency p50: {percentile(latencies, 50) * 1000:.1f} ms")
+    print(f"latency p99: {percentile(latencies, 99) * 1000:.1f} ms")
+    print(f"latency max: {latencies[-1] * 1000:.1f} ms")
+    print(f"statuses:    {dict(statuses)}")
+
+
+if __name__ == "__main__":
+    main()
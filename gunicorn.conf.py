@@ -0,0 +1,47 @@
+# Production server settings, used by the Dockerfile:
+#   gunicorn --config gunicorn.conf.py
+import multiprocessing
+import os
+
+chdir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "src")
+wsgi_app = "main:app"
+bind = os.getenv("BIND", "0.0.0.0:5000")
+
+# webhook requests only enqueue work, so a few processes with threads are plenty
+worker_class = "gthread"
+workers = int(os.getenv("GUNICORN_WORKERS", min(multiprocessing.cpu_count(), 4)))
+threads = int(os.getenv("GUNICORN_THREADS", 8))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", 5))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 30))
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", 0))
+
+# on SIGTERM, let queued and running analyses finish before the worker exits
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", 120))
+
+accesslog = "-"
+errorlog = "-"
+
+
+def worker_exit(server, worker):
+    drain(worker)
+
+
+def drain(worker):
+    from async_runtime import run_sync
+    from github_client import close_async_session
+    from webhook_handler import consumer, job_queue
+
+    if not job_queue.accepting:
+        return
+    if consumer is not None:
+        # claimed batches finish below, anything else is left to other replicas
+        consumer.stop()
+    worker.log.info("Draining webhook queue (%s events)", job_queue.queue.qsize())
+    # leave a little time before the arbiter kills the worker
+    if job_queue.shutdown(timeout=max(graceful_timeout - 5, 1)):
+        worker.log.info("Webhook queue drained")
+    else:
+        worker.log.warning(
+            "Webhook queue not drained, %s events lost", job_queue.queue.qsize()
+        )
+    run_sync(close_async_session())
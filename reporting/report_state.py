@@ -0,0 +1,120 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+
+class ReportState:
+    """State kept between report runs: HTTP validators, repo cursors and PR summaries."""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS http_cache (
+                key TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, body TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS cursors (
+                repo TEXT PRIMARY KEY, updated_at TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS pr_summaries (
+                key TEXT PRIMARY KEY, fingerprint TEXT NOT NULL, summary TEXT NOT NULL,
+                insights TEXT, participants TEXT
+            );
+            """)
+        self.counters = {"not_modified": 0, "fetched": 0, "reused_prs": 0}
+
+    def get_validators(self, key):
+        with self.lock:
+            return self.conn.execute(
+                "SELECT etag, last_modified, body FROM http_cache WHERE key = ?", (key,)
+            ).fetchone()
+
+    def set_validators(self, key, etag, last_modified, body):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO http_cache (key, etag, last_modified, body)"
+                " VALUES (?, ?, ?, ?)",
+                (key, etag, last_modified, body),
+            )
+            self.conn.commit()
+
+    def get_cursor(self, repo):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT updated_at FROM cursors WHERE repo = ?", (repo,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def set_cursor(self, repo, updated_at):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO cursors (repo, updated_at) VALUES (?, ?)",
+                (repo, updated_at),
+            )
+            self.conn.commit()
+
+    def since(self, repo, default):
+        """Time from which a repository's PR activity is new, the cursor or default if later."""
+        cursor = self.get_cursor(repo)
+        if cursor is None:
+            return default
+        cursor = datetime.strptime(cursor, TIMESTAMP_FORMAT).replace(
+            tzinfo=timezone.utc
+        )
+        return max(cursor, default)
+
+    def get_pr_summary(self, repo, pr, comments):
+        """Cached (summary, insights, participants) if the PR's body and comments didn't change since."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT fingerprint, summary, insights, participants FROM pr_summaries"
+                " WHERE key = ?",
+                (f"{repo}#{pr['number']}",),
+            ).fetchone()
+        if row is None or row[0] != pr_fingerprint(pr, comments):
+            return None
+        _, summary, insights, participants = row
+        insights = json.loads(insights) if insights else None
+        participants = set(json.loads(participants)) if participants else None
+        self.count("reused_prs")
+        return summary, insights, participants
+
+    def set_pr_summary(self, repo, pr, comments, summary, insights, participants):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO pr_summaries"
+                " (key, fingerprint, summary, insights, participants)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (
+                    f"{repo}#{pr['number']}",
+                    pr_fingerprint(pr, comments),
+                    summary,
+                    json.dumps(insights) if insights else None,
+                    json.dumps(sorted(participants)) if participants else None,
+                ),
+            )
+            self.conn.commit()
+
+    def count(self, name):
+        with self.lock:
+            self.counters[name] += 1
+
+
+def pr_fingerprint(pr, comments):
+    # only what the summaries are made of: updated_at also moves with labels,
+    # reviewers and pushes, which don't change either summary
+    digest = hashlib.sha256()
+    digest.update((pr["body"] or "").encode("utf-8"))
+    for comment in sorted(comments, key=lambda comment: comment["id"]):
+        digest.update(f"\0{comment['id']}\0{comment.get('updated_at')}".encode("utf-8"))
+    return digest.hexdigest()
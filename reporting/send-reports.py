@@ -1,9 +1,23 @@
+import json
 import os
 import requests
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
+from urllib.parse import urlencode
 import openai  # Import OpenAI library
 
+# Share the pooled GitHub client with the webhook service
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+)
+from github_client import github_get, set_default_priority, BATCH
+
+# Reports yield GitHub quota to the interactive webhook service sharing the token
+set_default_priority(BATCH)
+
+from report_state import ReportState
+
 # Replace 'ORGANIZATION' with your GitHub organization name
 ORGANIZATION = "ff14-advanced-market-search"
 
@@ -43,11 +57,52 @@ if not DISCORD_WEBHOOK_URL and not SLACK_WEBHOOK and not MS_TEAMS_WEBHOOK:
 # Set OpenAI API key
 openai.api_key = OPENAI_API_KEY
 
-# HTTP headers for authentication
-HEADERS = {
-    "Authorization": f"token {GITHUB_TOKEN}",
-    "Accept": "application/vnd.github.v3+json",
-}
+# Concurrent GitHub requests and OpenAI completions, limited separately
+GITHUB_CONCURRENCY = int(os.environ.get("REPORT_GITHUB_CONCURRENCY", 8))
+OPENAI_CONCURRENCY = int(os.environ.get("REPORT_OPENAI_CONCURRENCY", 4))
+# PRs being assembled at once, these threads mostly wait on the two pools above
+PR_CONCURRENCY = int(os.environ.get("REPORT_PR_CONCURRENCY", 32))
+
+# Send one batch of notifications per "repo" or a single one for the whole "org"
+REPORT_BATCH_SCOPE = os.environ.get("REPORT_BATCH_SCOPE", "repo")
+
+# ETags, cursors and summaries from previous runs, so unchanged PRs cost nothing
+REPORT_STATE_PATH = os.environ.get(
+    "REPORT_STATE_PATH",
+    os.path.join(
+        os.environ.get("GITFAILGUARD_DATA_DIR", "data"), "report-state.sqlite3"
+    ),
+)
+state = ReportState(REPORT_STATE_PATH)
+
+
+def conditional_get_json(url, params=None):
+    """GET a JSON listing, revalidating the copy from the last run with its ETag.
+
+    304 responses don't count against the GitHub rate limit.
+    """
+    key = f"{url}?{urlencode(sorted((params or {}).items()))}"
+    cached = state.get_validators(key)
+    headers = {}
+    if cached:
+        etag, last_modified, _ = cached
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+    response = github_get(url, params=params, headers=headers)
+    if response.status_code == 304 and cached:
+        state.count("not_modified")
+        return json.loads(cached[2])
+    response.raise_for_status()
+    state.count("fetched")
+    state.set_validators(
+        key,
+        response.headers.get("ETag"),
+        response.headers.get("Last-Modified"),
+        response.text,
+    )
+    return response.json()
 
 
 def get_repositories():
@@ -56,9 +111,7 @@ def get_repositories():
     page = 1
     while True:
         params = {"per_page": 100, "page": page}
-        response = requests.get(REPOS_URL, headers=HEADERS, params=params)
-        response.raise_for_status()
-        page_repos = response.json()
+        page_repos = conditional_get_json(REPOS_URL, params=params)
         if not page_repos:
             break
         repos.extend(page_repos)
@@ -71,10 +124,14 @@ def get_repositories():
 
 
 def get_pull_requests(owner, repo):
-    """Fetch all pull requests for a repository that had activity in the past week."""
+    """Fetch the pull requests of a repository with activity since its last report.
+
+    That is the past day at most, and nothing when no PR changed since the
+    previous run, in which case only the first page is fetched.
+    """
     prs = []
     page = 1
-    one_week_ago = datetime.now(timezone.utc) - timedelta(days=1)
+    since = state.since(repo, datetime.now(timezone.utc) - timedelta(days=1))
     pulls_url = f"https://api.github.com/repos/{owner}/{repo}/pulls"
     while True:
         params = {
@@ -84,9 +141,7 @@ def get_pull_requests(owner, repo):
             "sort": "updated",
             "direction": "desc",
         }
-        response = requests.get(pulls_url, headers=HEADERS, params=params)
-        response.raise_for_status()
-        page_prs = response.json()
+        page_prs = conditional_get_json(pulls_url, params=params)
         if not page_prs:
             break
 
@@ -94,14 +149,14 @@ def get_pull_requests(owner, repo):
             updated_at = datetime.strptime(
                 pr["updated_at"], "%Y-%m-%dT%H:%M:%SZ"
             ).replace(tzinfo=timezone.utc)
-            if updated_at >= one_week_ago:
+            if updated_at > since:
                 prs.append(pr)
             else:
                 # Since the PRs are sorted by updated_at descending, we can break early
                 break
 
-        # Check if we've reached PRs older than one week
-        if updated_at < one_week_ago:
+        # Check if we've reached PRs already covered by an earlier report
+        if updated_at <= since:
             break
 
         page += 1
@@ -114,9 +169,7 @@ def get_issue_comments(owner, repo, pr_number):
     comments_url = (
         f"https://api.github.com/repos/{owner}/{repo}/issues/{pr_number}/comments"
     )
-    response = requests.get(comments_url, headers=HEADERS)
-    response.raise_for_status()
-    return response.json()
+    return conditional_get_json(comments_url)
 
 
 def get_review_comments(owner, repo, pr_number):
@@ -124,9 +177,7 @@ def get_review_comments(owner, repo, pr_number):
     comments_url = (
         f"https://api.github.com/repos/{owner}/{repo}/pulls/{pr_number}/comments"
     )
-    response = requests.get(comments_url, headers=HEADERS)
-    response.raise_for_status()
-    return response.json()
+    return conditional_get_json(comments_url)
 
 
 def is_stale(pr):
@@ -137,6 +188,10 @@ def is_stale(pr):
     return datetime.now(timezone.utc) - last_updated > timedelta(days=30)
 
 
+SUMMARY_UNAVAILABLE = "Summary not available."
+CONVERSATIONS_UNAVAILABLE = "Conversations summary not available."
+
+
 def summarize_text(text, max_tokens=150):
     """Use OpenAI API to summarize text."""
     try:
@@ -156,7 +211,7 @@ def summarize_text(text, max_tokens=150):
         return summary
     except Exception as e:
         print(f"Error summarizing text: {e}")
-        return "Summary not available."
+        return SUMMARY_UNAVAILABLE
 
 
 def summarize_conversations(comments):
@@ -211,216 +266,389 @@ def summarize_conversations(comments):
         return insights[:4], participants  # Limit to 4 insights
     except Exception as e:
         print(f"Error summarizing conversations: {e}")
-        return ["Conversations summary not available."], participants
-
+        return [CONVERSATIONS_UNAVAILABLE], participants
 
-def send_to_slack(repo_name, report_sections):
-    """Send the report to Slack via webhook."""
-    if not SLACK_WEBHOOK:
-        return  # Do nothing if Slack webhook is not set
-
-    MAX_BLOCKS_PER_MESSAGE = 50
-    blocks = []
-
-    for section in report_sections:
-        # Header block with PR title and state icon
-        blocks.append(
-            {
-                "type": "section",
-                "text": {
-                    "type": "mrkdwn",
-                    "text": f"*<{section.get('url')}|{section.get('title')}>*",
-                },
-            }
-        )
-        # Summary
-        for field in section.get("fields", []):
-            if field["name"] == "Summary":
-                blocks.append(
-                    {
-                        "type": "section",
-                        "text": {
-                            "type": "mrkdwn",
-                            "text": f"*Summary:*\n{field['value']}",
-                        },
-                    }
-                )
-        # Blockers
-        for field in section.get("fields", []):
-            if field["name"] == "Blockers":
-                blocks.append(
-                    {
-                        "type": "section",
-                        "text": {
-                            "type": "mrkdwn",
-                            "text": f"*Blockers:*\n{field['value']}",
-                        },
-                    }
-                )
-        # Conversations
-        for field in section.get("fields", []):
-            if field["name"].startswith("Conversations"):
-                blocks.append(
-                    {
-                        "type": "section",
-                        "text": {
-                            "type": "mrkdwn",
-                            "text": f"*{field['name']}:*\n{field['value']}",
-                        },
-                    }
-                )
-        # Divider
-        blocks.append({"type": "divider"})
-
-        # If blocks reach the limit, send the message and reset the list
-        if len(blocks) >= MAX_BLOCKS_PER_MESSAGE:
-            data = {"username": "GitHub PR Reporter", "blocks": blocks}
-            try:
-                response = requests.post(SLACK_WEBHOOK, json=data)
-                response.raise_for_status()
-            except requests.exceptions.HTTPError as http_err:
-                print(
-                    f"HTTP error occurred when sending to Slack: {http_err} - {response.text}"
-                )
-            except Exception as err:
-                print(f"An error occurred when sending to Slack: {err}")
-            else:
-                print("Successfully sent message to Slack")
-            blocks = []
 
-    # Send any remaining blocks
-    if blocks:
-        data = {"username": "GitHub PR Reporter", "blocks": blocks}
+def post_messages(sink, webhook_url, messages):
+    """Post a list of messages to a webhook, returning how many messages and bytes went out."""
+    stats = {"messages": 0, "bytes": 0, "failed": 0}
+    for idx, message in enumerate(messages):
+        body = json.dumps(message).encode("utf-8")
         try:
-            response = requests.post(SLACK_WEBHOOK, json=data)
+            response = requests.post(
+                webhook_url,
+                data=body,
+                headers={"Content-Type": "application/json"},
+                timeout=30,
+            )
             response.raise_for_status()
         except requests.exceptions.HTTPError as http_err:
             print(
-                f"HTTP error occurred when sending to Slack: {http_err} - {response.text}"
+                f"HTTP error occurred when sending message {idx+1} to {sink}: {http_err} - {response.text}"
             )
+            stats["failed"] += 1
         except Exception as err:
-            print(f"An error occurred when sending to Slack: {err}")
+            print(f"An error occurred when sending message {idx+1} to {sink}: {err}")
+            stats["failed"] += 1
         else:
-            print("Successfully sent message to Slack")
+            print(f"Successfully sent message {idx+1} to {sink}")
+            stats["messages"] += 1
+            stats["bytes"] += len(body)
+    return stats
+
+
+def slack_blocks(section):
+    """Slack blocks of one report section."""
+    # Header block with PR title and state icon
+    blocks = [
+        {
+            "type": "section",
+            "text": {
+                "type": "mrkdwn",
+                "text": f"*<{section.get('url')}|{section.get('title')}>*",
+            },
+        }
+    ]
+    fields = section.get("fields", [])
+    # Summary, then Blockers, then Conversations
+    for field in fields:
+        if field["name"] == "Summary":
+            blocks.append(slack_text_block(f"*Summary:*\n{field['value']}"))
+    for field in fields:
+        if field["name"] == "Blockers":
+            blocks.append(slack_text_block(f"*Blockers:*\n{field['value']}"))
+    for field in fields:
+        if field["name"].startswith("Conversations"):
+            blocks.append(slack_text_block(f"*{field['name']}:*\n{field['value']}"))
+    # Divider
+    blocks.append({"type": "divider"})
+    return blocks
+
+
+def slack_text_block(text):
+    # Slack rejects section text over 3000 characters
+    return {"type": "section", "text": {"type": "mrkdwn", "text": truncate(text, 3000)}}
+
+
+def truncate(text, limit):
+    """Cut text to at most limit characters, marking the cut."""
+    if text is None or len(text) <= limit:
+        return text
+    return text[: limit - 1] + "…"
+
+
+def slack_messages(report_sections):
+    """Pack report sections into as few Slack messages as the 50 block limit allows."""
+    MAX_BLOCKS_PER_MESSAGE = 50
+    messages = []
+    blocks = []
+    for section in report_sections:
+        section_blocks = slack_blocks(section)
+        # Keep the blocks of a PR together in one message
+        if blocks and len(blocks) + len(section_blocks) > MAX_BLOCKS_PER_MESSAGE:
+            messages.append({"username": "GitHub PR Reporter", "blocks": blocks})
+            blocks = []
+        blocks.extend(section_blocks[:MAX_BLOCKS_PER_MESSAGE])
+    if blocks:
+        messages.append({"username": "GitHub PR Reporter", "blocks": blocks})
+    return messages
+
+
+def discord_embed(section):
+    # Discord caps titles and field names at 256 characters and values at 1024,
+    # so one embed always fits in a message
+    fields = [
+        {
+            **field,
+            "name": truncate(field["name"], 256),
+            "value": truncate(field["value"], 1024),
+        }
+        for field in section.get("fields") or []
+    ]
+    return {
+        "title": truncate(section.get("title"), 256),
+        "url": section.get("url"),
+        "color": section.get("color"),
+        "fields": fields,
+        "footer": {"text": f"Repository: {section.get('repo')}"},
+    }
 
 
-def send_to_discord(repo_name, report_sections):
-    """Send the report to Discord via webhook."""
-    if not DISCORD_WEBHOOK_URL:
-        return  # Do nothing if Discord webhook is not set
+def discord_embed_size(embed):
+    """Characters counted against Discord's 6000 character limit per message."""
+    size = len(embed["title"] or "") + len(embed["footer"]["text"])
+    for field in embed["fields"] or []:
+        size += len(field["name"]) + len(field["value"])
+    return size
+
 
+def discord_messages(report_sections):
+    """Pack report sections into messages of at most 10 embeds and 6000 characters."""
     MAX_EMBEDS_PER_MESSAGE = 10
-    embeds_list = [
-        report_sections[i : i + MAX_EMBEDS_PER_MESSAGE]
-        for i in range(0, len(report_sections), MAX_EMBEDS_PER_MESSAGE)
-    ]
+    MAX_CHARS_PER_MESSAGE = 6000
+    messages = []
+    embeds = []
+    chars = 0
+    for section in report_sections:
+        embed = discord_embed(section)
+        size = discord_embed_size(embed)
+        if embeds and (
+            len(embeds) >= MAX_EMBEDS_PER_MESSAGE
+            or chars + size > MAX_CHARS_PER_MESSAGE
+        ):
+            messages.append({"username": "GitHub PR Reporter", "embeds": embeds})
+            embeds = []
+            chars = 0
+        embeds.append(embed)
+        chars += size
+    if embeds:
+        messages.append({"username": "GitHub PR Reporter", "embeds": embeds})
+    return messages
+
+
+def teams_section(section):
+    """Create a section for the MessageCard."""
+    activityTitle = f"[{section.get('title')}]({section.get('url')})"
+    facts = []
+    text = ""
+    for field in section.get("fields", []):
+        name = field.get("name")
+        value = field.get("value")
+        if name == "Summary":
+            # Include summary in 'text' of the section
+            text = f"**Summary:** {value}"
+        else:
+            facts.append({"name": name, "value": value})
+    return {"activityTitle": activityTitle, "facts": facts, "text": text}
+
+
+def fit_teams_section(section_dict, max_size):
+    """Cut the text and fact values of a MessageCard section until its JSON fits max_size bytes."""
+    limit = None
+    while len(json.dumps(section_dict).encode("utf-8")) > max_size:
+        values = [section_dict["text"]] + [
+            fact["value"] for fact in section_dict["facts"]
+        ]
+        limit = (
+            max(len(value) for value in values) // 2 if limit is None else limit // 2
+        )
+        if limit < 16:
+            break
+        section_dict = {
+            **section_dict,
+            "text": truncate(section_dict["text"], limit),
+            "facts": [
+                {**fact, "value": truncate(fact["value"], limit)}
+                for fact in section_dict["facts"]
+            ],
+        }
+    return section_dict
 
-    for idx, embeds_chunk in enumerate(embeds_list):
-        embeds = []
-        for section in embeds_chunk:
-            embed = {
-                "title": section.get("title"),
-                "url": section.get("url"),
-                "color": section.get("color"),
-                "fields": section.get("fields"),
-                "footer": {"text": f"Repository: {repo_name}"},
-            }
-            embeds.append(embed)
 
-        data = {"username": "GitHub PR Reporter", "embeds": embeds}
+def teams_messages(report_name, report_sections):
+    """Pack report sections into MessageCards under Teams' 28KB payload limit."""
+    MAX_MESSAGE_SIZE = 28000  # 28KB limit for Teams messages
 
-        try:
-            response = requests.post(DISCORD_WEBHOOK_URL, json=data)
-            response.raise_for_status()
-        except requests.exceptions.HTTPError as http_err:
-            print(
-                f"HTTP error occurred on message {idx+1}: {http_err} - {response.text}"
-            )
-        except Exception as err:
-            print(f"An error occurred on message {idx+1}: {err}")
-        else:
-            print(f"Successfully sent message {idx+1} to Discord")
+    def message_card(sections):
+        return {
+            "@type": "MessageCard",
+            "@context": "http://schema.org/extensions",
+            "summary": f"GitHub PR Report for {report_name}",
+            "sections": sections,
+        }
 
+    envelope_size = len(json.dumps(message_card([])).encode("utf-8"))
+    messages = []
+    sections = []
+    message_size = envelope_size
+    for section in report_sections:
+        # A section too large for a message of its own has its texts cut
+        section_dict = fit_teams_section(
+            teams_section(section), MAX_MESSAGE_SIZE - envelope_size - 2
+        )
+        # The separating comma counts too
+        section_size = len(json.dumps(section_dict).encode("utf-8")) + 2
+        if sections and message_size + section_size > MAX_MESSAGE_SIZE:
+            messages.append(message_card(sections))
+            sections = []
+            message_size = envelope_size
+        sections.append(section_dict)
+        message_size += section_size
+    if sections:
+        messages.append(message_card(sections))
+    return messages
 
-def send_to_teams(repo_name, report_sections):
-    """Send the report to Microsoft Teams via webhook."""
-    if not MS_TEAMS_WEBHOOK:
-        return  # Do nothing if Teams webhook is not set
 
-    MAX_MESSAGE_SIZE = 28000  # 28KB limit for Teams messages
-    sections = []
-    message_size = 0
+def send_to_slack(report_name, report_sections):
+    """Send the report to Slack via webhook."""
+    if not SLACK_WEBHOOK:
+        return None  # Do nothing if Slack webhook is not set
+    return post_messages("Slack", SLACK_WEBHOOK, slack_messages(report_sections))
 
-    for section in report_sections:
-        # Create a section for the MessageCard
-        activityTitle = f"[{section.get('title')}]({section.get('url')})"
-        fields = section.get('fields', [])
-        facts = []
-        text = ""
-
-        for field in fields:
-            name = field.get('name')
-            value = field.get('value')
-            if name == 'Summary':
-                # Include summary in 'text' of the section
-                text = f"**Summary:** {value}"
-            elif name == 'Blockers':
-                facts.append({'name': 'Blockers', 'value': value})
-            elif name.startswith('Conversations'):
-                facts.append({'name': name, 'value': value})
-            else:
-                facts.append({'name': name, 'value': value})
 
-        section_dict = {
-            'activityTitle': activityTitle,
-            'facts': facts,
-            'text': text,
-        }
+def send_to_discord(report_name, report_sections):
+    """Send the report to Discord via webhook."""
+    if not DISCORD_WEBHOOK_URL:
+        return None  # Do nothing if Discord webhook is not set
+    return post_messages(
+        "Discord", DISCORD_WEBHOOK_URL, discord_messages(report_sections)
+    )
 
-        # Estimate the size of the section
-        section_size = len(str(section_dict).encode('utf-8'))
-        message_size += section_size
 
-        if message_size >= MAX_MESSAGE_SIZE:
-            # Send the message with current sections
-            message = {
-                "@type": "MessageCard",
-                "@context": "http://schema.org/extensions",
-                "summary": f"GitHub PR Report for {repo_name}",
-                "sections": sections,
-            }
-            try:
-                response = requests.post(MS_TEAMS_WEBHOOK, json=message)
-                response.raise_for_status()
-            except requests.exceptions.HTTPError as http_err:
-                print(f"HTTP error occurred when sending to Teams: {http_err} - {response.text}")
-            except Exception as err:
-                print(f"An error occurred when sending to Teams: {err}")
-            else:
-                print("Successfully sent message to Microsoft Teams")
-            # Reset sections and message_size
-            sections = [section_dict]
-            message_size = section_size
-        else:
-            sections.append(section_dict)
+def send_to_teams(report_name, report_sections):
+    """Send the report to Microsoft Teams via webhook."""
+    if not MS_TEAMS_WEBHOOK:
+        return None  # Do nothing if Teams webhook is not set
+    return post_messages(
+        "Microsoft Teams",
+        MS_TEAMS_WEBHOOK,
+        teams_messages(report_name, report_sections),
+    )
 
-    # Send any remaining sections
-    if sections:
-        message = {
-            "@type": "MessageCard",
-            "@context": "http://schema.org/extensions",
-            "summary": f"GitHub PR Report for {repo_name}",
-            "sections": sections,
+
+def dispatch_report(report_name, report_sections, totals):
+    """Send one batch of sections to every configured sink at the same time.
+
+    Returns whether every message of every sink went out.
+    """
+    senders = {
+        "Discord": send_to_discord,
+        "Slack": send_to_slack,
+        "Microsoft Teams": send_to_teams,
+    }
+    with ThreadPoolExecutor(len(senders)) as pool:
+        futures = {
+            sink: pool.submit(sender, report_name, report_sections)
+            for sink, sender in senders.items()
         }
+    delivered = True
+    for sink, future in futures.items():
         try:
-            response = requests.post(MS_TEAMS_WEBHOOK, json=message)
-            response.raise_for_status()
-        except requests.exceptions.HTTPError as http_err:
-            print(f"HTTP error occurred when sending to Teams: {http_err} - {response.text}")
+            stats = future.result()
         except Exception as err:
-            print(f"An error occurred when sending to Teams: {err}")
-        else:
-            print("Successfully sent message to Microsoft Teams")
+            # the other sinks were sent to all the same
+            print(f"An error occurred when sending the report to {sink}: {err}")
+            delivered = False
+            continue
+        if stats is None:
+            continue
+        sink_totals = totals.setdefault(sink, {"messages": 0, "bytes": 0, "failed": 0})
+        for key, value in stats.items():
+            sink_totals[key] += value
+        if stats["failed"]:
+            delivered = False
+    return delivered
+
+
+def build_pr_report(owner, repo_name, pr, github_pool, openai_pool):
+    """Build the report section of a PR, returning it with its console output lines."""
+    pr_number = pr["number"]
+    pr_title = pr["title"]
+    pr_body = pr["body"] or "No description provided."
+    pr_state = pr["state"]
+    pr_draft = pr["draft"]
+    pr_merged = pr.get("merged_at") is not None
+    pr_mergeable = pr.get("mergeable")
+    pr_html_url = pr["html_url"]
+    pr_is_stale = is_stale(pr)
+
+    # The comment listings are revalidated with their ETags, so this is cheap
+    # when nobody commented since the last run
+    issue_comments_future = github_pool.submit(
+        get_issue_comments, owner, repo_name, pr_number
+    )
+    review_comments_future = github_pool.submit(
+        get_review_comments, owner, repo_name, pr_number
+    )
+
+    # Determine PR State
+    if pr_merged:
+        state_icon = "🟣 Merged"
+        color = 0x6F42C1  # Purple
+    elif pr_draft:
+        state_icon = "🟡 Draft"
+        color = 0xF9C513  # Yellow
+    elif pr_state == "open":
+        state_icon = "🟢 Open"
+        color = 0x28A745  # Green
+    elif pr_state == "closed" and not pr_merged:
+        state_icon = "🔴 Closed"
+        color = 0xCB2431  # Red
+    else:
+        state_icon = "⚫ Unknown"
+        color = 0x000000  # Black
+
+    output = [f"PR State: {state_icon}", f"* Title: **{pr_title}**, {pr_html_url}"]
+
+    fields = []
+
+    # Blockers for open PRs
+    if state_icon == "🟢 Open":
+        output.append(f"* Blockers:")
+        blockers = []
+        if pr_mergeable is False:
+            blockers.append("Needs rebase")
+        if pr["requested_reviewers"]:
+            reviewers = ", ".join([u["login"] for u in pr["requested_reviewers"]])
+            blockers.append(f"Waiting for review from {reviewers}")
+        if not blockers:
+            blockers.append("Waiting for merge")
+        blockers_text = ", ".join(blockers)
+        output.append("  " + blockers_text)
+        fields.append({"name": "Blockers", "value": blockers_text, "inline": False})
+
+    # Reuse the summaries of the last run if the body and comments didn't change
+    all_comments = issue_comments_future.result() + review_comments_future.result()
+    cached_summary = state.get_pr_summary(repo_name, pr, all_comments)
+    if cached_summary is None:
+        pr_summary_future = openai_pool.submit(summarize_text, pr_body)
+        insights_future = openai_pool.submit(summarize_conversations, all_comments)
+        pr_summary = pr_summary_future.result()
+        insights, participants = insights_future.result()
+        if pr_summary != SUMMARY_UNAVAILABLE and insights != [
+            CONVERSATIONS_UNAVAILABLE
+        ]:
+            state.set_pr_summary(
+                repo_name, pr, all_comments, pr_summary, insights, participants
+            )
+    else:
+        pr_summary, insights, participants = cached_summary
+
+    # Summary line
+    summary_status = (
+        "Merged" if pr_merged else "Mergeable" if pr_mergeable else "Not Mergeable"
+    )
+    stale_text = " (Stale)" if pr_is_stale and state_icon == "🟢 Open" else ""
+    summary_line = f"{pr_summary}, {summary_status}{stale_text}"
+    output.append(f"* Summary: {summary_line}")
+    fields.append({"name": "Summary", "value": summary_line, "inline": False})
+
+    # Summarize conversations if there are user comments
+    if insights:
+        participants_list = ", ".join(sorted(participants))
+        output.append(f"* Conversations (Participants: {participants_list}):")
+        insights_text = ""
+        for insight in insights:
+            output.append(f"  - {insight}")
+            insights_text += f"- {insight}\n"
+        fields.append(
+            {
+                "name": f"Conversations (Participants: {participants_list})",
+                "value": insights_text.strip(),
+                "inline": False,
+            }
+        )
+
+    # Prepare report section for this PR
+    section = {
+        "repo": repo_name,
+        "updated_at": pr["updated_at"],
+        "title": f"{state_icon} {pr_title}",
+        "url": pr_html_url,
+        "color": color,
+        "fields": fields,
+    }
+    return section, output
 
 
 def generate_report():
@@ -429,122 +657,77 @@ def generate_report():
         print("No repositories found in the organization.")
         return
 
-    for repo in repos:
-        repo_name = repo["name"]
-        owner = repo["owner"]["login"]
-        prs = get_pull_requests(owner, repo_name)
-        if not prs:
-            continue  # Skip repositories with no recent PRs
-
-        report_sections = []
-
-        print(f"\nRepository: {repo_name}")
-
-        for pr in prs:
-            pr_number = pr["number"]
-            pr_title = pr["title"]
-            pr_body = pr["body"] or "No description provided."
-            pr_state = pr["state"]
-            pr_draft = pr["draft"]
-            pr_merged = pr.get("merged_at") is not None
-            pr_mergeable = pr.get("mergeable")
-            pr_user = pr["user"]["login"]
-            pr_html_url = pr["html_url"]
-            pr_is_stale = is_stale(pr)
-
-            # Determine PR State
-            if pr_merged:
-                state_icon = "🟣 Merged"
-                color = 0x6F42C1  # Purple
-            elif pr_draft:
-                state_icon = "🟡 Draft"
-                color = 0xF9C513  # Yellow
-            elif pr_state == "open":
-                state_icon = "🟢 Open"
-                color = 0x28A745  # Green
-            elif pr_state == "closed" and not pr_merged:
-                state_icon = "🔴 Closed"
-                color = 0xCB2431  # Red
-            else:
-                state_icon = "⚫ Unknown"
-                color = 0x000000  # Black
-
-            print(f"PR State: {state_icon}")
-            print(f"* Title: **{pr_title}**, {pr_html_url}")
-
-            fields = []
-
-            # Blockers for open PRs
-            if state_icon == "🟢 Open":
-                print(f"* Blockers:")
-                blockers = []
-                if pr_mergeable is False:
-                    blockers.append("Needs rebase")
-                if pr["requested_reviewers"]:
-                    reviewers = ", ".join(
-                        [u["login"] for u in pr["requested_reviewers"]]
-                    )
-                    blockers.append(f"Waiting for review from {reviewers}")
-                if not blockers:
-                    blockers.append("Waiting for merge")
-                blockers_text = ", ".join(blockers)
-                print("  " + blockers_text)
-                fields.append(
-                    {"name": "Blockers", "value": blockers_text, "inline": False}
-                )
-
-            # Generate summary using OpenAI
-            pr_summary = summarize_text(pr_body)
-
-            # Summary line
-            summary_status = (
-                "Merged"
-                if pr_merged
-                else "Mergeable" if pr_mergeable else "Not Mergeable"
+    with ThreadPoolExecutor(GITHUB_CONCURRENCY) as github_pool, ThreadPoolExecutor(
+        OPENAI_CONCURRENCY
+    ) as openai_pool, ThreadPoolExecutor(PR_CONCURRENCY) as pr_pool:
+        # List the PRs of every repository at once
+        pr_list_futures = [
+            (
+                repo,
+                github_pool.submit(
+                    get_pull_requests, repo["owner"]["login"], repo["name"]
+                ),
             )
-            stale_text = " (Stale)" if pr_is_stale and state_icon == "🟢 Open" else ""
-            summary_line = f"{pr_summary}, {summary_status}{stale_text}"
-            print(f"* Summary: {summary_line}")
-            fields.append({"name": "Summary", "value": summary_line, "inline": False})
-
-            # Conversations
-            issue_comments = get_issue_comments(owner, repo_name, pr_number)
-            review_comments = get_review_comments(owner, repo_name, pr_number)
-            all_comments = issue_comments + review_comments
-
-            # Summarize conversations if there are user comments
-            insights, participants = summarize_conversations(all_comments)
-            if insights:
-                participants_list = ", ".join(sorted(participants))
-                print(f"* Conversations (Participants: {participants_list}):")
-                insights_text = ""
-                for insight in insights:
-                    print(f"  - {insight}")
-                    insights_text += f"- {insight}\n"
-                fields.append(
-                    {
-                        "name": f"Conversations (Participants: {participants_list})",
-                        "value": insights_text.strip(),
-                        "inline": False,
-                    }
+            for repo in repos
+        ]
+
+        # Start building every PR of a repository as soon as its list is in
+        repo_reports = []
+        for repo, prs_future in pr_list_futures:
+            prs = prs_future.result()
+            if not prs:
+                continue  # Skip repositories with no recent PRs
+            owner = repo["owner"]["login"]
+            pr_futures = [
+                pr_pool.submit(
+                    build_pr_report, owner, repo["name"], pr, github_pool, openai_pool
                 )
+                for pr in prs
+            ]
+            repo_reports.append((repo["name"], pr_futures))
+
+        # Output in repository and PR order, whatever order the work finished in
+        totals = {}
+        org_sections = []
+        cursors = []
+        for repo_name, pr_futures in repo_reports:
+            report_sections = []
+
+            print(f"\nRepository: {repo_name}")
+
+            for pr_future in pr_futures:
+                section, output = pr_future.result()
+                for line in output:
+                    print(line)
+                report_sections.append(section)
+
+                print()  # Add space between PRs
+
+            # The next run only reports PRs with activity after the newest seen
+            # here, once this report reached every sink
+            newest = max(section["updated_at"] for section in report_sections)
+            cursors.append((repo_name, newest))
+
+            # Send the whole repository report at once
+            if REPORT_BATCH_SCOPE == "org":
+                org_sections.extend(report_sections)
+            else:
+                if dispatch_report(repo_name, report_sections, totals):
+                    state.set_cursor(repo_name, newest)
 
-            # Prepare report section for this PR
-            report_sections.append(
-                {
-                    "title": f"{state_icon} {pr_title}",
-                    "url": pr_html_url,
-                    "color": color,
-                    "fields": fields,
-                }
-            )
-
-            print()  # Add space between PRs
+        if org_sections and dispatch_report(ORGANIZATION, org_sections, totals):
+            for repo_name, newest in cursors:
+                state.set_cursor(repo_name, newest)
 
-            # Send report to Discord and/or Slack for this repository
-            send_to_discord(repo_name, report_sections)
-            send_to_slack(repo_name, report_sections)
-            send_to_teams(repo_name, report_sections)
+    print(
+        f"GitHub listings: {state.counters['fetched']} fetched, "
+        f"{state.counters['not_modified']} not modified; "
+        f"{state.counters['reused_prs']} PR summaries reused"
+    )
+    for sink, stats in totals.items():
+        print(
+            f"{sink}: sent {stats['messages']} messages ({stats['bytes']} bytes), {stats['failed']} failed"
+        )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,197 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# volatile parts of a log window that differ between runs of the same failure
+NORMALIZE_PATTERNS = [
+    (re.compile(r"\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:[.,]\d+)?Z?\s?"), ""),
+    (re.compile(r"\b\d{1,2}:\d{2}:\d{2}(?:[.,]\d+)?\b"), "<time>"),
+    (
+        re.compile(
+            r"\b[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\b", re.I
+        ),
+        "<uuid>",
+    ),
+    (re.compile(r"(?:/tmp|/var/folders|/home/runner/work/_temp)/[^\s:'\"]*"), "<tmp>"),
+    (re.compile(r"\btmp[a-z0-9_]{6,}\b", re.I), "<tmp>"),
+    (re.compile(r"\b[0-9a-f]{12,64}\b"), "<hash>"),
+    (re.compile(r"\b\d{6,}\b"), "<id>"),
+    (re.compile(r"\b\d+(?:\.\d+)?\s?(?:ms|s|sec|seconds)\b"), "<duration>"),
+]
+
+
+def normalize_window(logs):
+    for pattern, replacement in NORMALIZE_PATTERNS:
+        logs = pattern.sub(replacement, logs)
+    return logs
+
+
+def cache_key(logs, model, prompt):
+    digest = hashlib.sha256()
+    for part in (model, prompt, normalize_window(logs)):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class MemoryCache:
+    """In-process LRU cache with a TTL."""
+
+    def __init__(self, max_entries=1000, ttl=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, created_at = entry
+            if self.ttl and time.time() - created_at > self.ttl:
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (value, time.time())
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class SQLiteCache:
+    """On-disk cache surviving restarts, evicting expired then least recently used entries."""
+
+    def __init__(self, path, max_entries=10000, ttl=None):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.conn = None
+
+    def connect(self):
+        if self.conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self.conn = sqlite3.connect(self.path, check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS analyses ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+                " created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS analyses_accessed_at ON analyses (accessed_at)"
+            )
+        return self.conn
+
+    def get(self, key):
+        with self.lock:
+            conn = self.connect()
+            row = conn.execute(
+                "SELECT value, created_at FROM analyses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, created_at = row
+            now = time.time()
+            if self.ttl and now - created_at > self.ttl:
+                conn.execute("DELETE FROM analyses WHERE key = ?", (key,))
+                conn.commit()
+                return None
+            conn.execute(
+                "UPDATE analyses SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+            conn.commit()
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            conn = self.connect()
+            now = time.time()
+            conn.execute(
+                "INSERT OR REPLACE INTO analyses (key, value, created_at, accessed_at)"
+                " VALUES (?, ?, ?, ?)",
+                (key, value, now, now),
+            )
+            self.evict(conn, now)
+            conn.commit()
+
+    def evict(self, conn, now):
+        if self.ttl:
+            conn.execute("DELETE FROM analyses WHERE created_at < ?", (now - self.ttl,))
+        conn.execute(
+            "DELETE FROM analyses WHERE key IN ("
+            " SELECT key FROM analyses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+    def __len__(self):
+        with self.lock:
+            return self.connect().execute("SELECT COUNT(*) FROM analyses").fetchone()[0]
+
+
+class AnalysisCache:
+    """Cache of LLM analyses keyed on the normalized error window, model and prompt."""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, logs, model, prompt):
+        if self.backend is None:
+            return None
+        value = self.backend.get(cache_key(logs, model, prompt))
+        with self.lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, logs, model, prompt, analysis):
+        if self.backend is not None:
+            self.backend.set(cache_key(logs, model, prompt), analysis)
+
+    def stats(self):
+        with self.lock:
+            hits, misses = self.hits, self.misses
+        return {
+            "backend": (
+                type(self.backend).__name__ if self.backend is not None else None
+            ),
+            "entries": len(self.backend) if self.backend is not None else 0,
+            "hits": hits,
+            "misses": misses,
+        }
+
+
+def create_analysis_cache():
+    backend = os.getenv("ANALYSIS_CACHE_BACKEND", "memory").lower()
+    ttl = float(os.getenv("ANALYSIS_CACHE_TTL", 7 * 24 * 3600))
+    max_entries = int(os.getenv("ANALYSIS_CACHE_MAX_ENTRIES", 1000))
+    if backend == "sqlite":
+        path = os.getenv(
+            "ANALYSIS_CACHE_PATH",
+            os.path.join(
+                os.getenv("GITFAILGUARD_DATA_DIR", "data"), "analyses.sqlite3"
+            ),
+        )
+        return AnalysisCache(SQLiteCache(path, max_entries=max_entries, ttl=ttl))
+    if backend == "memory":
+        return AnalysisCache(MemoryCache(max_entries=max_entries, ttl=ttl))
+    return AnalysisCache(None)
@@ -0,0 +1,37 @@
+import asyncio
+import threading
+
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def get_loop():
+    """Event loop running the async pipeline on a background thread."""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(
+                target=loop.run_forever, name="async-pipeline", daemon=True
+            )
+            thread.start()
+            _loop = loop
+        return _loop
+
+
+def submit(coro):
+    """Schedule a coroutine on the pipeline loop and return a concurrent Future."""
+    return asyncio.run_coroutine_threadsafe(coro, get_loop())
+
+
+def run_sync(coro):
+    """Run a coroutine on the pipeline loop and block the calling thread for its result."""
+    loop = get_loop()
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        coro.close()
+        raise RuntimeError("run_sync called from the pipeline loop, await instead")
+    return asyncio.run_coroutine_threadsafe(coro, loop).result()
@@ -0,0 +1,343 @@
+"""Analyze the failed jobs of the last days across an organization's repositories.
+
+Usage: python src/backfill.py --org my-org [--repo my-org/app ...] [--days 7] [--output backfill.jsonl] [--issues]
+
+Failed runs are listed per repository, their failed jobs' logs fetched and
+analyzed like a live webhook would, and one JSON line per job appended to
+--output. With --issues, issues are opened (or repeat failures commented on)
+through the webhook handler instead. Runs already handled by a previous
+invocation are skipped using the --checkpoint file, so an interrupted
+backfill picks up where it stopped. Requests run as batch work, so live
+webhooks keep priority on the GitHub quota.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+from async_runtime import run_sync
+from failure_index import failure_signature
+from github_client import BATCH, github_get_async, set_default_priority
+from log_analyzer import analyze_error_window_async, get_error_windows_async
+from structured_logging import configure_logging
+
+logger = logging.getLogger(__name__)
+
+PER_PAGE = 100
+
+
+async def iter_pages(url, items_key=None, params=None):
+    """Items of every page of a GitHub listing."""
+    page = 1
+    while True:
+        response = await github_get_async(
+            url, params={**(params or {}), "per_page": PER_PAGE, "page": page}
+        )
+        response.raise_for_status()
+        body = response.json()
+        items = body[items_key] if items_key else body
+        for item in items:
+            yield item
+        if len(items) < PER_PAGE:
+            return
+        page += 1
+
+
+async def list_repos(org):
+    return [
+        repo["full_name"]
+        async for repo in iter_pages(f"/orgs/{org}/repos", params={"type": "all"})
+        if not repo.get("archived")
+    ]
+
+
+async def failed_runs(repo, since):
+    # the runs listing stops at 1000 results, plenty for a few days of failures
+    created = ">=" + since.strftime("%Y-%m-%dT%H:%M:%SZ")
+    async for run in iter_pages(
+        f"/repos/{repo}/actions/runs",
+        "workflow_runs",
+        {"status": "failure", "created": created},
+    ):
+        yield run
+
+
+async def failed_jobs(repo, run_id):
+    return [
+        job
+        async for job in iter_pages(
+            f"/repos/{repo}/actions/runs/{run_id}/jobs", "jobs", {"filter": "latest"}
+        )
+        if job.get("conclusion") == "failure"
+    ]
+
+
+def job_record(repo, job):
+    return {
+        "repo": repo,
+        "run_id": job.get("run_id"),
+        "job_id": job.get("id"),
+        "workflow": job.get("workflow_name"),
+        "job": job.get("name"),
+        "html_url": job.get("html_url"),
+        "head_branch": job.get("head_branch"),
+        "completed_at": job.get("completed_at"),
+    }
+
+
+async def analyze_run(repo, jobs):
+    """One record per failed job of a run, with one analysis per distinct cause."""
+    records = [job_record(repo, job) for job in jobs]
+    windows = await get_error_windows_async(
+        [(job["html_url"], job["name"]) for job in jobs], return_exceptions=True
+    )
+    causes = {}
+    for index, logs in enumerate(windows):
+        if isinstance(logs, Exception):
+            records[index]["status"] = "error"
+            records[index]["error"] = repr(logs)
+        elif logs:
+            causes.setdefault(failure_signature(logs), []).append(index)
+        else:
+            records[index]["status"] = "no logs"
+    # the window alone, analyze_logs_async would ping CodeRabbit on open PRs
+    analyses = await asyncio.gather(
+        *(
+            analyze_error_window_async(windows[indexes[0]], repo)
+            for indexes in causes.values()
+        ),
+        return_exceptions=True,
+    )
+    for (signature, indexes), analysis in zip(causes.items(), analyses):
+        for index in indexes:
+            records[index]["signature"] = signature
+            if isinstance(analysis, Exception):
+                records[index]["status"] = "error"
+                records[index]["error"] = repr(analysis)
+            else:
+                records[index]["status"] = "analyzed" if analysis else "error"
+                records[index]["analysis"] = analysis or None
+    return records
+
+
+async def report_run(repo, jobs):
+    """Open an issue for a run's failed jobs the way the webhook handler does."""
+    # imported here, the webhook handler opens the event journal and failure index
+    from webhook_handler import handle_failed_jobs_async
+
+    events = [
+        {
+            "action": "completed",
+            "workflow_job": job,
+            "repository": {"full_name": repo},
+        }
+        for job in jobs
+    ]
+    results = await handle_failed_jobs_async(events)
+    records = []
+    for job, (body, status) in zip(jobs, results):
+        record = job_record(repo, job)
+        record["status"] = body["status"]
+        record["issue_url"] = body.get("issue_url")
+        record["comment_url"] = body.get("comment_url")
+        records.append(record)
+    return records
+
+
+class Checkpoint:
+    """Append-only file of the runs a backfill already handled."""
+
+    def __init__(self, path):
+        self.path = path
+        self.done = set()
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # torn by an interruption mid-write
+                        continue
+                    self.done.add((entry["repo"], entry["run_id"]))
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.file = open(path, "a")
+
+    def __contains__(self, run):
+        return run in self.done
+
+    def add(self, repo, run_id):
+        self.done.add((repo, run_id))
+        self.file.write(json.dumps({"repo": repo, "run_id": run_id}) + "\n")
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class Progress:
+    """Counts of handled runs and jobs, reported in jobs per minute."""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.counts = {
+            "runs": 0,
+            "skipped_runs": 0,
+            "failed_runs": 0,
+            "failed_repos": 0,
+            "jobs": 0,
+        }
+
+    def add(self, records):
+        self.counts["runs"] += 1
+        self.counts["jobs"] += len(records)
+        for record in records:
+            self.counts[record["status"]] = self.counts.get(record["status"], 0) + 1
+
+    def jobs_per_minute(self):
+        elapsed = time.monotonic() - self.started
+        return self.counts["jobs"] / elapsed * 60 if elapsed else 0.0
+
+    def report(self):
+        return ", ".join(
+            [f"{name} {count}" for name, count in self.counts.items()]
+            + [f"{self.jobs_per_minute():.1f} jobs/min"]
+        )
+
+
+async def backfill(
+    repos, since, handle_run, output, checkpoint, progress, concurrency, report_every=30
+):
+    """Run handle_run on the failed jobs of every failed run, concurrency runs at a time."""
+    runs = asyncio.Queue(maxsize=concurrency * 2)
+
+    async def produce():
+        try:
+            for repo in repos:
+                try:
+                    async for run in failed_runs(repo, since):
+                        if (repo, run["id"]) in checkpoint:
+                            progress.counts["skipped_runs"] += 1
+                            continue
+                        await runs.put((repo, run))
+                except Exception as e:
+                    # Actions disabled, no access, ...: the other repositories go on
+                    logger.error("Unable to list failed runs of %s: %r", repo, e)
+                    progress.counts["failed_repos"] += 1
+        finally:
+            for _ in range(concurrency):
+                await runs.put(None)
+
+    async def work():
+        while True:
+            item = await runs.get()
+            if item is None:
+                return
+            repo, run = item
+            try:
+                jobs = await failed_jobs(repo, run["id"])
+                records = await handle_run(repo, jobs) if jobs else []
+                errors = [record for record in records if record["status"] == "error"]
+                if errors:
+                    # a log fetch or an analysis failed, an outage more often than not
+                    raise RuntimeError(
+                        f"{len(errors)} of {len(records)} jobs failed: "
+                        + str(errors[0].get("error"))
+                    )
+            except Exception as e:
+                # left out of the checkpoint and the output, the next invocation
+                # tries it again
+                logger.error("Unable to backfill run %s of %s: %r", run["id"], repo, e)
+                progress.counts["failed_runs"] += 1
+                continue
+            # the output is flushed before the checkpoint, so a run is never lost,
+            # at worst written twice when interrupted in between
+            for record in records:
+                output.write(json.dumps(record) + "\n")
+            output.flush()
+            checkpoint.add(repo, run["id"])
+            progress.add(records)
+
+    async def report():
+        while True:
+            await asyncio.sleep(report_every)
+            print(progress.report(), flush=True)
+
+    reporter = asyncio.ensure_future(report())
+    try:
+        await asyncio.gather(produce(), *(work() for _ in range(concurrency)))
+    finally:
+        reporter.cancel()
+
+
+async def backfill_org(args, output, checkpoint, progress):
+    repos = args.repo or await list_repos(args.org)
+    since = datetime.now(timezone.utc) - timedelta(days=args.days)
+    print(
+        f"Backfilling failures since {since.isoformat()} in {len(repos)} repositories"
+    )
+    await backfill(
+        repos,
+        since,
+        report_run if args.issues else analyze_run,
+        output,
+        checkpoint,
+        progress,
+        args.concurrency,
+    )
+
+
+def write_parquet(jsonl_path, parquet_path):
+    import pyarrow.json
+    import pyarrow.parquet
+
+    pyarrow.parquet.write_table(pyarrow.json.read_json(jsonl_path), parquet_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--org", required=True)
+    parser.add_argument(
+        "--repo",
+        action="append",
+        help="owner/name to backfill instead of every repository, can be repeated",
+    )
+    parser.add_argument("--days", type=float, default=7)
+    parser.add_argument("--output", default="backfill.jsonl")
+    parser.add_argument(
+        "--parquet", help="also convert the output to Parquet (needs pyarrow)"
+    )
+    parser.add_argument(
+        "--issues",
+        action="store_true",
+        help="open issues like the webhook does instead of only recording analyses",
+    )
+    parser.add_argument(
+        "--concurrency", type=int, default=8, help="runs handled at once (default 8)"
+    )
+    parser.add_argument(
+        "--checkpoint", help="handled runs file (default: OUTPUT.checkpoint)"
+    )
+    args = parser.parse_args()
+
+    configure_logging()
+    set_default_priority(BATCH)
+    checkpoint = Checkpoint(args.checkpoint or args.output + ".checkpoint")
+    progress = Progress()
+    try:
+        with open(args.output, "a") as output:
+            run_sync(backfill_org(args, output, checkpoint, progress))
+    finally:
+        checkpoint.close()
+        print(progress.report())
+    if args.parquet:
+        write_parquet(args.output, args.parquet)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+import asyncio
+
+
+class Coalescer:
+    """Hold items arriving under the same key for a short window and handle them as one batch.
+
+    Runs on a single event loop: the first item for a key starts the window,
+    and every submitter gets back its own entry of the batch handler's result.
+    """
+
+    def __init__(self, window):
+        self.window = window
+        self.batches = {}
+        self.counters = {"items": 0, "batches": 0}
+
+    async def submit(self, key, item, handle_batch):
+        """Add an item to the key's batch and wait for its result.
+
+        handle_batch gets the list of items and returns one result per item,
+        in the same order. The handler of the first item of a batch is used.
+        """
+        loop = asyncio.get_running_loop()
+        batch = self.batches.get(key)
+        if batch is None:
+            batch = self.batches[key] = {"handler": handle_batch, "items": []}
+            loop.call_later(self.window, self._flush, key)
+        future = loop.create_future()
+        batch["items"].append((item, future))
+        self.counters["items"] += 1
+        return await future
+
+    def stats(self):
+        return {"window": self.window, "open": len(self.batches), **self.counters}
+
+    def _flush(self, key):
+        batch = self.batches.pop(key)
+        self.counters["batches"] += 1
+        asyncio.ensure_future(self._run(batch["handler"], batch["items"]))
+
+    async def _run(self, handle_batch, items):
+        try:
+            results = await handle_batch([item for item, _ in items])
+        except Exception as e:
+            for _, future in items:
+                future.set_exception(e)
+            return
+        for (_, future), result in zip(items, results):
+            future.set_result(result)
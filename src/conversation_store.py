@@ -0,0 +1,259 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from token_budget import count_tokens
+
+ISSUE_SUMMARY_PROMPT = (
+    "Condense this GitHub issue opened for a failed CI job, keeping the failing"
+    " step, the error messages and the suggested fixes"
+)
+THREAD_SUMMARY_PROMPT = (
+    "Update the summary of this conversation about a failed CI job with the"
+    " exchanges that follow it, keeping the questions asked, the answers given"
+    " and anything tried or ruled out"
+)
+
+
+def issue_hash(issue_body):
+    return hashlib.sha1(issue_body.encode("utf-8")).hexdigest()
+
+
+def turn_tokens(turns, model="gpt-3.5-turbo"):
+    return sum(count_tokens(turn["content"], model) for turn in turns)
+
+
+def render_thread(summary, turns):
+    lines = [f"Summary so far:\n{summary}"] if summary else []
+    for turn in turns:
+        speaker = "GitFailGuard" if turn["role"] == "assistant" else "User"
+        lines.append(f"{speaker}: {turn['content']}")
+    return "\n\n".join(lines)
+
+
+class ConversationStore:
+    """Per-issue state of @GitFailGuard threads: the condensed issue, a running
+    summary of older exchanges and the last few exchanges verbatim.
+
+    The issue body is condensed once, when first seen or edited, and exchanges
+    falling out of the last max_turns (or of turns_budget tokens) are folded
+    into the summary, so a reply's prompt stays the same size however long the
+    thread grows. summarize is a coroutine function (prompt, text, max_tokens)
+    returning the model's condensed text. The coroutines run their SQLite calls
+    in a thread, as BEGIN IMMEDIATE can wait on another process's write.
+    """
+
+    def __init__(
+        self,
+        path,
+        max_turns=3,
+        issue_budget=1000,
+        turns_budget=1500,
+        summary_budget=300,
+        retention=30 * 24 * 3600,
+        model="gpt-3.5-turbo",
+    ):
+        self.path = path
+        self.max_turns = max_turns
+        self.issue_budget = issue_budget
+        self.turns_budget = turns_budget
+        self.summary_budget = summary_budget
+        self.retention = retention
+        self.model = model
+        self.lock = threading.Lock()
+        self.conn = None
+        self.counters = {"opened": 0, "continued": 0, "folded": 0}
+
+    def connect(self):
+        if self.conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self.conn = sqlite3.connect(self.path, check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS conversations ("
+                " repo TEXT NOT NULL, issue_number INTEGER NOT NULL,"
+                " issue_hash TEXT NOT NULL, issue TEXT NOT NULL,"
+                " summary TEXT NOT NULL, turns TEXT NOT NULL, updated_at REAL NOT NULL,"
+                " PRIMARY KEY (repo, issue_number)) WITHOUT ROWID"
+            )
+        return self.conn
+
+    def get(self, repo, issue_number):
+        with self.lock:
+            row = (
+                self.connect()
+                .execute(
+                    "SELECT issue_hash, issue, summary, turns FROM conversations"
+                    " WHERE repo = ? AND issue_number = ?",
+                    (repo, issue_number),
+                )
+                .fetchone()
+            )
+        if row is None:
+            return None
+        issue_hash, issue, summary, turns = row
+        return {
+            "issue_hash": issue_hash,
+            "issue": issue,
+            "summary": summary,
+            "turns": json.loads(turns),
+        }
+
+    def put(self, repo, issue_number, conversation):
+        with self.lock:
+            self._put(self.connect(), repo, issue_number, conversation)
+
+    def _put(self, conn, repo, issue_number, conversation):
+        now = time.time()
+        conn.execute(
+            "INSERT OR REPLACE INTO conversations"
+            " (repo, issue_number, issue_hash, issue, summary, turns, updated_at)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                repo,
+                issue_number,
+                conversation["issue_hash"],
+                conversation["issue"],
+                conversation["summary"],
+                json.dumps(conversation["turns"]),
+                now,
+            ),
+        )
+        conn.execute(
+            "DELETE FROM conversations WHERE updated_at < ?", (now - self.retention,)
+        )
+        conn.commit()
+
+    def _update(self, repo, issue_number, change):
+        # read, change and write back in one transaction, so concurrent replies
+        # on an issue don't lose each other's exchanges
+        with self.lock:
+            conn = self.connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT issue_hash, issue, summary, turns FROM conversations"
+                    " WHERE repo = ? AND issue_number = ?",
+                    (repo, issue_number),
+                ).fetchone()
+                if row is None:
+                    conn.rollback()
+                    return None
+                conversation = dict(
+                    zip(("issue_hash", "issue", "summary"), row[:3]),
+                    turns=json.loads(row[3]),
+                )
+                change(conversation)
+                self._put(conn, repo, issue_number, conversation)
+            except BaseException:
+                conn.rollback()
+                raise
+        return conversation
+
+    async def open(self, repo, issue_number, issue_body, summarize):
+        """The issue's conversation, with its body condensed when new or edited."""
+        issue_body = issue_body or ""
+        conversation = await asyncio.to_thread(self.get, repo, issue_number)
+        if conversation is not None and conversation["issue_hash"] == issue_hash(
+            issue_body
+        ):
+            with self.lock:
+                self.counters["continued"] += 1
+            return conversation
+        if count_tokens(issue_body, self.model) > self.issue_budget:
+            issue = await summarize(ISSUE_SUMMARY_PROMPT, issue_body, self.issue_budget)
+        else:
+            issue = issue_body
+        fresh = {
+            "issue_hash": issue_hash(issue_body),
+            "issue": issue,
+            "summary": "",
+            "turns": [],
+        }
+
+        def condensed(current):
+            current.update(issue_hash=fresh["issue_hash"], issue=issue)
+
+        # an edited issue keeps its thread
+        conversation = await asyncio.to_thread(
+            self._update, repo, issue_number, condensed
+        )
+        if conversation is None:
+            await asyncio.to_thread(self.put, repo, issue_number, fresh)
+            conversation = fresh
+        with self.lock:
+            self.counters["opened"] += 1
+        return conversation
+
+    async def add_turn(self, repo, issue_number, comment, reply, summarize):
+        """Record an exchange, folding the oldest ones into the summary past the limits."""
+
+        def append(conversation):
+            conversation["turns"] += [
+                {"role": "user", "content": comment},
+                {"role": "assistant", "content": reply},
+            ]
+
+        conversation = await asyncio.to_thread(self._update, repo, issue_number, append)
+        if conversation is None:
+            return None
+        folded = self.to_fold(conversation["turns"])
+        if not folded:
+            return conversation
+        summary = await summarize(
+            THREAD_SUMMARY_PROMPT,
+            render_thread(conversation["summary"], folded),
+            self.summary_budget,
+        )
+
+        def fold(current):
+            # another reply may have folded these exchanges in the meantime
+            if current["turns"][: len(folded)] == folded:
+                current["turns"] = current["turns"][len(folded) :]
+                current["summary"] = summary
+
+        conversation = await asyncio.to_thread(self._update, repo, issue_number, fold)
+        with self.lock:
+            self.counters["folded"] += len(folded) // 2
+        return conversation
+
+    def to_fold(self, turns):
+        """Oldest exchanges to move into the summary, the latest one always stays."""
+        folded = []
+        while len(turns) > 2 and (
+            len(turns) > 2 * self.max_turns
+            or turn_tokens(turns, self.model) > self.turns_budget
+        ):
+            folded += turns[:2]
+            turns = turns[2:]
+        return folded
+
+    def stats(self):
+        with self.lock:
+            conversations = (
+                self.connect()
+                .execute("SELECT COUNT(*) FROM conversations")
+                .fetchone()[0]
+            )
+            return {"conversations": conversations, **self.counters}
+
+
+def create_conversation_store():
+    path = os.getenv(
+        "CONVERSATION_STORE_PATH",
+        os.path.join(
+            os.getenv("GITFAILGUARD_DATA_DIR", "data"), "conversations.sqlite3"
+        ),
+    )
+    return ConversationStore(
+        path,
+        max_turns=int(os.getenv("CONVERSATION_MAX_TURNS", 3)),
+        issue_budget=int(os.getenv("CONVERSATION_ISSUE_BUDGET", 1000)),
+        turns_budget=int(os.getenv("CONVERSATION_TURNS_BUDGET", 1500)),
+    )
@@ -0,0 +1,314 @@
+import fcntl
+import glob
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+COMPLETED = "completed"
+FAILED = "failed"
+REJECTED = "rejected"
+
+
+class EventJournal:
+    """Append-only log of accepted webhook events and their processing state.
+
+    Appends are group committed: callers queue a record and wait while a single
+    flusher thread writes and fsyncs everything queued so far, so concurrent
+    requests share one fsync. Each process owns one journal file, held with
+    flock, and adopts the unfinished entries of a file left by a dead process.
+    """
+
+    def __init__(self, directory, compact_bytes=None, retention=None):
+        if compact_bytes is None:
+            compact_bytes = int(os.getenv("EVENT_JOURNAL_COMPACT_BYTES", 64 * 1024**2))
+        if retention is None:
+            retention = float(os.getenv("EVENT_JOURNAL_RETENTION", 7 * 24 * 3600))
+        self.directory = directory
+        self.compact_bytes = compact_bytes
+        self.retention = retention
+        self.condition = threading.Condition()
+        self.path = None
+        self.file = None
+        self.size = 0
+        self.compacted_size = 0
+        self.buffer = []
+        self.appended = 0
+        self.flushed = 0
+        self.entries = {}
+        self.counters = {"appends": 0, "fsyncs": 0, "compactions": 0}
+
+    def open(self):
+        with self.condition:
+            if self.file is not None:
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            index = 0
+            while True:
+                path = os.path.join(self.directory, f"journal-{index}.log")
+                file = lock_journal_file(path)
+                if file is not None:
+                    break
+                index += 1
+            self.path = path
+            self.file = file
+            self.entries = {}
+            for record in iter_records(path):
+                self._index(record)
+            self.size = file.seek(0, os.SEEK_END)
+            threading.Thread(
+                target=self._flusher, name="event-journal", daemon=True
+            ).start()
+
+    def append(self, kind, payload, entry_id=None, wait=True):
+        """Record an accepted event, by default returning once it is on disk."""
+        record = {
+            "op": "accept",
+            "id": entry_id or uuid.uuid4().hex,
+            "ts": time.time(),
+            "kind": kind,
+            "payload": payload,
+        }
+        sequence = self._write(record)
+        if wait:
+            with self.condition:
+                while self.flushed < sequence:
+                    self.condition.wait()
+        return record["id"]
+
+    def finish(self, entry_id, state):
+        # not waited on, losing it in a crash only means the event runs again
+        self._write({"op": "state", "id": entry_id, "state": state})
+
+    def record_replay(self, record, state):
+        """Record the outcome of an entry replay.py ran, whichever file accepted it."""
+        self.open()
+        with self.condition:
+            known = record["id"] in self.entries
+        if not known:
+            self.append(record["kind"], record["payload"], record["id"], wait=False)
+        self.finish(record["id"], state)
+
+    def unfinished(self):
+        """Accepted entries of this process's file that never finished."""
+        self.open()
+        with self.condition:
+            pending = {
+                entry_id
+                for entry_id, entry in self.entries.items()
+                if entry["state"] == PENDING
+            }
+        # entries replayed meanwhile finished in the replaying process's file,
+        # copy their state here before that file's retention drops them
+        for entry_id, state in finished_elsewhere(self.directory, self.path, pending):
+            self.finish(entry_id, state)
+            pending.discard(entry_id)
+        return [
+            record
+            for record in iter_records(self.path)
+            if record["op"] == "accept" and record["id"] in pending
+        ]
+
+    def accepted_ids(self):
+        """IDs of the entries of this process's file that weren't rejected or failed, oldest first."""
+        self.open()
+        with self.condition:
+            entries = sorted(self.entries.items(), key=lambda item: item[1]["ts"])
+        return [
+            entry_id
+            for entry_id, entry in entries
+            if entry["state"] not in (REJECTED, FAILED)
+        ]
+
+    def flush(self):
+        with self.condition:
+            while self.flushed < self.appended:
+                self.condition.wait()
+
+    def stats(self):
+        with self.condition:
+            states = {}
+            for entry in self.entries.values():
+                states[entry["state"]] = states.get(entry["state"], 0) + 1
+            fsyncs = self.counters["fsyncs"]
+            return {
+                "path": self.path,
+                "bytes": self.size,
+                **self.counters,
+                "records_per_fsync": round(self.flushed / fsyncs, 2) if fsyncs else 0,
+                "entries": states,
+            }
+
+    def _write(self, record):
+        self.open()
+        line = json.dumps(record, separators=(",", ":")).encode("utf-8") + b"\n"
+        with self.condition:
+            self._index(record)
+            self.buffer.append(line)
+            self.appended += 1
+            if record["op"] == "accept":
+                self.counters["appends"] += 1
+            self.condition.notify_all()
+            return self.appended
+
+    def _index(self, record):
+        if record["op"] == "accept":
+            self.entries[record["id"]] = {
+                "ts": record["ts"],
+                "kind": record["kind"],
+                "state": record.get("state", PENDING),
+            }
+        elif record["id"] in self.entries:
+            self.entries[record["id"]]["state"] = record["state"]
+
+    def _flusher(self):
+        while True:
+            with self.condition:
+                while not self.buffer:
+                    self.condition.wait()
+                # everything queued while the last fsync ran goes out in one batch
+                batch, self.buffer = self.buffer, []
+                sequence = self.appended
+            data = b"".join(batch)
+            try:
+                self.file.write(data)
+                self.file.flush()
+                os.fsync(self.file.fileno())
+            except OSError as e:
+                # appenders keep waiting, their requests time out and GitHub redelivers
+                logger.error("Unable to write event journal %s: %s", self.path, e)
+                with self.condition:
+                    self.buffer = batch + self.buffer
+                time.sleep(1)
+                continue
+            self.size += len(data)
+            # unfinished entries survive compaction, so wait until the file doubled
+            if self.size > max(self.compact_bytes, 2 * self.compacted_size):
+                try:
+                    self._compact()
+                except OSError as e:
+                    logger.error("Unable to compact event journal %s: %s", self.path, e)
+            with self.condition:
+                self.flushed = sequence
+                self.counters["fsyncs"] += 1
+                self.condition.notify_all()
+
+    def _compact(self):
+        # rewrite the file with one record per kept entry, its state folded in,
+        # dropping finished entries older than the retention
+        cutoff = time.time() - self.retention
+        with self.condition:
+            self.entries = {
+                entry_id: entry
+                for entry_id, entry in self.entries.items()
+                if entry["state"] == PENDING or entry["ts"] >= cutoff
+            }
+            states = {
+                entry_id: entry["state"] for entry_id, entry in self.entries.items()
+            }
+        tmp_path = self.path + ".compact"
+        with open(tmp_path, "wb") as tmp:
+            for record in iter_records(self.path):
+                if record["op"] != "accept" or record["id"] not in states:
+                    continue
+                record["state"] = states[record["id"]]
+                tmp.write(
+                    json.dumps(record, separators=(",", ":")).encode("utf-8") + b"\n"
+                )
+            tmp.flush()
+            os.fsync(tmp.fileno())
+        file = open(tmp_path, "ab")
+        fcntl.flock(file, fcntl.LOCK_EX)
+        os.replace(tmp_path, self.path)
+        fsync_directory(self.directory)
+        old, self.file = self.file, file
+        old.close()
+        self.size = self.compacted_size = file.seek(0, os.SEEK_END)
+        with self.condition:
+            self.counters["compactions"] += 1
+        # state changes queued during the rewrite are re-applied by the next flush
+
+
+def lock_journal_file(path):
+    """Open and flock a journal file, or None if another process holds it."""
+    file = open(path, "a+b")
+    try:
+        fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        file.close()
+        return None
+    if os.fstat(file.fileno()).st_ino != os.stat(path).st_ino:
+        # replaced by a compaction between open and flock
+        file.close()
+        return lock_journal_file(path)
+    # drop a record torn by a crash mid-write so the next append starts a new line
+    file.seek(0)
+    data = file.read()
+    if data and not data.endswith(b"\n"):
+        file.truncate(data.rfind(b"\n") + 1)
+    return file
+
+
+def iter_records(path):
+    with open(path, "rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+
+def read_journal(directory):
+    """Accept records of every journal file in a directory, with their latest state.
+
+    An entry replayed by replay.py is accepted again in the replaying
+    process's file, where it finishes, that state wins over a pending one.
+    """
+    entries = {}
+    for path in sorted(glob.glob(os.path.join(directory, "journal-*.log"))):
+        for record in iter_records(path):
+            if record["op"] == "accept":
+                record.setdefault("state", PENDING)
+                known = entries.get(record["id"])
+                if known is None or known["state"] == PENDING:
+                    entries[record["id"]] = record
+            elif record["id"] in entries:
+                entries[record["id"]]["state"] = record["state"]
+    return sorted(entries.values(), key=lambda record: record["ts"])
+
+
+def finished_elsewhere(directory, path, entry_ids):
+    """(id, state) of the given entries that finished in another journal file."""
+    if not entry_ids:
+        return []
+    states = {}
+    for other in glob.glob(os.path.join(directory, "journal-*.log")):
+        if os.path.abspath(other) == os.path.abspath(path):
+            continue
+        for record in iter_records(other):
+            if record["id"] in entry_ids:
+                states[record["id"]] = record.get("state", PENDING)
+    return [(entry_id, state) for entry_id, state in states.items() if state != PENDING]
+
+
+def fsync_directory(directory):
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def create_event_journal():
+    directory = os.getenv(
+        "EVENT_JOURNAL_DIR",
+        os.path.join(os.getenv("GITFAILGUARD_DATA_DIR", "data"), "journal"),
+    )
+    return EventJournal(directory)
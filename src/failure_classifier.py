@@ -0,0 +1,202 @@
+import json
+import os
+import re
+import threading
+
+from metrics import FAILURE_RULE_MATCHES
+
+try:
+    # linear-time matching whatever the patterns, when available
+    import re2 as regex_engine
+except ImportError:
+    regex_engine = re
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(__file__), "failure_rules.json")
+
+CLASSIFIED_FOOTER = (
+    "\n\n_Recognized as `{rule}` by GitFailGuard's failure rules, matching:_"
+    "\n```\n{line}\n```"
+)
+
+
+def trie_pattern(literals):
+    """One regex matching any of the literals, factored into a prefix tree.
+
+    A plain alternation retries every literal at every position, the tree
+    only follows the branches that still match.
+    """
+    trie = {}
+    for literal in literals:
+        node = trie
+        for char in literal:
+            node = node.setdefault(char, {})
+        node[""] = True
+    return _trie_node_pattern(trie)
+
+
+def _trie_node_pattern(node):
+    alternatives = [
+        re.escape(char) + _trie_node_pattern(child)
+        for char, child in sorted(node.items())
+        if char
+    ]
+    if not alternatives:
+        return ""
+    pattern = (
+        alternatives[0]
+        if len(alternatives) == 1
+        else "(?:" + "|".join(alternatives) + ")"
+    )
+    if "" in node:
+        # a literal ends here, longer ones continue
+        return f"(?:{pattern})?"
+    return pattern
+
+
+def error_tail(logs, lines=10):
+    """The first ##[error] line of a window and the lines just before it.
+
+    Without a marker, the last lines of the window.
+    """
+    all_lines = logs.split("\n")
+    for end, line in enumerate(all_lines):
+        if "##[error]" in line:
+            break
+    else:
+        end = len(all_lines) - 1
+    return "\n".join(all_lines[max(end - lines, 0) : end + 1])
+
+
+class FailureClassifier:
+    """Match error windows against known failure rules compiled into a single pattern.
+
+    Runs of literal rules are merged into prefix trees and regex rules become
+    named alternatives, all in rule order, so a window is scanned once whatever
+    the number of rules. Only the error line and the tail_lines before it are
+    matched, a transient message from an earlier step doesn't stand for the
+    failure. Rules are tried in file order: when several match, the first one wins.
+    """
+
+    def __init__(self, rules, tail_lines=10):
+        self.rules = rules
+        self.tail_lines = tail_lines
+        # group name -> (literal -> rule index, ignore case)
+        self.literal_groups = {}
+        alternatives = []
+        regex_groups = {}
+        segment = {}
+        segment_ignore_case = False
+
+        def close_segment():
+            if segment:
+                group = f"l{len(self.literal_groups)}"
+                pattern = trie_pattern(segment)
+                if segment_ignore_case:
+                    pattern = f"(?i:{pattern})"
+                alternatives.append(f"(?P<{group}>{pattern})")
+                self.literal_groups[group] = (dict(segment), segment_ignore_case)
+                segment.clear()
+
+        for index, rule in enumerate(rules):
+            ignore_case = rule.get("ignore_case", False)
+            if rule.get("literals") and ignore_case != segment_ignore_case:
+                close_segment()
+                segment_ignore_case = ignore_case
+            for literal in rule.get("literals", []):
+                segment.setdefault(literal.lower() if ignore_case else literal, index)
+            if rule.get("regex"):
+                # earlier literal rules come before this one in the alternation
+                close_segment()
+                group = f"r{index}"
+                pattern = f"(?i:{rule['regex']})" if ignore_case else rule["regex"]
+                alternatives.append(f"(?P<{group}>{pattern})")
+                regex_groups[group] = index
+        close_segment()
+        self.regex_groups = regex_groups
+        self.pattern = (
+            regex_engine.compile("|".join(alternatives)) if alternatives else None
+        )
+        self.lock = threading.Lock()
+        self.counters = {"classified": 0, "unclassified": 0, "rules": {}}
+
+    def classify(self, logs):
+        """The first matching rule's templated analysis for a window, or None."""
+        match = self.match(logs)
+        with self.lock:
+            if match is None:
+                self.counters["unclassified"] += 1
+                return None
+            self.counters["classified"] += 1
+            rules = self.counters["rules"]
+            rules[match["rule"]] = rules.get(match["rule"], 0) + 1
+        FAILURE_RULE_MATCHES.inc(match["rule"])
+        rule = self.rules[match["index"]]
+        analysis = rule["analysis"].format(match=match["match"], line=match["line"])
+        return analysis + CLASSIFIED_FOOTER.format(
+            rule=rule["name"], line=match["line"]
+        )
+
+    def match(self, logs):
+        if self.pattern is None:
+            return None
+        logs = error_tail(logs, self.tail_lines)
+        best = None
+        # every position a rule matches at, not only those finditer would
+        # reach after the previous match, so an overlapping earlier rule isn't skipped
+        pos = 0
+        while True:
+            found = self.pattern.search(logs, pos)
+            if found is None:
+                break
+            index = self._rule_index(found)
+            if best is None or index < best[0]:
+                best = (index, found)
+                if index == 0:
+                    break
+            pos = found.start() + 1
+        if best is None:
+            return None
+        index, found = best
+        line_start = logs.rfind("\n", 0, found.start()) + 1
+        line_end = logs.find("\n", found.end())
+        line = logs[line_start : line_end if line_end != -1 else len(logs)]
+        return {
+            "index": index,
+            "rule": self.rules[index]["name"],
+            "match": found.group(0),
+            "line": line.strip(),
+        }
+
+    def stats(self):
+        with self.lock:
+            return {
+                "rules": len(self.rules),
+                "classified": self.counters["classified"],
+                "unclassified": self.counters["unclassified"],
+                "by_rule": dict(self.counters["rules"]),
+            }
+
+    def _rule_index(self, found):
+        group = found.lastgroup
+        if group not in self.literal_groups:
+            return self.regex_groups[group]
+        literals, ignore_case = self.literal_groups[group]
+        text = found.group(0).lower() if ignore_case else found.group(0)
+        # the tree matches the longest literal, a shorter one may belong to an earlier rule
+        return min(
+            literals[text[:end]]
+            for end in range(1, len(text) + 1)
+            if text[:end] in literals
+        )
+
+
+def load_rules(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def create_failure_classifier():
+    path = os.getenv("FAILURE_RULES_PATH", DEFAULT_RULES_PATH)
+    if not path:
+        return FailureClassifier([])
+    return FailureClassifier(load_rules(path))
@@ -0,0 +1,135 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from analysis_cache import normalize_window
+
+ERROR_LINE_PATTERN = re.compile(
+    r"##\[error\]|\berror\b|\bfailed\b|\bfailure\b|\bexception\b|\bfatal\b|\btraceback\b",
+    re.I,
+)
+
+
+def failure_signature(logs):
+    # fingerprint the error lines only, so noise printed around them doesn't matter
+    lines = [line for line in logs.split("\n") if ERROR_LINE_PATTERN.search(line)]
+    if not lines:
+        lines = logs.split("\n")
+    normalized = normalize_window("\n".join(line.strip() for line in lines))
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+
+
+def issue_number_from_url(issue_url):
+    try:
+        return int(issue_url.rstrip("/").split("/")[-1])
+    except (AttributeError, ValueError):
+        return None
+
+
+class FailureIndex:
+    """Persistent map of failure signatures to the issue already tracking them."""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = None
+
+    def connect(self):
+        if self.conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self.conn = sqlite3.connect(self.path, check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS failures ("
+                " repo TEXT NOT NULL, workflow TEXT NOT NULL, signature TEXT NOT NULL,"
+                " issue_url TEXT NOT NULL, issue_number INTEGER,"
+                " count INTEGER NOT NULL DEFAULT 1,"
+                " first_seen REAL NOT NULL, last_seen REAL NOT NULL,"
+                " PRIMARY KEY (repo, workflow, signature)) WITHOUT ROWID"
+            )
+        return self.conn
+
+    def lookup(self, repo, workflow, signature):
+        with self.lock:
+            row = (
+                self.connect()
+                .execute(
+                    "SELECT issue_url, issue_number, count, first_seen, last_seen"
+                    " FROM failures WHERE repo = ? AND workflow = ? AND signature = ?",
+                    (repo, workflow, signature),
+                )
+                .fetchone()
+            )
+        if row is None:
+            return None
+        issue_url, issue_number, count, first_seen, last_seen = row
+        return {
+            "issue_url": issue_url,
+            "issue_number": issue_number,
+            "count": count,
+            "first_seen": first_seen,
+            "last_seen": last_seen,
+        }
+
+    def record(self, repo, workflow, signature, issue_url):
+        now = time.time()
+        with self.lock:
+            conn = self.connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO failures"
+                " (repo, workflow, signature, issue_url, issue_number, count, first_seen, last_seen)"
+                " VALUES (?, ?, ?, ?, ?, 1, ?, ?)",
+                (
+                    repo,
+                    workflow,
+                    signature,
+                    issue_url,
+                    issue_number_from_url(issue_url),
+                    now,
+                    now,
+                ),
+            )
+            conn.commit()
+
+    def seen_again(self, repo, workflow, signature):
+        """Bump the counter of a known failure and return its new count."""
+        with self.lock:
+            conn = self.connect()
+            conn.execute(
+                "UPDATE failures SET count = count + 1, last_seen = ?"
+                " WHERE repo = ? AND workflow = ? AND signature = ?",
+                (time.time(), repo, workflow, signature),
+            )
+            conn.commit()
+            row = conn.execute(
+                "SELECT count FROM failures WHERE repo = ? AND workflow = ? AND signature = ?",
+                (repo, workflow, signature),
+            ).fetchone()
+        return row[0] if row else None
+
+    def forget(self, repo, workflow, signature):
+        with self.lock:
+            conn = self.connect()
+            conn.execute(
+                "DELETE FROM failures WHERE repo = ? AND workflow = ? AND signature = ?",
+                (repo, workflow, signature),
+            )
+            conn.commit()
+
+    def __len__(self):
+        with self.lock:
+            return self.connect().execute("SELECT COUNT(*) FROM failures").fetchone()[0]
+
+
+def create_failure_index():
+    path = os.getenv(
+        "FAILURE_INDEX_PATH",
+        os.path.join(os.getenv("GITFAILGUARD_DATA_DIR", "data"), "failures.sqlite3"),
+    )
+    return FailureIndex(path)
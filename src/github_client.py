@@ -0,0 +1,329 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+import weakref
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+from metrics import GITHUB_RETRIES, GITHUB_SECONDS
+from rate_limiter import RateLimitScheduler, INTERACTIVE, BATCH
+
+logger = logging.getLogger(__name__)
+
+GITHUB_API_URL = "https://api.github.com"
+
+# statuses worth retrying for requests that are safe to send twice
+RETRY_STATUS_CODES = {500, 502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+_session = None
+_session_lock = threading.Lock()
+
+# aiohttp sessions are bound to the loop they were created on
+_async_sessions = weakref.WeakKeyDictionary()
+
+# one scheduler per process paces every call made with the shared token
+scheduler = RateLimitScheduler()
+default_priority = os.getenv("GITHUB_PRIORITY", INTERACTIVE)
+
+
+def set_default_priority(priority):
+    global default_priority
+    default_priority = priority
+
+
+def create_session(pool_size=None):
+    if pool_size is None:
+        pool_size = int(os.getenv("GITHUB_POOL_SIZE", 10))
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update(
+        {
+            "Authorization": f"token {os.getenv('GITHUB_TOKEN')}",
+            "Accept": "application/vnd.github.v3+json",
+        }
+    )
+    return session
+
+
+def get_session():
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = create_session()
+        return _session
+
+
+def create_async_session(pool_size=None):
+    if pool_size is None:
+        pool_size = int(os.getenv("GITHUB_ASYNC_POOL_SIZE", 100))
+    return aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit=pool_size),
+        headers={
+            "Authorization": f"token {os.getenv('GITHUB_TOKEN')}",
+            "Accept": "application/vnd.github.v3+json",
+        },
+    )
+
+
+def get_async_session():
+    loop = asyncio.get_running_loop()
+    session = _async_sessions.get(loop)
+    if session is None or session.closed:
+        session = create_async_session()
+        _async_sessions[loop] = session
+    return session
+
+
+async def close_async_session():
+    session = _async_sessions.pop(asyncio.get_running_loop(), None)
+    if session is not None:
+        await session.close()
+
+
+def get_timeout():
+    return (
+        float(os.getenv("GITHUB_CONNECT_TIMEOUT", 5)),
+        float(os.getenv("GITHUB_READ_TIMEOUT", 30)),
+    )
+
+
+def github_get(url, **kwargs):
+    return github_request("GET", url, **kwargs)
+
+
+def github_post(url, **kwargs):
+    return github_request("POST", url, **kwargs)
+
+
+def github_request(
+    method, url, max_retries=None, timeout=None, priority=None, **kwargs
+):
+    """Send a paced request through the shared session, retrying 5xx and rate limits."""
+    if url.startswith("/"):
+        url = GITHUB_API_URL + url
+    if max_retries is None:
+        max_retries = int(os.getenv("GITHUB_MAX_RETRIES", 3))
+    max_rate_limit_retries = int(os.getenv("GITHUB_MAX_RATE_LIMIT_RETRIES", 10))
+    if timeout is None:
+        timeout = get_timeout()
+    if priority is None:
+        priority = default_priority
+    session = get_session()
+    endpoint = github_endpoint(url)
+
+    attempt = 0
+    rate_limit_attempt = 0
+    while True:
+        scheduler.acquire(priority)
+        start = time.perf_counter()
+        try:
+            response = session.request(method, url, timeout=timeout, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            GITHUB_SECONDS.observe(
+                time.perf_counter() - start, method, endpoint, "error"
+            )
+            if attempt >= max_retries or not should_retry_error(method, e):
+                raise
+            GITHUB_RETRIES.inc("error")
+            delay = backoff_delay(attempt)
+            logger.warning(
+                "GitHub request to %s failed (%s), retrying in %.1fs", url, e, delay
+            )
+            time.sleep(delay)
+            attempt += 1
+            continue
+
+        GITHUB_SECONDS.observe(
+            time.perf_counter() - start, method, endpoint, str(response.status_code)
+        )
+        rate_limited = is_rate_limited(response)
+        scheduler.update(response, rate_limited=rate_limited)
+        if rate_limited and rate_limit_attempt < max_rate_limit_retries:
+            # the scheduler holds every caller back until the limit resets
+            logger.warning(
+                "GitHub rate limit hit on %s, waiting for the limit to reset", url
+            )
+            response.close()
+            GITHUB_RETRIES.inc("rate_limit")
+            rate_limit_attempt += 1
+            continue
+        if rate_limited or attempt >= max_retries or not should_retry(method, response):
+            return response
+        delay = backoff_delay(attempt)
+        logger.warning(
+            "GitHub request to %s returned %s, retrying in %.1fs",
+            url,
+            response.status_code,
+            delay,
+        )
+        response.close()
+        GITHUB_RETRIES.inc("status")
+        time.sleep(delay)
+        attempt += 1
+
+
+class AsyncResponse:
+    """The parts of requests.Response the pipeline uses, over an aiohttp response."""
+
+    def __init__(self, raw, content=None):
+        self.raw = raw
+        self.status_code = raw.status
+        self.headers = raw.headers
+        self.encoding = raw.charset
+        self.content = content
+        self.bytes_read = len(content) if content is not None else 0
+
+    @property
+    def text(self):
+        return (self.content or b"").decode(self.encoding or "utf-8", errors="replace")
+
+    def json(self):
+        return json.loads(self.text)
+
+    def raise_for_status(self):
+        self.raw.raise_for_status()
+
+    async def iter_content(self, chunk_size):
+        async for chunk in self.raw.content.iter_chunked(chunk_size):
+            self.bytes_read += len(chunk)
+            yield chunk
+
+    def close(self):
+        self.raw.release()
+
+
+async def github_get_async(url, **kwargs):
+    return await github_request_async("GET", url, **kwargs)
+
+
+async def github_post_async(url, **kwargs):
+    return await github_request_async("POST", url, **kwargs)
+
+
+async def github_request_async(
+    method, url, max_retries=None, timeout=None, priority=None, stream=False, **kwargs
+):
+    """Async github_request on a shared aiohttp session, with the same pacing and retries.
+
+    The body is read up front unless stream is set and the request succeeded,
+    in which case the caller reads it with iter_content and must close().
+    """
+    if url.startswith("/"):
+        url = GITHUB_API_URL + url
+    if max_retries is None:
+        max_retries = int(os.getenv("GITHUB_MAX_RETRIES", 3))
+    max_rate_limit_retries = int(os.getenv("GITHUB_MAX_RATE_LIMIT_RETRIES", 10))
+    if timeout is None:
+        timeout = get_timeout()
+    connect_timeout, read_timeout = timeout
+    timeout = aiohttp.ClientTimeout(
+        sock_connect=connect_timeout, sock_read=read_timeout
+    )
+    if priority is None:
+        priority = default_priority
+    session = get_async_session()
+    endpoint = github_endpoint(url)
+
+    attempt = 0
+    rate_limit_attempt = 0
+    while True:
+        await scheduler.acquire_async(priority)
+        start = time.perf_counter()
+        try:
+            raw = await session.request(method, url, timeout=timeout, **kwargs)
+            if stream and raw.status == 200:
+                response = AsyncResponse(raw)
+            else:
+                response = AsyncResponse(raw, await raw.read())
+                raw.release()
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+            GITHUB_SECONDS.observe(
+                time.perf_counter() - start, method, endpoint, "error"
+            )
+            if attempt >= max_retries or not should_retry_error(method, e):
+                raise
+            GITHUB_RETRIES.inc("error")
+            delay = backoff_delay(attempt)
+            logger.warning(
+                "GitHub request to %s failed (%r), retrying in %.1fs", url, e, delay
+            )
+            await asyncio.sleep(delay)
+            attempt += 1
+            continue
+
+        GITHUB_SECONDS.observe(
+            time.perf_counter() - start, method, endpoint, str(response.status_code)
+        )
+        rate_limited = is_rate_limited(response)
+        scheduler.update(response, rate_limited=rate_limited)
+        if rate_limited and rate_limit_attempt < max_rate_limit_retries:
+            logger.warning(
+                "GitHub rate limit hit on %s, waiting for the limit to reset", url
+            )
+            response.close()
+            GITHUB_RETRIES.inc("rate_limit")
+            rate_limit_attempt += 1
+            continue
+        if rate_limited or attempt >= max_retries or not should_retry(method, response):
+            return response
+        delay = backoff_delay(attempt)
+        logger.warning(
+            "GitHub request to %s returned %s, retrying in %.1fs",
+            url,
+            response.status_code,
+            delay,
+        )
+        response.close()
+        GITHUB_RETRIES.inc("status")
+        await asyncio.sleep(delay)
+        attempt += 1
+
+
+def github_endpoint(url):
+    # metric label for a URL: the API path with owners, repos and ids templated out
+    path = url.split("?", 1)[0]
+    if path.startswith(GITHUB_API_URL):
+        path = path[len(GITHUB_API_URL) :]
+    path = re.sub(r"^/repos/[^/]+/[^/]+", "/repos/:owner/:repo", path)
+    return re.sub(r"/\d+(?=/|$)", "/:id", path)
+
+
+def should_retry(method, response):
+    return (
+        method.upper() in IDEMPOTENT_METHODS
+        and response.status_code in RETRY_STATUS_CODES
+    )
+
+
+def should_retry_error(method, error):
+    # GitHub may have created the issue or comment before a read timeout or a
+    # dropped connection, only a request that never connected can be sent again
+    return method.upper() in IDEMPOTENT_METHODS or isinstance(
+        error, (requests.ConnectTimeout, aiohttp.ClientConnectorError)
+    )
+
+
+def is_rate_limited(response):
+    if response.status_code == 429:
+        return True
+    if response.status_code != 403:
+        return False
+    if "Retry-After" in response.headers:
+        return True
+    if response.headers.get("X-RateLimit-Remaining") == "0":
+        return True
+    return "rate limit" in response.text.lower()
+
+
+def backoff_delay(attempt):
+    # exponential backoff with full jitter so concurrent workers don't retry in lockstep
+    base = float(os.getenv("GITHUB_BACKOFF_BASE", 1))
+    return random.uniform(0, min(base * 2**attempt, 60))
@@ -1,64 +1,168 @@
+import logging
 import os
-import requests
 import time
 import openai
 
+from async_runtime import run_sync
+from github_client import github_get_async, github_post_async
+from metrics import ISSUE_CREATE_SECONDS, LLM_SECONDS, record_llm_usage
+
+logger = logging.getLogger(__name__)
+
+REPLY_MODEL = "gpt-3.5-turbo"
+
 
 def create_github_issue(repo_name, workflow_name, logs_url, analysis):
+    return run_sync(
+        create_github_issue_async(repo_name, workflow_name, logs_url, analysis)
+    )
+
+
+async def create_github_issue_async(repo_name, workflow_name, logs_url, analysis):
     issue_title = f"GitFailGuard: {workflow_name} {int(time.time())}"
     issue_body = (
         f"The GitHub Action `{workflow_name}` failed.\n\n"
         f"Logs: [View Logs]({logs_url})\n\n"
         f"Analysis:\n{analysis}"
     )
+    return await open_github_issue_async(repo_name, issue_title, issue_body)
+
+
+async def create_run_issue_async(repo_name, run_name, causes):
+    """One issue for the failed jobs of a run, causes being (jobs, analysis) pairs."""
+    job_count = sum(len(jobs) for jobs, _ in causes)
+    issue_title = (
+        f"GitFailGuard: {run_name} ({job_count} failed jobs) {int(time.time())}"
+    )
+    issue_body = (
+        f"The GitHub Actions run `{run_name}` failed in {job_count} jobs"
+        f" with {len(causes)} distinct {'cause' if len(causes) == 1 else 'causes'}."
+    )
+    for number, (jobs, analysis) in enumerate(causes, 1):
+        job_links = "\n".join(f"- [{job['name']}]({job['html_url']})" for job in jobs)
+        issue_body += (
+            f"\n\n## Cause {number}\n\n"
+            f"Affected jobs:\n{job_links}\n\n"
+            f"Analysis:\n{analysis}"
+        )
+    return await open_github_issue_async(repo_name, issue_title, issue_body)
+
+
+async def open_github_issue_async(repo_name, issue_title, issue_body):
     github_api_url = f"https://api.github.com/repos/{repo_name}/issues"
-    headers = {
-        "Authorization": f"token {os.getenv('GITHUB_TOKEN')}",
-        "Accept": "application/vnd.github.v3+json",
-    }
     data = {"title": issue_title, "body": issue_body}
-    response = requests.post(github_api_url, headers=headers, json=data)
+    start = time.perf_counter()
+    response = await github_post_async(github_api_url, json=data)
+    ISSUE_CREATE_SECONDS.observe(time.perf_counter() - start, str(response.status_code))
     if response.status_code == 201:
         issue_url = response.json().get("html_url")
-        print(f"Issue created successfully: {issue_url}")
+        logger.info("Issue created: %s", issue_url)
         return issue_url
     else:
-        print(f"Failed to create issue: {response.content}")
+        logger.error(
+            "Failed to create issue in %s, status code: %s: %s",
+            repo_name,
+            response.status_code,
+            response.content,
+        )
 
 
-def respond_to_issue_comment(issue_title, issue_body, comment_body):
-    openai.api_key = os.getenv("OPENAI_API_KEY")
-    prompt = (
-        f"You are a helpful AI assistant named GitFailGuard. A user has commented on the issue titled '{issue_title}' "
-        f"with the following description:\n\n{issue_body}\n\n"
-        f"The user asked the following question:\n\n'{comment_body}'\n\n"
-        "Please provide a helpful and detailed response to their question."
+def is_issue_open(repo_name, issue_number):
+    return run_sync(is_issue_open_async(repo_name, issue_number))
+
+
+async def is_issue_open_async(repo_name, issue_number):
+    github_api_url = f"https://api.github.com/repos/{repo_name}/issues/{issue_number}"
+    response = await github_get_async(github_api_url)
+    if response.status_code != 200:
+        logger.error(
+            "Failed to fetch issue %s#%s, status code: %s",
+            repo_name,
+            issue_number,
+            response.status_code,
+        )
+        return False
+    return response.json().get("state") == "open"
+
+
+def respond_to_issue_comment(issue_title, issue_body, comment_body, conversation=None):
+    return run_sync(
+        respond_to_issue_comment_async(
+            issue_title, issue_body, comment_body, conversation
+        )
     )
-    response = openai.ChatCompletion.create(
-        model="gpt-3.5-turbo",
-        messages=[
-            {
-                "role": "user",
-                "content": prompt,
-            }
-        ],
-        temperature=0,
+
+
+async def respond_to_issue_comment_async(
+    issue_title, issue_body, comment_body, conversation=None
+):
+    openai.api_key = os.getenv("OPENAI_API_KEY")
+    if conversation is None:
+        prompt = (
+            f"You are a helpful AI assistant named GitFailGuard. A user has commented on the issue titled '{issue_title}' "
+            f"with the following description:\n\n{issue_body}\n\n"
+            f"The user asked the following question:\n\n'{comment_body}'\n\n"
+            "Please provide a helpful and detailed response to their question."
+        )
+        messages = [{"role": "user", "content": prompt}]
+    else:
+        messages = conversation_messages(issue_title, conversation, comment_body)
+    with LLM_SECONDS.time(REPLY_MODEL, "reply"):
+        response = await openai.ChatCompletion.acreate(
+            model=REPLY_MODEL,
+            messages=messages,
+            temperature=0,
+        )
+    record_llm_usage(response, REPLY_MODEL, "reply")
+    return response.choices[0].message["content"]
+
+
+def conversation_messages(issue_title, conversation, comment_body):
+    """Prompt of a reply: the condensed issue, the thread's summary and last exchanges."""
+    system = (
+        "You are a helpful AI assistant named GitFailGuard, answering users who comment"
+        f" on the issue titled '{issue_title}' with the following description:"
+        f"\n\n{conversation['issue']}"
     )
+    if conversation["summary"]:
+        system += (
+            f"\n\nSummary of the earlier conversation:\n\n{conversation['summary']}"
+        )
+    system += "\n\nPlease provide a helpful and detailed response to their questions."
+    return [
+        {"role": "system", "content": system},
+        *conversation["turns"],
+        {"role": "user", "content": comment_body},
+    ]
+
+
+async def summarize_thread_async(prompt, text, max_tokens):
+    openai.api_key = os.getenv("OPENAI_API_KEY")
+    with LLM_SECONDS.time(REPLY_MODEL, "thread_summary"):
+        response = await openai.ChatCompletion.acreate(
+            model=REPLY_MODEL,
+            messages=[{"role": "user", "content": f"{prompt}:\n\n{text}"}],
+            max_tokens=max_tokens,
+            temperature=0,
+        )
+    record_llm_usage(response, REPLY_MODEL, "thread_summary")
     return response.choices[0].message["content"]
 
 
 def post_comment_to_pull_request(repo_owner, repo_name, pr_number, comment):
-    github_token = os.getenv("GITHUB_TOKEN")
+    return run_sync(
+        post_comment_to_pull_request_async(repo_owner, repo_name, pr_number, comment)
+    )
+
+
+async def post_comment_to_pull_request_async(repo_owner, repo_name, pr_number, comment):
     github_api_url = f"https://api.github.com/repos/{repo_owner}/{repo_name}/issues/{pr_number}/comments"
-    headers = {
-        "Authorization": f"token {github_token}",
-        "Accept": "application/vnd.github.v3+json",
-    }
     data = {"body": comment}
-    response = requests.post(github_api_url, headers=headers, json=data)
+    response = await github_post_async(github_api_url, json=data)
     if response.status_code == 201:
-        print("Comment posted successfully.")
-        return response.json().get("html_url")
+        comment_url = response.json().get("html_url")
+        logger.info("Comment posted: %s", comment_url)
+        return comment_url
     else:
-        print(f"Failed to post comment: {response.content}")
+        logger.error("Failed to post comment: %s", response.content)
         return False
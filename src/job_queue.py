@@ -0,0 +1,212 @@
+import asyncio
+import contextvars
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from async_runtime import submit
+from metrics import STAGE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+class LatencyTracker:
+    """Keep a rolling window of latency samples per stage."""
+
+    def __init__(self, window=1000):
+        self.window = window
+        self.samples = {}
+        self.lock = threading.Lock()
+
+    def record(self, stage, seconds):
+        STAGE_SECONDS.observe(seconds, stage)
+        with self.lock:
+            if stage not in self.samples:
+                self.samples[stage] = deque(maxlen=self.window)
+            self.samples[stage].append(seconds)
+
+    def summary(self):
+        with self.lock:
+            snapshot = {stage: sorted(values) for stage, values in self.samples.items()}
+        summary = {}
+        for stage, values in snapshot.items():
+            if not values:
+                continue
+            summary[stage] = {
+                "count": len(values),
+                "avg_ms": round(sum(values) / len(values) * 1000, 2),
+                "p50_ms": round(percentile(values, 50) * 1000, 2),
+                "p99_ms": round(percentile(values, 99) * 1000, 2),
+                "max_ms": round(values[-1] * 1000, 2),
+            }
+        return summary
+
+
+def percentile(sorted_values, pct):
+    index = int(round((pct / 100) * (len(sorted_values) - 1)))
+    return sorted_values[index]
+
+
+class JobQueue:
+    """Bounded queue of webhook events processed by a pool of worker threads.
+
+    Coroutine handlers are handed to the async pipeline loop instead of being
+    run on the worker, so a few workers can keep up to async_concurrency jobs
+    in flight.
+    """
+
+    def __init__(self, max_size=None, concurrency=None, async_concurrency=None):
+        if max_size is None:
+            max_size = int(os.getenv("WEBHOOK_QUEUE_SIZE", 100))
+        if concurrency is None:
+            concurrency = int(os.getenv("WEBHOOK_WORKERS", 4))
+        if async_concurrency is None:
+            async_concurrency = int(os.getenv("WEBHOOK_ASYNC_CONCURRENCY", 200))
+        self.max_size = max_size
+        self.concurrency = concurrency
+        self.async_concurrency = async_concurrency
+        self.async_slots = threading.BoundedSemaphore(async_concurrency)
+        self.app = None
+        self.queue = queue.Queue(maxsize=max_size)
+        self.latency = LatencyTracker()
+        self.workers = []
+        self.lock = threading.Lock()
+        self.counters = {"submitted": 0, "completed": 0, "failed": 0, "rejected": 0}
+        self.busy = 0
+        self.accepting = True
+
+    def init_app(self, app):
+        # handlers build their responses with jsonify, which needs an app context
+        self.app = app
+
+    def start(self):
+        with self.lock:
+            if self.workers:
+                return
+            for i in range(self.concurrency):
+                worker = threading.Thread(
+                    target=self._worker, name=f"webhook-worker-{i}", daemon=True
+                )
+                worker.start()
+                self.workers.append(worker)
+
+    def submit(self, kind, handler, *args):
+        """Enqueue a job without blocking, returning False when the queue is full."""
+        if not self.accepting:
+            self._count("rejected")
+            return False
+        self.start()
+        try:
+            # jobs run in the submitter's context, so their records keep its log fields
+            self.queue.put_nowait(
+                (kind, handler, args, time.monotonic(), contextvars.copy_context())
+            )
+        except queue.Full:
+            self._count("rejected")
+            return False
+        self._count("submitted")
+        return True
+
+    def join(self):
+        self.queue.join()
+
+    def shutdown(self, timeout=None):
+        """Stop accepting jobs and wait for queued and running ones, returning True once drained."""
+        self.accepting = False
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.queue.all_tasks_done:
+            while self.queue.unfinished_tasks:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.queue.all_tasks_done.wait(remaining)
+        return True
+
+    def is_alive(self):
+        # workers are started lazily, so no workers yet is still healthy
+        with self.lock:
+            return all(worker.is_alive() for worker in self.workers)
+
+    def is_ready(self):
+        return self.accepting and not self.queue.full()
+
+    def stats(self):
+        with self.lock:
+            counters = dict(self.counters)
+            busy = self.busy
+        return {
+            "queue_depth": self.queue.qsize(),
+            "queue_max_size": self.max_size,
+            "workers": self.concurrency,
+            "async_concurrency": self.async_concurrency,
+            "busy_workers": busy,
+            **counters,
+            "latency": self.latency.summary(),
+        }
+
+    @contextmanager
+    def timed(self, stage):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.latency.record(stage, time.monotonic() - start)
+
+    def _count(self, name):
+        with self.lock:
+            self.counters[name] += 1
+
+    def _worker(self):
+        while True:
+            kind, handler, args, enqueued_at, context = self.queue.get()
+            self.latency.record("queue_wait", time.monotonic() - enqueued_at)
+            with self.lock:
+                self.busy += 1
+            if asyncio.iscoroutinefunction(handler):
+                self._dispatch(kind, handler, args, context)
+                continue
+            started = time.monotonic()
+            try:
+                context.run(self._run, handler, args)
+                error = None
+            except Exception as e:
+                error = e
+            context.run(self._finish, kind, started, error)
+
+    def _dispatch(self, kind, handler, args, context):
+        # blocks the worker once async_concurrency jobs are in flight
+        self.async_slots.acquire()
+        started = time.monotonic()
+
+        def done(future):
+            self.async_slots.release()
+            context.run(self._finish, kind, started, future.exception())
+
+        submit(self._run_async(handler, args)).add_done_callback(done)
+
+    def _finish(self, kind, started, error):
+        self.latency.record(kind, time.monotonic() - started)
+        if error is None:
+            self._count("completed")
+        else:
+            logger.error("%s job failed: %s", kind, error, exc_info=error)
+            self._count("failed")
+        with self.lock:
+            self.busy -= 1
+        self.queue.task_done()
+
+    def _run(self, handler, args):
+        if self.app is None:
+            return handler(*args)
+        with self.app.app_context():
+            return handler(*args)
+
+    async def _run_async(self, handler, args):
+        if self.app is None:
+            return await handler(*args)
+        with self.app.app_context():
+            return await handler(*args)
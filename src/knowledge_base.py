@@ -0,0 +1,233 @@
+import fcntl
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from analysis_cache import normalize_window
+from failure_index import ERROR_LINE_PATTERN
+
+TOKEN_PATTERN = re.compile(r"<\w+>|\w+")
+SHINGLE_SIZE = 3
+# error lines weigh more than the context around them
+ERROR_LINE_WEIGHT = 3
+
+ANSWERED_FOOTER = "\n\n_Answered from the analysis of a near-identical past failure._"
+
+# one fixed-size record per entry: its sketch and its row in the entries table
+RECORD = np.dtype([("sketch", "<u8"), ("id", "<u8")])
+
+
+def simhash(logs):
+    """64-bit SimHash of a log window's normalized token shingles, None if it has no tokens.
+
+    Windows differing in a few lines get sketches a few bits apart, so the
+    Hamming distance between sketches approximates how different they are.
+    """
+    digests = []
+    weights = []
+    for line in normalize_window(logs).split("\n"):
+        tokens = TOKEN_PATTERN.findall(line)
+        if not tokens:
+            continue
+        weight = ERROR_LINE_WEIGHT if ERROR_LINE_PATTERN.search(line) else 1
+        for i in range(max(len(tokens) - SHINGLE_SIZE, 0) + 1):
+            shingle = " ".join(tokens[i : i + SHINGLE_SIZE])
+            digests.append(
+                hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest()
+            )
+            weights.append(weight)
+    if not digests:
+        return None
+    hashes = np.frombuffer(b"".join(digests), dtype="<u8")
+    bits = np.unpackbits(
+        hashes.view(np.uint8).reshape(-1, 8), axis=1, bitorder="little"
+    )
+    # every shingle votes +weight or -weight on each bit
+    votes = np.asarray(weights, dtype=np.int64) @ (bits.astype(np.int64) * 2 - 1)
+    return int(np.packbits(votes > 0, bitorder="little").view("<u8")[0])
+
+
+class KnowledgeBase:
+    """Past error windows and their analyses, recalled by SimHash distance.
+
+    Sketches are appended to a flat file that is memory-mapped and scanned
+    whole with a vectorized XOR and popcount, a few milliseconds per million
+    entries, so opening it costs nothing however large it grows. The windows
+    and analyses themselves live in SQLite and are only read for the nearest
+    matches. Appends hold an flock, so the processes of a node share a directory.
+
+    Entries keep the repository they were analyzed for. Only an entry of the
+    same repository answers as is, its paths and advice may not apply
+    elsewhere, unless the base is shared; other repositories' entries are
+    still offered as examples.
+    """
+
+    def __init__(
+        self,
+        directory,
+        answer_distance=3,
+        context_distance=12,
+        max_examples=2,
+        excerpt_chars=2000,
+        shared=False,
+    ):
+        self.directory = directory
+        self.answer_distance = answer_distance
+        self.context_distance = context_distance
+        self.max_examples = max_examples
+        self.excerpt_chars = excerpt_chars
+        self.shared = shared
+        self.sketch_path = os.path.join(directory, "sketches.bin")
+        self.lock = threading.Lock()
+        self.conn = None
+        self.records = np.zeros(0, dtype=RECORD)
+        self.mapped_size = 0
+        self.counters = {"answered": 0, "context": 0, "miss": 0, "recorded": 0}
+
+    def connect(self):
+        if self.conn is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self.conn = sqlite3.connect(
+                os.path.join(self.directory, "entries.sqlite3"),
+                check_same_thread=False,
+            )
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " id INTEGER PRIMARY KEY, window TEXT NOT NULL,"
+                " analysis TEXT NOT NULL, created_at REAL NOT NULL, repo TEXT)"
+            )
+            columns = [
+                row[1] for row in self.conn.execute("PRAGMA table_info(entries)")
+            ]
+            if "repo" not in columns:
+                # entries recorded before they were scoped, never answer as is
+                self.conn.execute("ALTER TABLE entries ADD COLUMN repo TEXT")
+        return self.conn
+
+    def nearest(self, logs, k=None, max_distance=None, sketch=None):
+        """Closest past entries to a window, nearest first, as dicts with their distance."""
+        if k is None:
+            k = self.max_examples
+        if max_distance is None:
+            max_distance = self.context_distance
+        if sketch is None:
+            sketch = simhash(logs)
+        with self.lock:
+            records = self._map()
+        if sketch is None or not len(records):
+            return []
+        distances = np.bitwise_count(records["sketch"] ^ np.uint64(sketch))
+        if len(distances) > k:
+            candidates = np.argpartition(distances, k)[:k]
+        else:
+            candidates = np.arange(len(distances))
+        candidates = candidates[np.argsort(distances[candidates], kind="stable")]
+        found = [
+            (int(distances[index]), int(records["id"][index]))
+            for index in candidates
+            if distances[index] <= max_distance
+        ]
+        if not found:
+            return []
+        with self.lock:
+            rows = dict(
+                (row[0], row[1:])
+                for row in self.connect().execute(
+                    "SELECT id, window, analysis, created_at, repo FROM entries"
+                    f" WHERE id IN ({','.join('?' * len(found))})",
+                    [entry_id for _, entry_id in found],
+                )
+            )
+        return [
+            {
+                "id": entry_id,
+                "distance": distance,
+                "window": rows[entry_id][0],
+                "analysis": rows[entry_id][1],
+                "created_at": rows[entry_id][2],
+                "repo": rows[entry_id][3],
+            }
+            for distance, entry_id in found
+            if entry_id in rows
+        ]
+
+    def answer(self, matches, repo):
+        """The match to reuse as the analysis of a window of repo, or None."""
+        for match in matches:
+            if match["distance"] > self.answer_distance:
+                break
+            if self.shared or (repo is not None and match["repo"] == repo):
+                return match
+        return None
+
+    def record(self, logs, analysis, sketch=None, repo=None):
+        """Add an analyzed window, returning its entry ID (None for a window without tokens)."""
+        if sketch is None:
+            sketch = simhash(logs)
+        if sketch is None:
+            return None
+        with self.lock:
+            conn = self.connect()
+            entry_id = conn.execute(
+                "INSERT INTO entries (window, analysis, created_at, repo)"
+                " VALUES (?, ?, ?, ?)",
+                (logs[-self.excerpt_chars :], analysis, time.time(), repo),
+            ).lastrowid
+            conn.commit()
+            record = np.array([(sketch, entry_id)], dtype=RECORD).tobytes()
+            with open(self.sketch_path, "ab") as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                # a record torn by a crash is cut off so the next ones stay aligned
+                size = f.seek(0, os.SEEK_END)
+                if size % RECORD.itemsize:
+                    f.truncate(size - size % RECORD.itemsize)
+                f.write(record)
+            self.counters["recorded"] += 1
+        return entry_id
+
+    def count(self, result):
+        with self.lock:
+            self.counters[result] += 1
+
+    def stats(self):
+        with self.lock:
+            entries = len(self._map())
+            return {"directory": self.directory, "entries": entries, **self.counters}
+
+    def _map(self):
+        # remap once other processes or this one appended records
+        try:
+            size = os.stat(self.sketch_path).st_size
+        except FileNotFoundError:
+            return self.records
+        size -= size % RECORD.itemsize
+        if size != self.mapped_size and size:
+            self.records = np.memmap(
+                self.sketch_path,
+                dtype=RECORD,
+                mode="r",
+                shape=(size // RECORD.itemsize,),
+            )
+            self.mapped_size = size
+        return self.records
+
+
+def create_knowledge_base():
+    """Knowledge base in KNOWLEDGE_BASE_DIR, or None when it isn't set."""
+    directory = os.getenv("KNOWLEDGE_BASE_DIR")
+    if not directory:
+        return None
+    return KnowledgeBase(
+        directory,
+        answer_distance=int(os.getenv("KNOWLEDGE_BASE_ANSWER_DISTANCE", 3)),
+        context_distance=int(os.getenv("KNOWLEDGE_BASE_CONTEXT_DISTANCE", 12)),
+        max_examples=int(os.getenv("KNOWLEDGE_BASE_EXAMPLES", 2)),
+        # every repository's analyses answer every other's, for orgs of look-alikes
+        shared=bool(os.getenv("KNOWLEDGE_BASE_SHARED")),
+    )
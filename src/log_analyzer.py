@@ -1,27 +1,129 @@
+import asyncio
+import logging
 import os
-import requests
+import time
 import openai
 
-from github_issue_creator import post_comment_to_pull_request
+from analysis_cache import create_analysis_cache
+from async_runtime import run_sync
+from failure_classifier import create_failure_classifier
+from knowledge_base import ANSWERED_FOOTER, create_knowledge_base, simhash
+from github_client import github_get, github_get_async
+from github_issue_creator import post_comment_to_pull_request_async
+from metrics import (
+    ANALYSIS_CACHE_REQUESTS,
+    KNOWLEDGE_BASE_REQUESTS,
+    LLM_SECONDS,
+    LOG_FETCH_BYTES,
+    LOG_FETCH_SECONDS,
+    LOG_PROCESSING_SECONDS,
+    record_llm_usage,
+)
+from run_archive import RunArchiveCache
+from token_budget import count_tokens, map_reduce_window, reduce_window
+
+logger = logging.getLogger(__name__)
+
+LOG_CHUNK_SIZE = int(os.getenv("LOG_CHUNK_SIZE", 64 * 1024))
+ANALYSIS_MODEL = "gpt-3.5-turbo"
+ANALYSIS_PROMPT = (
+    "You are a helpful AI assistant named GitFailGuard."
+    + " Analyze the following logs, determine the cause of failure and make a recommendation for a fix"
+)
+
+SUMMARY_PROMPT = (
+    "Summarize the following CI log excerpt in at most 5 short lines,"
+    + " keeping any warnings, errors, failing commands and file names verbatim"
+)
+LLM_TOKEN_BUDGET = int(os.getenv("LLM_TOKEN_BUDGET", 3000))
+# below this many failed jobs of one run, per-job log downloads are cheaper
+RUN_ARCHIVE_MIN_JOBS = int(os.getenv("RUN_ARCHIVE_MIN_JOBS", 2))
+
+analysis_cache = create_analysis_cache()
+failure_classifier = create_failure_classifier()
+knowledge_base = create_knowledge_base()
+run_archives = RunArchiveCache(chunk_size=LOG_CHUNK_SIZE)
 
 
 def fetch_logs(repo_owner, repo_name, run_id, job_id):
-    github_token = os.getenv("GITHUB_TOKEN")
-    headers = {
-        "Authorization": f"token {github_token}",
-        "Accept": "application/vnd.github.v3+json",
-    }
     url = f"https://api.github.com/repos/{repo_owner}/{repo_name}/actions/jobs/{job_id}/logs"
-    response = requests.get(url, headers=headers)
+    with LOG_FETCH_SECONDS.time("job"):
+        response = github_get(url)
     if response.status_code == 200:
+        LOG_FETCH_BYTES.observe(len(response.content), "job")
         return response.text
     else:
-        print(
-            f"Error: Unable to fetch logs from {url}, status code: {response.status_code}"
+        logger.error(
+            "Unable to fetch logs from %s, status code: %s", url, response.status_code
         )
         return False
 
 
+def fetch_error_window(repo_owner, repo_name, run_id, job_id, logs_url):
+    return run_sync(
+        fetch_error_window_async(repo_owner, repo_name, run_id, job_id, logs_url)
+    )
+
+
+async def fetch_error_window_async(repo_owner, repo_name, run_id, job_id, logs_url):
+    # stream the job log and keep only the lines since the latest ##[group]
+    # so the full log never has to be held in memory
+    url = f"https://api.github.com/repos/{repo_owner}/{repo_name}/actions/jobs/{job_id}/logs"
+    start = time.perf_counter()
+    response = await github_get_async(url, stream=True)
+    try:
+        if response.status_code != 200:
+            logger.error(
+                "Unable to fetch logs from %s, status code: %s",
+                url,
+                response.status_code,
+            )
+            return False
+        return await extract_error_window_async(aiter_log_lines(response), logs_url)
+    finally:
+        response.close()
+        # the window is cut while streaming, so this covers both
+        LOG_FETCH_SECONDS.observe(time.perf_counter() - start, "job")
+        LOG_FETCH_BYTES.observe(response.bytes_read, "job")
+
+
+class LogLineSplitter:
+    """Split a byte stream fed in chunks into lines, identically to
+    logs.split("\n").
+
+    response.iter_lines() either splits on every universal newline or, with a
+    delimiter, yields spurious empty lines at chunk boundaries, so both the
+    archive and the streaming paths split by hand through this.
+    """
+
+    def __init__(self, encoding=None):
+        self.encoding = encoding or "utf-8"
+        self.pending = b""
+
+    def feed(self, chunk):
+        lines = (self.pending + chunk).split(b"\n")
+        self.pending = lines.pop()
+        return [line.decode(self.encoding, errors="replace") for line in lines]
+
+    def close(self):
+        return self.pending.decode(self.encoding, errors="replace")
+
+
+def split_log_lines(chunks, encoding=None):
+    splitter = LogLineSplitter(encoding)
+    for chunk in chunks:
+        yield from splitter.feed(chunk)
+    yield splitter.close()
+
+
+async def aiter_log_lines(response, chunk_size=LOG_CHUNK_SIZE):
+    splitter = LogLineSplitter(response.encoding)
+    async for chunk in response.iter_content(chunk_size):
+        for line in splitter.feed(chunk):
+            yield line
+    yield splitter.close()
+
+
 def extract_info_from_url(url):
     try:
         # Split the URL by '/'
@@ -33,105 +135,323 @@ def extract_info_from_url(url):
         job_id = parts[9]
         return repo_owner, repo_name, run_id, job_id
     except Exception as e:
-        print(f"Error: Unable to fetch logs from {url}: {e}")
+        logger.error("Unable to parse logs URL %s: %s", url, e)
         return None, None, None, None
 
 
 def cleanup_logs(logs, logs_url):
-    # split by newline
-    logs = logs.split("\n")
-    # find the index of all lines containing ##[group]
-    group_indices = [i for i, line in enumerate(logs) if "##[group]" in line]
-    # find the index of the line containing ##[error]
-    error_index = [i for i, line in enumerate(logs) if "##[error]" in line]
-    if len(error_index) == 0:
-        print(f"No error found in logs for: {logs_url}")
-        return False
-    # get all logs between the last ##[group] and the first ##[error] including the line with ##[error]
-    cleaned_logs = logs[group_indices[-1] : error_index[0] + 1]
-    return "\n".join(cleaned_logs)
+    with LOG_PROCESSING_SECONDS.time("cleanup_logs"):
+        return extract_error_window(logs.split("\n"), logs_url)
+
+
+def extract_error_window(lines, logs_url):
+    # get all logs between the last ##[group] and the first ##[error] including
+    # the line with ##[error], in a single pass that stops at the first error
+    window = []
+    for line in lines:
+        if "##[group]" in line:
+            window = []
+        window.append(line)
+        if "##[error]" in line:
+            return "\n".join(window)
+    logger.warning("No error found in logs for: %s", logs_url)
+    return False
+
+
+async def extract_error_window_async(lines, logs_url):
+    window = []
+    async for line in lines:
+        if "##[group]" in line:
+            window = []
+        window.append(line)
+        if "##[error]" in line:
+            return "\n".join(window)
+    logger.warning("No error found in logs for: %s", logs_url)
+    return False
+
+
+def get_error_window(logs_url):
+    return run_sync(get_error_window_async(logs_url))
+
+
+async def get_error_windows_async(jobs, return_exceptions=False):
+    """Error windows of failed jobs of one run, given as (logs_url, job name) pairs.
+
+    With enough jobs the run's log archive is downloaded once and each job's
+    member is streamed out of it, jobs missing from it are fetched one by one.
+    A job whose logs can't be fetched gets False like one without an error
+    line, or the exception with return_exceptions.
+    """
+    windows = [None] * len(jobs)
+    repo_owner, repo_name, run_id, job_id = extract_info_from_url(jobs[0][0])
+    if len(jobs) >= RUN_ARCHIVE_MIN_JOBS > 0 and None not in [repo_owner, run_id]:
+        try:
+            archive = await run_archives.get(repo_owner, repo_name, run_id)
+        except Exception as e:
+            logger.error("Unable to fetch run logs of run %s: %r", run_id, e)
+            archive = None
+        if archive is not None:
+            windows = await asyncio.gather(
+                *(
+                    asyncio.to_thread(archived_error_window, archive, job_name, url)
+                    for url, job_name in jobs
+                ),
+                return_exceptions=True,
+            )
+            for (url, _), window in zip(jobs, windows):
+                if isinstance(window, Exception):
+                    logger.error("Unable to read archived logs of %s: %r", url, window)
+            # a member that can't be read is fetched on its own below
+            windows = [
+                None if isinstance(window, Exception) else window for window in windows
+            ]
+    missing = [index for index, window in enumerate(windows) if window is None]
+    fetched = await asyncio.gather(
+        *(get_error_window_async(jobs[index][0]) for index in missing),
+        return_exceptions=True,
+    )
+    for index, window in zip(missing, fetched):
+        if isinstance(window, Exception):
+            # one job's logs failing doesn't keep the others of the run from an issue
+            logger.error("Unable to fetch logs of %s: %r", jobs[index][0], window)
+            if not return_exceptions:
+                window = False
+        windows[index] = window
+    return windows
 
 
-def analyze_logs(logs_url, head_branch):
+def archived_error_window(archive, job_name, logs_url):
+    # the member is decompressed chunk by chunk, never held whole in memory
+    stream = archive.open_job_log(job_name)
+    if stream is None:
+        return None
+    with stream, LOG_PROCESSING_SECONDS.time("archived_window"):
+        chunks = iter(lambda: stream.read(LOG_CHUNK_SIZE), b"")
+        return extract_error_window(split_log_lines(chunks), logs_url)
+
+
+async def get_error_window_async(logs_url):
     repo_owner, repo_name, run_id, job_id = extract_info_from_url(logs_url)
 
     # return error if logs url not properly split
     if None in [repo_owner, repo_name, run_id, job_id]:
         return False
 
-    # get raw logs
-    logs = fetch_logs(repo_owner, repo_name, run_id, job_id)
+    # stream the raw logs and keep only the error portion
+    return await fetch_error_window_async(
+        repo_owner, repo_name, run_id, job_id, logs_url
+    )
 
-    # return error if we cant get logs
-    if not logs:
+
+def analyze_logs(logs_url, head_branch, logs=None):
+    return run_sync(analyze_logs_async(logs_url, head_branch, logs))
+
+
+async def analyze_logs_async(logs_url, head_branch, logs=None):
+    repo_owner, repo_name, run_id, job_id = extract_info_from_url(logs_url)
+
+    # return error if logs url not properly split
+    if None in [repo_owner, repo_name, run_id, job_id]:
         return False
 
-    # cleanup logs and get only the error portion
-    logs = cleanup_logs(logs, logs_url)
+    # stream the raw logs and keep only the error portion, unless the caller already did
+    if logs is None:
+        logs = await fetch_error_window_async(
+            repo_owner, repo_name, run_id, job_id, logs_url
+        )
 
-    # return error if no errors found in logs
+    # return error if we cant get logs or no errors found in logs
     if not logs:
         return False
 
     # send comment to pull request if pr_number is found
     enable_coderabbit = os.getenv("ENABLE_CODERABBIT")
-    # Check if the branch has an active pull request and ping the CodeRabbit bot if so
-    comment_url = None
-    if enable_coderabbit:
-        comment_url = ping_coderabbit(
-            repo_owner, repo_name, head_branch, logs, logs_url
-        )
+    repo = f"{repo_owner}/{repo_name}"
+    if not enable_coderabbit:
+        return await analyze_error_window_async(logs, repo)
 
-    prompt = (
-        "You are a helpful AI assistant named GitFailGuard."
-        + " Analyze the following logs, determine the cause of failure and make a recommendation for a fix"
+    # Check if the branch has an active pull request and ping the CodeRabbit bot if so,
+    # while the model analyzes the logs, the two only meet in the issue body
+    issue_body, comment_url = await asyncio.gather(
+        analyze_error_window_async(logs, repo),
+        ping_coderabbit_async(repo_owner, repo_name, head_branch, logs, logs_url),
+        return_exceptions=True,
     )
-    messages = [
+    if isinstance(issue_body, BaseException):
+        raise issue_body
+    if isinstance(comment_url, BaseException):
+        logger.error("Unable to notify CodeRabbit for %s: %s", logs_url, comment_url)
+        comment_url = None
+    if comment_url:
+        issue_body += f"\n\n[CodeRabbit has been notified to review the logs of this run.]({comment_url})"
+
+    return issue_body
+
+
+def analyze_error_window(logs, repo=None):
+    return run_sync(analyze_error_window_async(logs, repo))
+
+
+async def analyze_error_window_async(logs, repo=None):
+    # known failures get their rule's templated analysis without a model call
+    with LOG_PROCESSING_SECONDS.time("classify"):
+        issue_body = failure_classifier.classify(logs)
+    if issue_body is not None:
+        logger.info("Analysis served from failure rules")
+        return issue_body
+
+    # repeated failures normalize to the same window, skip the model for those;
+    # a SQLite cache commits on every hit, so it runs on a worker thread
+    issue_body = await asyncio.to_thread(
+        analysis_cache.get, logs, ANALYSIS_MODEL, ANALYSIS_PROMPT
+    )
+    if issue_body is not None:
+        ANALYSIS_CACHE_REQUESTS.inc("hit")
+        logger.info("Analysis served from cache")
+        return issue_body
+    ANALYSIS_CACHE_REQUESTS.inc("miss")
+
+    # near-identical past failures are answered, similar ones guide the model
+    examples = []
+    sketch = None
+    if knowledge_base is not None:
+        with LOG_PROCESSING_SECONDS.time("knowledge_base"):
+            sketch, examples = await asyncio.to_thread(recall_similar, logs)
+        # only the repository's own past failures answer as is
+        answer = knowledge_base.answer(examples, repo)
+        if answer is not None:
+            result = "answered"
+        else:
+            result = "context" if examples else "miss"
+        knowledge_base.count(result)
+        KNOWLEDGE_BASE_REQUESTS.inc(result)
+        if answer is not None:
+            logger.info("Analysis served from the knowledge base")
+            return answer["analysis"] + ANSWERED_FOOTER
+
+    # examples take at most half of LLM_TOKEN_BUDGET, the window gets the rest
+    examples, example_tokens = fit_examples(examples, LLM_TOKEN_BUDGET // 2)
+    with LOG_PROCESSING_SECONDS.time("budget_window"):
+        if os.getenv("LLM_MAP_REDUCE"):
+            # map-reduce summarizes chunks on its own thread pool, keep it off the loop
+            window = await asyncio.to_thread(
+                budget_window, logs, LLM_TOKEN_BUDGET - example_tokens
+            )
+        else:
+            window = budget_window(logs, LLM_TOKEN_BUDGET - example_tokens)
+    messages = []
+    for example in examples:
+        messages += [
+            {"role": "user", "content": f"{ANALYSIS_PROMPT}:\n\n{example['window']}"},
+            {"role": "assistant", "content": example["analysis"]},
+        ]
+    messages.append(
         {
             "role": "user",
-            "content": f"{prompt}:\n\n{logs}",
+            "content": f"{ANALYSIS_PROMPT}:\n\n{window}",
         }
-    ]
-    openai.api_key = os.getenv("OPENAI_API_KEY")
-    response = openai.ChatCompletion.create(
-        model="gpt-3.5-turbo",
-        messages=messages,
-        temperature=0,
     )
-    print(response)
+    openai.api_key = os.getenv("OPENAI_API_KEY")
+    with LLM_SECONDS.time(ANALYSIS_MODEL, "analysis"):
+        response = await openai.ChatCompletion.acreate(
+            model=ANALYSIS_MODEL,
+            messages=messages,
+            temperature=0,
+        )
+    record_llm_usage(response, ANALYSIS_MODEL, "analysis")
+    logger.debug("Model response", extra={"response": response})
     issue_body = response.choices[0].message["content"]
-    if comment_url:
-        issue_body += f"\n\n[CodeRabbit has been notified to review the logs of this run.]({comment_url})"
-
+    await asyncio.to_thread(
+        analysis_cache.set, logs, ANALYSIS_MODEL, ANALYSIS_PROMPT, issue_body
+    )
+    if knowledge_base is not None:
+        await asyncio.to_thread(
+            knowledge_base.record, logs, issue_body, sketch=sketch, repo=repo
+        )
     return issue_body
 
 
+def recall_similar(logs):
+    # the sketch and the SQLite reads are blocking, run on a worker thread
+    sketch = simhash(logs)
+    return sketch, knowledge_base.nearest(logs, sketch=sketch)
+
+
+def fit_examples(examples, budget):
+    """The nearest examples fitting in budget tokens, and the tokens they take."""
+    kept = []
+    used = 0
+    for example in examples:
+        tokens = sum(
+            count_tokens(text, ANALYSIS_MODEL)
+            for text in (ANALYSIS_PROMPT, example["window"], example["analysis"])
+        )
+        if used + tokens > budget:
+            break
+        kept.append(example)
+        used += tokens
+    return kept, used
+
+
+def budget_window(logs, budget=None):
+    # keep the prompt within LLM_TOKEN_BUDGET, either by keeping the lines
+    # nearest the error or, with LLM_MAP_REDUCE, by summarizing the rest
+    if budget is None:
+        budget = LLM_TOKEN_BUDGET
+    if os.getenv("LLM_MAP_REDUCE"):
+        return map_reduce_window(
+            logs,
+            budget,
+            summarize_log_chunk,
+            max_workers=int(os.getenv("LLM_MAP_REDUCE_WORKERS", 4)),
+            model=ANALYSIS_MODEL,
+        )
+    return reduce_window(logs, budget, model=ANALYSIS_MODEL)
+
+
+def summarize_log_chunk(chunk):
+    openai.api_key = os.getenv("OPENAI_API_KEY")
+    with LLM_SECONDS.time(ANALYSIS_MODEL, "summary"):
+        response = openai.ChatCompletion.create(
+            model=ANALYSIS_MODEL,
+            messages=[{"role": "user", "content": f"{SUMMARY_PROMPT}:\n\n{chunk}"}],
+            max_tokens=200,
+            temperature=0,
+        )
+    record_llm_usage(response, ANALYSIS_MODEL, "summary")
+    return response.choices[0].message["content"]
+
+
 def ping_coderabbit(repo_owner, repo_name, head_branch, logs, logs_url):
-    pr_number = get_pull_request_number(repo_owner, repo_name, head_branch)
+    return run_sync(
+        ping_coderabbit_async(repo_owner, repo_name, head_branch, logs, logs_url)
+    )
+
+
+async def ping_coderabbit_async(repo_owner, repo_name, head_branch, logs, logs_url):
+    pr_number = await get_pull_request_number_async(repo_owner, repo_name, head_branch)
     if pr_number:
         pr_comment = (
             f"@coderabbitai review the logs from [the failed workflow job]({logs_url}) "
             + f" related to this PR:\n\n```\n{logs}\n```"
         )
-        comment_url = post_comment_to_pull_request(
+        comment_url = await post_comment_to_pull_request_async(
             repo_owner, repo_name, pr_number, pr_comment
         )
-        print(f"Comment to PR posted successfully: {comment_url}")
+        logger.info("Comment to PR posted: %s", comment_url)
         return comment_url
 
 
 def get_pull_request_number(repo_owner, repo_name, head_branch):
+    return run_sync(get_pull_request_number_async(repo_owner, repo_name, head_branch))
+
+
+async def get_pull_request_number_async(repo_owner, repo_name, head_branch):
     if not head_branch:
         return None
-    github_token = os.getenv("GITHUB_TOKEN")
-    headers = {
-        "Authorization": f"token {github_token}",
-        "Accept": "application/vnd.github.v3+json",
-    }
     prs_url = f"https://api.github.com/repos/{repo_owner}/{repo_name}/pulls"
-    response = requests.get(
+    response = await github_get_async(
         prs_url,
-        headers=headers,
         params={"state": "open", "head": f"{repo_owner}:{head_branch}"},
     )
     response.raise_for_status()
@@ -1,16 +1,108 @@
+import logging
+import os
 from flask import Flask
-from webhook_handler import webhook
+from metrics import CONTENT_TYPE, registry
+from webhook_handler import (
+    webhook,
+    coalescer,
+    job_queue,
+    journal,
+    recent_deliveries,
+    resume_journal,
+    work_queue,
+    consumer,
+    conversation_store,
+)
+from github_client import scheduler
+from log_analyzer import (
+    analysis_cache,
+    failure_classifier,
+    knowledge_base,
+    run_archives,
+)
+from structured_logging import configure_logging
 
+configure_logging()
 app = Flask(__name__)
+# GitHub caps webhook payloads at 25MB, anything larger is answered 413 unread
+app.config["MAX_CONTENT_LENGTH"] = 25 * 1024**2
+job_queue.init_app(app)
+resume_journal()
+if not os.getenv("GITHUB_WEBHOOK_SECRET"):
+    logging.getLogger(__name__).warning(
+        "GITHUB_WEBHOOK_SECRET is not set, webhook signatures are not verified"
+    )
 
 UP = {"status": "up"}
 
+registry.gauge(
+    "gitfailguard_queue_depth",
+    "Webhook events waiting in the queue.",
+    lambda: job_queue.queue.qsize(),
+)
+registry.gauge(
+    "gitfailguard_busy_workers",
+    "Webhook events being processed.",
+    lambda: job_queue.stats()["busy_workers"],
+)
+
 
 @app.route("/")
 def index():
     return UP, 200
 
 
+@app.route("/healthz")
+def healthz():
+    # liveness: the webhook workers are still running
+    if not job_queue.is_alive():
+        return {"status": "down"}, 500
+    return UP, 200
+
+
+@app.route("/readyz")
+def readyz():
+    # readiness: take traffic only while the queue accepts new events
+    if not job_queue.is_ready():
+        return {"status": "not ready", "queue_depth": job_queue.queue.qsize()}, 503
+    return {"status": "ready"}, 200
+
+
+@app.route("/status")
+def status():
+    return {
+        "status": "up",
+        "queue": job_queue.stats(),
+        "github_rate_limit": scheduler.stats(),
+        "analysis_cache": analysis_cache.stats(),
+        "failure_rules": failure_classifier.stats(),
+        "journal": journal.stats(),
+        "conversations": conversation_store.stats(),
+        "recent_deliveries": recent_deliveries.stats(),
+        "coalescer": coalescer.stats(),
+        "run_archives": run_archives.stats(),
+        **work_queue_status(),
+        **knowledge_base_status(),
+    }, 200
+
+
+def work_queue_status():
+    if work_queue is None:
+        return {}
+    return {"work_queue": {**work_queue.stats(), "consumer": consumer.stats()}}
+
+
+def knowledge_base_status():
+    if knowledge_base is None:
+        return {}
+    return {"knowledge_base": knowledge_base.stats()}
+
+
+@app.route("/metrics")
+def metrics():
+    return registry.render(), 200, {"Content-Type": CONTENT_TYPE}
+
+
 @app.route("/webhook", methods=["POST"])
 def handle_webhook():
     return webhook()
@@ -0,0 +1,256 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (
+    0.001,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    30,
+    60,
+)
+BYTES_BUCKETS = tuple(2**power for power in range(10, 31, 2))
+
+
+class Counter:
+    """A monotonically increasing value per combination of label values."""
+
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def value(self, *label_values):
+        with self.lock:
+            return self.values.get(label_values, 0)
+
+    def samples(self):
+        with self.lock:
+            values = dict(self.values)
+        for label_values, value in sorted(values.items()):
+            yield self.name, self.labels, label_values, value
+
+
+class Histogram:
+    """Observations counted into fixed buckets per combination of label values."""
+
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(label_values)
+            if series is None:
+                series = self.series[label_values] = [[0] * (len(self.buckets) + 1), 0]
+            series[0][index] += 1
+            series[1] += value
+
+    @contextmanager
+    def time(self, *label_values):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *label_values)
+
+    def count(self, *label_values):
+        with self.lock:
+            series = self.series.get(label_values)
+            return sum(series[0]) if series else 0
+
+    def samples(self):
+        with self.lock:
+            snapshot = {
+                key: (list(counts), total)
+                for key, (counts, total) in self.series.items()
+            }
+        labels = self.labels + ("le",)
+        bounds = [format_value(bound) for bound in self.buckets] + ["+Inf"]
+        for label_values, (counts, total) in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                yield self.name + "_bucket", labels, label_values + (bound,), cumulative
+            yield self.name + "_sum", self.labels, label_values, total
+            yield self.name + "_count", self.labels, label_values, cumulative
+
+
+class Gauge:
+    """A value read from a callback when the metrics are rendered."""
+
+    kind = "gauge"
+
+    def __init__(self, name, help, read):
+        self.name = name
+        self.help = help
+        self.read = read
+
+    def samples(self):
+        yield self.name, (), (), self.read()
+
+
+class Registry:
+    """The metrics of the process, rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self.metrics = {}
+
+    def counter(self, name, help, labels=()):
+        return self._register(Counter(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, help, labels, buckets))
+
+    def gauge(self, name, help, read):
+        return self._register(Gauge(name, help, read))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, label_values, value in metric.samples():
+                lines.append(
+                    f"{name}{format_labels(labels, label_values)} {format_value(value)}"
+                )
+        return "\n".join(lines) + "\n"
+
+    def _register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self.metrics[metric.name] = metric
+        return metric
+
+
+def format_labels(labels, label_values):
+    if not labels:
+        return ""
+    pairs = ",".join(
+        f'{label}="{escape_label_value(value)}"'
+        for label, value in zip(labels, label_values)
+    )
+    return "{" + pairs + "}"
+
+
+def escape_label_value(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_value(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+registry = Registry()
+
+WEBHOOK_PARSE_SECONDS = registry.histogram(
+    "gitfailguard_webhook_parse_seconds", "Time to parse a webhook payload."
+)
+WEBHOOKS_DROPPED = registry.counter(
+    "gitfailguard_webhooks_dropped_total",
+    "Webhook deliveries answered without any work, by reason.",
+    ("reason",),
+)
+STAGE_SECONDS = registry.histogram(
+    "gitfailguard_stage_seconds",
+    "Duration of webhook processing stages, including the queue wait and whole jobs.",
+    ("stage",),
+)
+LOG_FETCH_SECONDS = registry.histogram(
+    "gitfailguard_log_fetch_seconds",
+    "Time to download logs, a job's log or a run's log archive.",
+    ("source",),
+)
+LOG_FETCH_BYTES = registry.histogram(
+    "gitfailguard_log_fetch_bytes",
+    "Bytes of logs downloaded per fetch.",
+    ("source",),
+    buckets=BYTES_BUCKETS,
+)
+LOG_PROCESSING_SECONDS = registry.histogram(
+    "gitfailguard_log_processing_seconds",
+    "Time spent cutting, classifying and budgeting error windows.",
+    ("step",),
+)
+LLM_SECONDS = registry.histogram(
+    "gitfailguard_llm_request_seconds",
+    "Latency of model completions.",
+    ("model", "purpose"),
+)
+LLM_TOKENS = registry.counter(
+    "gitfailguard_llm_tokens_total",
+    "Tokens used by model completions.",
+    ("model", "purpose", "type"),
+)
+GITHUB_SECONDS = registry.histogram(
+    "gitfailguard_github_request_seconds",
+    "Latency of GitHub API requests by endpoint and status, per attempt.",
+    ("method", "endpoint", "status"),
+)
+GITHUB_RETRIES = registry.counter(
+    "gitfailguard_github_retries_total",
+    "GitHub API requests sent again after an error, a 5xx or a rate limit.",
+    ("reason",),
+)
+GITHUB_RATE_LIMIT_WAIT_SECONDS = registry.histogram(
+    "gitfailguard_github_rate_limit_wait_seconds",
+    "Time GitHub API callers waited on the rate limit scheduler.",
+)
+ISSUE_CREATE_SECONDS = registry.histogram(
+    "gitfailguard_issue_create_seconds",
+    "Time to open an issue, by response status.",
+    ("status",),
+)
+ANALYSIS_CACHE_REQUESTS = registry.counter(
+    "gitfailguard_analysis_cache_requests_total",
+    "Analysis cache lookups by result.",
+    ("result",),
+)
+KNOWLEDGE_BASE_REQUESTS = registry.counter(
+    "gitfailguard_knowledge_base_requests_total",
+    "Knowledge base lookups by result: answered, context for the model, or miss.",
+    ("result",),
+)
+FAILURE_RULE_MATCHES = registry.counter(
+    "gitfailguard_failure_rule_matches_total",
+    "Error windows answered by a failure rule instead of the model.",
+    ("rule",),
+)
+
+
+def record_llm_usage(response, model, purpose):
+    # usage is missing from some responses
+    usage = getattr(response, "usage", None)
+    for kind in ("prompt", "completion"):
+        tokens = getattr(usage, f"{kind}_tokens", None)
+        if isinstance(tokens, int):
+            LLM_TOKENS.inc(model, purpose, kind, amount=tokens)
@@ -0,0 +1,151 @@
+import asyncio
+import os
+import threading
+import time
+
+from metrics import GITHUB_RATE_LIMIT_WAIT_SECONDS
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+
+
+class RateLimitScheduler:
+    """Token bucket pacing GitHub calls from the X-RateLimit-* and Retry-After headers.
+
+    Interactive callers always go ahead of waiting batch callers, and batch
+    callers stop once the remaining quota drops under a reserve so a batch job
+    sharing the token with the webhook service can't starve it.
+    """
+
+    def __init__(self, rate=None, burst=None, batch_reserve=None, clock=time.monotonic):
+        if rate is None:
+            rate = float(os.getenv("GITHUB_REQUESTS_PER_SECOND", 10))
+        if burst is None:
+            burst = int(os.getenv("GITHUB_BURST", 20))
+        if batch_reserve is None:
+            batch_reserve = float(os.getenv("GITHUB_BATCH_RESERVE", 0.2))
+        self.rate = rate
+        self.burst = burst
+        self.batch_reserve = batch_reserve
+        self.clock = clock
+        self.tokens = float(burst)
+        self.last_refill = clock()
+        self.limit = None
+        self.remaining = None
+        self.reset_at = None
+        self.blocked_until = 0.0
+        self.waiting = {INTERACTIVE: 0, BATCH: 0}
+        self.counters = {"requests": 0, "waits": 0, "wait_seconds": 0.0, "limited": 0}
+        self.condition = threading.Condition()
+
+    def acquire(self, priority=INTERACTIVE):
+        """Block until a request of the given priority may be sent."""
+        with self.condition:
+            self.waiting[priority] += 1
+            start = self.clock()
+            try:
+                while True:
+                    delay = self._delay(priority)
+                    if delay <= 0:
+                        break
+                    self.condition.wait(timeout=delay)
+                self.tokens -= 1
+            finally:
+                self.waiting[priority] -= 1
+            return self._acquired(start)
+
+    async def acquire_async(self, priority=INTERACTIVE):
+        """Like acquire, but sleeps on the event loop instead of blocking a thread."""
+        with self.condition:
+            self.waiting[priority] += 1
+            start = self.clock()
+        try:
+            while True:
+                with self.condition:
+                    delay = self._delay(priority)
+                    if delay <= 0:
+                        self.tokens -= 1
+                        break
+                # there is no condition to wake us early, so poll at least once a second
+                await asyncio.sleep(min(delay, 1.0))
+        finally:
+            with self.condition:
+                self.waiting[priority] -= 1
+        with self.condition:
+            return self._acquired(start)
+
+    def update(self, response, rate_limited=False):
+        """Record the quota reported by a GitHub response."""
+        headers = response.headers
+        now = self.clock()
+        with self.condition:
+            try:
+                if "X-RateLimit-Limit" in headers:
+                    self.limit = int(headers["X-RateLimit-Limit"])
+                if "X-RateLimit-Remaining" in headers:
+                    self.remaining = int(headers["X-RateLimit-Remaining"])
+                if "X-RateLimit-Reset" in headers:
+                    # the reset header is epoch seconds, keep it on our own clock
+                    self.reset_at = (
+                        now + float(headers["X-RateLimit-Reset"]) - time.time()
+                    )
+            except ValueError:
+                pass
+            blocked_until = None
+            if "Retry-After" in headers:
+                try:
+                    blocked_until = now + float(headers["Retry-After"])
+                except ValueError:
+                    pass
+            if blocked_until is None and self.remaining == 0 and self.reset_at:
+                blocked_until = self.reset_at
+            if blocked_until is None and rate_limited:
+                # limited without any hint, GitHub asks to wait at least a minute
+                blocked_until = now + 60
+            if rate_limited:
+                self.counters["limited"] += 1
+            if blocked_until is not None and blocked_until > self.blocked_until:
+                self.blocked_until = blocked_until
+            self.condition.notify_all()
+
+    def stats(self):
+        with self.condition:
+            return {
+                **self.counters,
+                "tokens": round(self.tokens, 2),
+                "limit": self.limit,
+                "remaining": self.remaining,
+                "waiting": dict(self.waiting),
+            }
+
+    def _acquired(self, start):
+        waited = self.clock() - start
+        self.counters["requests"] += 1
+        if waited > 0.001:
+            self.counters["waits"] += 1
+            self.counters["wait_seconds"] += waited
+            GITHUB_RATE_LIMIT_WAIT_SECONDS.observe(waited)
+        self.condition.notify_all()
+        return waited
+
+    def _delay(self, priority):
+        now = self.clock()
+        self.tokens = min(
+            self.burst, self.tokens + (now - self.last_refill) * self.rate
+        )
+        self.last_refill = now
+        delays = [self.blocked_until - now]
+        if self.tokens < 1:
+            delays.append((1 - self.tokens) / self.rate)
+        if priority == BATCH:
+            if self.waiting[INTERACTIVE]:
+                # woken up again by notify_all once the interactive request is sent
+                delays.append(1.0)
+            if self._below_reserve() and self.reset_at is not None:
+                delays.append(self.reset_at - now)
+        return max(delays)
+
+    def _below_reserve(self):
+        if self.limit is None or self.remaining is None:
+            return False
+        return self.remaining <= self.limit * self.batch_reserve
@@ -0,0 +1,106 @@
+"""Replay journaled failed-workflow events through handle_failed_workflow.
+
+Usage: python src/replay.py --since 2024-05-21T18:00 [--until ...] [--rate 1] [--state failed] [--dry-run]
+
+Times are ISO 8601 (UTC unless an offset is given) or epoch seconds. Events
+are started at --rate without waiting for the previous ones to finish, and
+each is handled on its own rather than held for the coalescing window. Replayed
+events run as batch work, so live webhooks keep priority on the GitHub quota.
+Each outcome is journaled, so a replayed pending entry isn't resumed again
+by the next process to adopt its journal file.
+"""
+
+import argparse
+import time
+from datetime import datetime, timezone
+
+from async_runtime import submit
+from event_journal import COMPLETED, FAILED, read_journal
+from github_client import BATCH, set_default_priority
+from structured_logging import configure_logging
+from webhook_handler import handle_failed_jobs_async, journal
+
+
+def parse_time(value):
+    try:
+        return float(value)
+    except ValueError:
+        parsed = datetime.fromisoformat(value)
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return parsed.timestamp()
+
+
+def select_entries(entries, since=None, until=None, states=None):
+    for entry in entries:
+        if entry["kind"] != "workflow_job":
+            continue
+        if since is not None and entry["ts"] < since:
+            continue
+        if until is not None and entry["ts"] >= until:
+            continue
+        if states and entry["state"] not in states:
+            continue
+        yield entry
+
+
+def replay(entries, rate, dry_run=False):
+    counts = {}
+    interval = 1 / rate
+    next_at = time.monotonic()
+    started = []
+    for entry in entries:
+        accepted = datetime.fromtimestamp(entry["ts"], timezone.utc).isoformat()
+        job = entry["payload"]["workflow_job"]
+        print(f"{accepted} {entry['id']} [{entry['state']}] {job['html_url']}")
+        if dry_run:
+            counts["selected"] = counts.get("selected", 0) + 1
+            continue
+        time.sleep(max(0, next_at - time.monotonic()))
+        next_at += interval
+        # straight to the handler, the coalescer would hold each event for its window
+        started.append((entry, submit(handle_failed_jobs_async([entry["payload"]]))))
+    for entry, future in started:
+        try:
+            body, status = future.result()[0]
+        except Exception as e:
+            print(f"{entry['id']} -> error {e!r}")
+            journal.record_replay(entry, FAILED)
+            counts["error"] = counts.get("error", 0) + 1
+            continue
+        print(
+            f"{entry['id']} -> {status} {body['status']} {body.get('issue_url') or ''}"
+        )
+        journal.record_replay(entry, FAILED if status >= 500 else COMPLETED)
+        counts[body["status"]] = counts.get(body["status"], 0) + 1
+    journal.flush()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--since", type=parse_time)
+    parser.add_argument("--until", type=parse_time)
+    parser.add_argument(
+        "--rate", type=float, default=1, help="events per second (default 1)"
+    )
+    parser.add_argument(
+        "--state",
+        action="append",
+        choices=["pending", "completed", "failed", "rejected"],
+        help="only replay entries in this state, can be repeated",
+    )
+    parser.add_argument("--dir", default=journal.directory)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    configure_logging()
+    set_default_priority(BATCH)
+    # outcomes are journaled next to the entries they replay
+    journal.directory = args.dir
+    entries = select_entries(read_journal(args.dir), args.since, args.until, args.state)
+    print(replay(entries, args.rate, args.dry_run))
+
+
+if __name__ == "__main__":
+    main()
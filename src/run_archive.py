@@ -0,0 +1,141 @@
+import asyncio
+import logging
+import os
+import re
+import tempfile
+import time
+import zipfile
+
+from github_client import github_get_async
+from metrics import LOG_FETCH_BYTES, LOG_FETCH_SECONDS
+
+logger = logging.getLogger(__name__)
+
+JOB_MEMBER_PATTERN = re.compile(r"^\d+_(.+)\.txt$")
+FILE_NAME_UNSAFE = re.compile(r'[\\/:*?"<>|]')
+
+
+def job_key(job_name):
+    # the archive drops characters it can't use in file names, separators stay
+    # so matrix jobs like "test (3.1, a)" and "test (3.1a)" don't collide
+    return " ".join(FILE_NAME_UNSAFE.sub("", job_name).lower().split())
+
+
+class RunArchive:
+    """A run's log archive spooled to an unlinked temp file, read one job member at a time."""
+
+    def __init__(self, path):
+        # unlink right away, the file goes away once the last reference is dropped
+        self.file = open(path, "rb")
+        os.remove(path)
+        try:
+            self.zip = zipfile.ZipFile(self.file)
+        except zipfile.BadZipFile:
+            self.file.close()
+            raise
+        self.size = os.fstat(self.file.fileno()).st_size
+        # top level <n>_<job name>.txt members hold each job's full log, matched
+        # on the exact name first, then on job_key when only one member has it
+        self.members = {}
+        self.keys = {}
+        for name in self.zip.namelist():
+            match = JOB_MEMBER_PATTERN.match(name)
+            if match and "/" not in name:
+                self.members[match.group(1)] = name
+                self.keys.setdefault(job_key(match.group(1)), []).append(name)
+
+    def open_job_log(self, job_name):
+        """Decompressing stream over one job's log, or None if the run has no such job."""
+        member = self.members.get(job_name)
+        if member is None:
+            candidates = self.keys.get(job_key(job_name), [])
+            if len(candidates) != 1:
+                # another job's log would be analyzed, fetch this one on its own
+                return None
+            member = candidates[0]
+        return self.zip.open(member)
+
+
+class RunArchiveCache:
+    """Run log archives shared by sibling job events for a short TTL."""
+
+    def __init__(self, ttl=None, max_entries=None, chunk_size=64 * 1024):
+        if ttl is None:
+            ttl = float(os.getenv("RUN_ARCHIVE_TTL", 300))
+        if max_entries is None:
+            max_entries = int(os.getenv("RUN_ARCHIVE_MAX_ENTRIES", 8))
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.chunk_size = chunk_size
+        self.entries = {}
+        self.downloads = {}
+        self.counters = {"hits": 0, "downloads": 0, "failed": 0, "bytes": 0}
+
+    async def get(self, repo_owner, repo_name, run_id):
+        """The run's archive, downloading it once for concurrent callers, or None."""
+        self._evict()
+        key = (repo_owner, repo_name, str(run_id))
+        if key in self.entries:
+            self.counters["hits"] += 1
+            return self.entries[key][1]
+        download = self.downloads.get(key)
+        if download is None:
+            download = asyncio.ensure_future(self._download(*key))
+            self.downloads[key] = download
+            download.add_done_callback(lambda _: self.downloads.pop(key, None))
+        else:
+            self.counters["hits"] += 1
+        archive = await asyncio.shield(download)
+        if archive is not None and key not in self.entries:
+            self.entries[key] = (time.monotonic() + self.ttl, archive)
+            self._evict()
+        return archive
+
+    def stats(self):
+        return {"entries": len(self.entries), **self.counters}
+
+    async def _download(self, repo_owner, repo_name, run_id):
+        # GitHub answers with a redirect to blob storage, aiohttp drops the
+        # Authorization header when it follows it to another host
+        url = f"https://api.github.com/repos/{repo_owner}/{repo_name}/actions/runs/{run_id}/logs"
+        start = time.perf_counter()
+        response = await github_get_async(url, stream=True)
+        try:
+            if response.status_code != 200:
+                logger.error(
+                    "Unable to fetch run logs from %s, status code: %s",
+                    url,
+                    response.status_code,
+                )
+                self.counters["failed"] += 1
+                return None
+            fd, path = tempfile.mkstemp(prefix=f"run-{run_id}-", suffix=".zip")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    async for chunk in response.iter_content(self.chunk_size):
+                        f.write(chunk)
+            except BaseException:
+                os.remove(path)
+                raise
+        finally:
+            response.close()
+        LOG_FETCH_SECONDS.observe(time.perf_counter() - start, "archive")
+        try:
+            archive = await asyncio.to_thread(RunArchive, path)
+        except zipfile.BadZipFile as e:
+            logger.error("Unable to read run logs from %s: %s", url, e)
+            self.counters["failed"] += 1
+            return None
+        self.counters["downloads"] += 1
+        self.counters["bytes"] += archive.size
+        LOG_FETCH_BYTES.observe(archive.size, "archive")
+        return archive
+
+    def _evict(self):
+        now = time.monotonic()
+        for key, (expires_at, _) in list(self.entries.items()):
+            if expires_at <= now:
+                del self.entries[key]
+        while len(self.entries) > self.max_entries:
+            oldest = min(self.entries, key=lambda key: self.entries[key][0])
+            del self.entries[oldest]
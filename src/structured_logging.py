@@ -0,0 +1,123 @@
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import zlib
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+# correlation fields (delivery, run and job IDs) of the event being handled,
+# copied into tasks and to_thread calls started while they are bound
+log_context = contextvars.ContextVar("log_context", default={})
+
+_listener = None
+
+# attributes every LogRecord has, anything else was passed with extra=
+RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "context"}
+
+
+@contextmanager
+def bind(**fields):
+    """Attach fields to every record logged in this context, None values are skipped."""
+    context = {**log_context.get()}
+    context.update((key, value) for key, value in fields.items() if value is not None)
+    token = log_context.set(context)
+    try:
+        yield context
+    finally:
+        log_context.reset(token)
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record with its correlation and extra fields."""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(
+                timespec="milliseconds"
+            ),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            **getattr(record, "context", {}),
+        }
+        for key, value in vars(record).items():
+            if key not in RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class ContextQueueHandler(QueueHandler):
+    """Hand records to the listener thread, keeping only the formatting that can't wait.
+
+    The message and traceback are rendered and the correlation fields captured
+    on the calling thread, the JSON is built and written by the listener.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        record.context = log_context.get()
+        return record
+
+
+class SamplingFilter(logging.Filter):
+    """Keep a share of the records under WARNING, all or none of an event's records."""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if self.rate >= 1 or record.levelno >= logging.WARNING:
+            return True
+        delivery_id = log_context.get().get("delivery_id")
+        if delivery_id is None:
+            return random.random() < self.rate
+        return zlib.crc32(str(delivery_id).encode()) < self.rate * 2**32
+
+
+def configure_logging(level=None, sample_rate=None, stream=None):
+    """Send the root logger's records as JSON lines through a background thread."""
+    global _listener
+    if _listener is not None:
+        return
+    if level is None:
+        level = os.getenv("LOG_LEVEL", "INFO").upper()
+    if sample_rate is None:
+        sample_rate = float(os.getenv("LOG_SAMPLE_RATE", 1))
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JsonFormatter())
+    records = queue.SimpleQueue()
+    handler = ContextQueueHandler(records)
+    handler.addFilter(SamplingFilter(sample_rate))
+
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(level)
+    _listener = QueueListener(records, output)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """Write out the queued records and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,123 @@
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import tiktoken
+except ImportError:  # pragma: no cover - optional, counts are estimated without it
+    tiktoken = None
+
+TIMESTAMP_PATTERN = re.compile(r"^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}(?:\.\d+)?Z\s?")
+
+_encodings = {}
+
+
+def count_tokens(text, model="gpt-3.5-turbo"):
+    if tiktoken is None:
+        # roughly four characters per token for English text and logs
+        return len(text) // 4 + 1
+    if model not in _encodings:
+        try:
+            _encodings[model] = tiktoken.encoding_for_model(model)
+        except KeyError:
+            _encodings[model] = tiktoken.get_encoding("cl100k_base")
+    return len(_encodings[model].encode(text, disallowed_special=()))
+
+
+def collapse_repeats(lines):
+    # progress bars and retry loops print the same line over and over
+    collapsed = []
+    previous = None
+    repeats = 0
+    for line in lines:
+        key = TIMESTAMP_PATTERN.sub("", line)
+        if key == previous:
+            repeats += 1
+            continue
+        if repeats:
+            collapsed.append(f"... previous line repeated {repeats} more times")
+        collapsed.append(line)
+        previous = key
+        repeats = 0
+    if repeats:
+        collapsed.append(f"... previous line repeated {repeats} more times")
+    return collapsed
+
+
+def reduce_window(logs, budget, model="gpt-3.5-turbo"):
+    """Shrink an error window to at most budget tokens.
+
+    Repeated lines are collapsed first. If that isn't enough, the step header
+    (first line) is kept along with as many lines as fit counting back from
+    the ##[error] marker at the end of the window.
+    """
+    lines = collapse_repeats(logs.split("\n"))
+    reduced = "\n".join(lines)
+    if len(lines) < 2 or count_tokens(reduced, model) <= budget:
+        return reduced
+
+    header, body = lines[0], lines[1:]
+    # leave room for the omission marker
+    kept = keep_tail(body, budget - count_tokens(header, model) - 16, model)
+    omitted = len(body) - len(kept)
+    return "\n".join([header, f"... {omitted} lines omitted ...", *kept])
+
+
+def keep_tail(lines, budget, model="gpt-3.5-turbo"):
+    # always keep the last line, it is the ##[error] marker
+    kept = []
+    used = 0
+    for line in reversed(lines):
+        cost = count_tokens(line, model) + 1
+        if kept and used + cost > budget:
+            break
+        kept.append(line)
+        used += cost
+    kept.reverse()
+    return kept
+
+
+def split_chunks(lines, chunk_budget, model="gpt-3.5-turbo"):
+    chunks = []
+    chunk = []
+    used = 0
+    for line in lines:
+        cost = count_tokens(line, model) + 1
+        if chunk and used + cost > chunk_budget:
+            chunks.append("\n".join(chunk))
+            chunk = []
+            used = 0
+        chunk.append(line)
+        used += cost
+    if chunk:
+        chunks.append("\n".join(chunk))
+    return chunks
+
+
+def map_reduce_window(
+    logs,
+    budget,
+    summarize_chunk,
+    chunk_budget=None,
+    max_workers=4,
+    model="gpt-3.5-turbo",
+):
+    """Summarize the start of a large window in parallel chunks, keep its tail verbatim.
+
+    Half of the budget goes to the lines nearest the error, the other half to
+    the merged chunk summaries.
+    """
+    lines = collapse_repeats(logs.split("\n"))
+    if len(lines) < 2 or count_tokens("\n".join(lines), model) <= budget:
+        return "\n".join(lines)
+
+    header, body = lines[0], lines[1:]
+    tail = keep_tail(body, budget // 2, model)
+    head = body[: len(body) - len(tail)]
+    chunks = split_chunks(head, chunk_budget or budget, model)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        summaries = list(executor.map(summarize_chunk, chunks))
+    merged = reduce_window("\n".join(summaries), budget // 2 - 32, model)
+    return "\n".join(
+        [header, "Summary of earlier output:", merged, "Last lines before the error:"]
+        + tail
+    )
@@ -0,0 +1,43 @@
+import hashlib
+import hmac
+import threading
+from collections import OrderedDict
+
+SIGNATURE_PREFIX = "sha256="
+
+
+def verify_signature(secret, body, signature):
+    """Whether an X-Hub-Signature-256 header is the HMAC of the raw body with the secret."""
+    if not signature or not signature.startswith(SIGNATURE_PREFIX):
+        return False
+    expected = hmac.new(secret.encode("utf-8"), body, hashlib.sha256).hexdigest()
+    # constant time, so the signature can't be guessed byte by byte
+    return hmac.compare_digest(expected, signature[len(SIGNATURE_PREFIX) :])
+
+
+class RecentDeliveries:
+    """The latest webhook delivery IDs, oldest evicted first, to drop GitHub redeliveries."""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.ids = OrderedDict()
+        self.lock = threading.Lock()
+
+    def add(self, delivery_id):
+        """Remember a delivery, returning False if it was already seen."""
+        with self.lock:
+            if delivery_id in self.ids:
+                return False
+            self.ids[delivery_id] = None
+            while len(self.ids) > self.max_size:
+                self.ids.popitem(last=False)
+            return True
+
+    def discard(self, delivery_id):
+        # the event wasn't taken, let a redelivery through
+        with self.lock:
+            self.ids.pop(delivery_id, None)
+
+    def stats(self):
+        with self.lock:
+            return {"size": len(self.ids), "max_size": self.max_size}
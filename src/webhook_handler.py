@@ -1,21 +1,267 @@
+import asyncio
+import logging
 import os
-import requests
-import json
+import uuid
 from flask import request, jsonify
-from log_analyzer import analyze_logs
-from github_issue_creator import create_github_issue, respond_to_issue_comment
+from async_runtime import run_sync
+from github_client import github_post_async
+from log_analyzer import (
+    analyze_logs_async,
+    extract_info_from_url,
+    get_error_windows_async,
+)
+from github_issue_creator import (
+    create_github_issue_async,
+    create_run_issue_async,
+    is_issue_open_async,
+    respond_to_issue_comment_async,
+    summarize_thread_async,
+)
+from coalescer import Coalescer
+from conversation_store import create_conversation_store
+from failure_index import create_failure_index, failure_signature
+from event_journal import COMPLETED, FAILED, REJECTED, create_event_journal
+from job_queue import JobQueue
+from metrics import WEBHOOK_PARSE_SECONDS, WEBHOOKS_DROPPED
+from structured_logging import bind
+from webhook_guard import RecentDeliveries, verify_signature
+from webhook_payload import may_need_action, parse_event
+from work_queue import WorkQueueConsumer, create_work_queue
+
+logger = logging.getLogger(__name__)
+
+job_queue = JobQueue()
+failure_index = create_failure_index()
+journal = create_event_journal()
+conversation_store = create_conversation_store()
+# failed jobs of one run (a matrix build) arriving within this window are handled together
+coalescer = Coalescer(float(os.getenv("COALESCE_WINDOW", 5)))
+# GitHub redelivers on timeouts and on demand, with the same delivery ID
+recent_deliveries = RecentDeliveries(
+    int(os.getenv("WEBHOOK_DELIVERY_CACHE_SIZE", 10000))
+)
+
+# with a shared work queue, events go through it so that each is handled by one replica
+work_queue = create_work_queue()
+
+HANDLED_EVENTS = {"workflow_job", "issue_comment", "ping"}
 
 
 def webhook():
-    data = request.json
-    print(json.dumps(data))
+    # everything that can be turned away is, before the body is parsed
+    event = request.headers.get("X-GitHub-Event")
+    if event is not None and event not in HANDLED_EVENTS:
+        WEBHOOKS_DROPPED.inc("event")
+        return jsonify({"status": "ignored", "event": event}), 200
 
-    if is_failed_workflow(data):
-        return handle_failed_workflow(data)
-    elif is_issue_comment(data):
-        return handle_issue_comment_event(data)
-    else:
-        return jsonify({"status": "no action taken", "data": data}), 200
+    secret = os.getenv("GITHUB_WEBHOOK_SECRET")
+    signature = request.headers.get("X-Hub-Signature-256")
+    if secret and not verify_signature(secret, request.get_data(), signature):
+        WEBHOOKS_DROPPED.inc("signature")
+        logger.warning("Rejecting webhook with an invalid signature")
+        return jsonify({"status": "invalid signature"}), 401
+    if event == "ping":
+        return jsonify({"status": "pong"}), 200
+
+    delivery_id = request.headers.get("X-GitHub-Delivery")
+    if delivery_id and not recent_deliveries.add(delivery_id):
+        WEBHOOKS_DROPPED.inc("duplicate")
+        return jsonify({"status": "duplicate delivery", "delivery": delivery_id}), 200
+
+    # most deliveries (queued and successful jobs, plain comments) stop here unparsed
+    body = request.get_data()
+    if event is not None and not may_need_action(event, body):
+        WEBHOOKS_DROPPED.inc("no_action")
+        return no_action_taken(event, delivery_id)
+    try:
+        with WEBHOOK_PARSE_SECONDS.time():
+            data = parse_event(event, body)
+    except ValueError:
+        WEBHOOKS_DROPPED.inc("invalid")
+        return jsonify({"status": "invalid payload", "delivery": delivery_id}), 400
+    with bind(delivery_id=delivery_id, **correlation_ids(data)):
+        logger.debug("Webhook payload", extra={"payload": data})
+
+        if is_failed_workflow(data):
+            return enqueue_event("workflow_job", handle_failed_workflow_async, data)
+        elif is_issue_comment(data) and mentions_gitfailguard(data):
+            return enqueue_event(
+                "issue_comment", handle_issue_comment_event_async, data
+            )
+        else:
+            WEBHOOKS_DROPPED.inc("no_action")
+            return no_action_taken(event, delivery_id)
+
+
+def no_action_taken(event, delivery_id):
+    return (
+        jsonify({"status": "no action taken", "event": event, "delivery": delivery_id}),
+        200,
+    )
+
+
+def correlation_ids(data):
+    """IDs attached to every record logged while handling the event."""
+    job = data.get("workflow_job") or {}
+    return {
+        "repo": (data.get("repository") or {}).get("full_name"),
+        "run_id": job.get("run_id"),
+        "job_id": job.get("id"),
+        "issue": (data.get("issue") or {}).get("number"),
+    }
+
+
+def enqueue_event(kind, handler, data):
+    if work_queue is not None:
+        return share_event(kind, data)
+    # acknowledge right away, GitHub gives up on deliveries after 10 seconds,
+    # but only once the event is journaled so a restart can't lose it
+    entry_id = journal.append(kind, data, request.headers.get("X-GitHub-Delivery"))
+    if not job_queue.submit(kind, run_journaled, entry_id, handler, data):
+        journal.finish(entry_id, REJECTED)
+        recent_deliveries.discard(entry_id)
+        logger.warning("Webhook queue is full, rejecting %s event", kind)
+        return (
+            jsonify({"status": "queue full", "event": kind, "delivery": entry_id}),
+            503,
+        )
+    return jsonify({"status": "queued", "event": kind, "delivery": entry_id}), 202
+
+
+def share_event(kind, data):
+    """Put an event on the shared work queue, where any replica may claim it."""
+    entry_id = request.headers.get("X-GitHub-Delivery") or uuid.uuid4().hex
+    # events of a repository are handled in order, one replica at a time
+    key = (data.get("repository") or {}).get("full_name") or ""
+    try:
+        queued = work_queue.put(entry_id, kind, key, data)
+    except Exception as e:
+        recent_deliveries.discard(entry_id)
+        logger.error("Unable to queue %s event on the work queue: %s", kind, e)
+        return (
+            jsonify(
+                {"status": "queue unavailable", "event": kind, "delivery": entry_id}
+            ),
+            503,
+        )
+    if not queued:
+        # another replica got this delivery first
+        WEBHOOKS_DROPPED.inc("duplicate")
+        return jsonify({"status": "duplicate delivery", "delivery": entry_id}), 200
+    return jsonify({"status": "queued", "event": kind, "delivery": entry_id}), 202
+
+
+def dispatch_claimed(key, events):
+    return job_queue.submit("work_queue_batch", run_claimed_batch, key, events)
+
+
+async def run_claimed_batch(key, events):
+    """Run a repository's events claimed from the shared work queue, then release it.
+
+    Events run one after the other in claim order, except failed jobs of the
+    same run claimed back to back, which run together for the coalescer.
+    """
+    try:
+        for group in claimed_groups(events):
+            results = await asyncio.gather(
+                *(run_claimed(key, event) for event in group), return_exceptions=True
+            )
+            for event, result in zip(group, results):
+                if isinstance(result, Exception):
+                    logger.error(
+                        "%s event %s failed: %s",
+                        event["kind"],
+                        event["id"],
+                        result,
+                        exc_info=result,
+                    )
+    finally:
+        await asyncio.to_thread(consumer.done, key)
+
+
+def claimed_groups(events):
+    groups = []
+    previous = None
+    for event in events:
+        run_key = claimed_run_key(event)
+        if run_key is not None and run_key == previous:
+            groups[-1].append(event)
+        else:
+            groups.append([event])
+        previous = run_key
+    return groups
+
+
+def claimed_run_key(event):
+    if event["kind"] != "workflow_job":
+        return None
+    try:
+        return failure_run_key(event["payload"])
+    except (KeyError, TypeError):
+        return None
+
+
+async def run_claimed(key, event):
+    entry_id, kind, data = event["id"], event["kind"], event["payload"]
+    # journaled by the replica that runs it so replay.py finds it, the shared
+    # queue already holds it durably
+    journal.append(kind, data, entry_id, wait=False)
+    state = FAILED
+    try:
+        body, status = await run_journaled(entry_id, EVENT_HANDLERS[kind], data)
+        state = FAILED if status >= 500 else COMPLETED
+        return body, status
+    finally:
+        await asyncio.to_thread(work_queue.finish, entry_id, key, state)
+
+
+async def run_journaled(entry_id, handler, data):
+    # journal entries are keyed by the delivery ID when GitHub sends one
+    with bind(delivery_id=entry_id, **correlation_ids(data)):
+        try:
+            body, status = await handler(data)
+        except Exception:
+            finish_journaled(entry_id, FAILED)
+            raise
+        finish_journaled(entry_id, FAILED if status >= 500 else COMPLETED)
+        return body, status
+
+
+def finish_journaled(entry_id, state):
+    journal.finish(entry_id, state)
+    if state == FAILED:
+        # a redelivery of a failed event, by hand after an outage, is handled again
+        recent_deliveries.discard(entry_id)
+
+
+def resume_journal():
+    """Queue again the events a previous process accepted but never finished.
+
+    With a shared work queue, start claiming from it instead: the events a
+    dead replica held are handed out again once their lease expires.
+    """
+    # redeliveries of events this file already holds are dropped after a restart too
+    for entry_id in journal.accepted_ids():
+        recent_deliveries.add(entry_id)
+    if consumer is not None:
+        consumer.start()
+        return
+    unfinished = journal.unfinished()
+    resumed = 0
+    for record in unfinished:
+        handler = EVENT_HANDLERS[record["kind"]]
+        if job_queue.submit(
+            record["kind"], run_journaled, record["id"], handler, record["payload"]
+        ):
+            resumed += 1
+    if unfinished:
+        logger.info(
+            "Resumed %s of %s unfinished journal entries from %s,"
+            " replay the rest with src/replay.py --state pending",
+            resumed,
+            len(unfinished),
+            journal.path,
+        )
 
 
 def is_failed_workflow(data):
@@ -26,67 +272,309 @@ def is_failed_workflow(data):
 
 
 def handle_failed_workflow(data):
-    repo_name = data["repository"]["full_name"]
-    workflow_name = data["workflow_job"]["name"]
-    logs_url = data["workflow_job"]["html_url"]
+    body, status = run_sync(handle_failed_workflow_async(data))
+    return jsonify(body), status
+
+
+async def handle_failed_workflow_async(data):
+    run_key = failure_run_key(data)
+    if coalescer.window > 0 and run_key:
+        return await coalescer.submit(run_key, data, handle_coalesced_jobs_async)
+    results = await handle_failed_jobs_async([data])
+    return results[0]
+
+
+async def handle_coalesced_jobs_async(events):
+    # the batch runs in the context of its first event, log it under all its jobs
+    with bind(job_id=[data["workflow_job"].get("id") for data in events]):
+        return await handle_failed_jobs_async(events)
+
+
+def failure_run_key(data):
+    repo_owner, repo_name, run_id, job_id = extract_info_from_url(
+        data["workflow_job"]["html_url"]
+    )
+    if None in [repo_owner, repo_name, run_id, job_id]:
+        return None
+    return data["repository"]["full_name"], run_id
+
+
+async def handle_failed_jobs_async(events):
+    """Handle failed jobs of one run with one analysis per distinct cause and one issue."""
+    repo_name = events[0]["repository"]["full_name"]
+    jobs = [data["workflow_job"] for data in events]
+    results = [
+        ({"status": "error", "job_id": job.get("id"), "issue_url": None}, 500)
+        for job in jobs
+    ]
+
+    with job_queue.timed("fetch_logs"):
+        windows = await get_error_windows_async(
+            [(job["html_url"], job["name"]) for job in jobs]
+        )
+    causes = {}
+    for index, logs in enumerate(windows):
+        if logs:
+            causes.setdefault(failure_signature(logs), []).append(index)
+
+    # a failure we already opened an issue for only gets a cheap comment
+    repeats = await asyncio.gather(
+        *(
+            report_repeat_cause_async(
+                repo_name, [jobs[index] for index in indexes], signature
+            )
+            for signature, indexes in causes.items()
+        ),
+        return_exceptions=True,
+    )
+    new_causes = []
+    for (signature, indexes), repeat in zip(causes.items(), repeats):
+        if isinstance(repeat, Exception):
+            logger.error(
+                "Unable to report a repeat failure in %s: %r", repo_name, repeat
+            )
+            repeat = (None, None)
+        known_failure, comment_url = repeat
+        if not comment_url:
+            new_causes.append((signature, indexes))
+            continue
+        for index in indexes:
+            results[index] = (
+                {
+                    "status": "duplicate",
+                    "job_id": jobs[index].get("id"),
+                    "issue_url": known_failure["issue_url"],
+                    "comment_url": comment_url,
+                },
+                200,
+            )
+    if not new_causes:
+        return results
+
+    with job_queue.timed("analyze_logs"):
+        analyses = await asyncio.gather(
+            *(
+                analyze_logs_async(
+                    jobs[indexes[0]]["html_url"],
+                    jobs[indexes[0]].get("head_branch"),
+                    windows[indexes[0]],
+                )
+                for _, indexes in new_causes
+            ),
+            return_exceptions=True,
+        )
+    analyzed = []
+    for (signature, indexes), analysis in zip(new_causes, analyses):
+        if isinstance(analysis, Exception):
+            # the cause's jobs stay in error, the issue covers the other causes
+            logger.error(
+                "Unable to analyze %s: %r", jobs[indexes[0]]["html_url"], analysis
+            )
+        elif analysis:
+            analyzed.append((signature, indexes, analysis))
+    if not analyzed:
+        return results
+
+    with job_queue.timed("create_github_issue"):
+        if len(analyzed) == 1 and len(analyzed[0][1]) == 1:
+            job = jobs[analyzed[0][1][0]]
+            issue_url = await create_github_issue_async(
+                repo_name, job["name"], job["html_url"], analyzed[0][2]
+            )
+        else:
+            issue_url = await create_run_issue_async(
+                repo_name,
+                jobs[0].get("workflow_name") or jobs[0]["name"],
+                [
+                    ([jobs[index] for index in indexes], analysis)
+                    for _, indexes, analysis in analyzed
+                ],
+            )
+    for signature, indexes, _ in analyzed:
+        for index in indexes:
+            if issue_url:
+                # the failure index commits on every call, keep it off the loop
+                await asyncio.to_thread(
+                    failure_index.record,
+                    repo_name,
+                    jobs[index]["name"],
+                    signature,
+                    issue_url,
+                )
+            results[index] = (
+                {
+                    "status": "received",
+                    "job_id": jobs[index].get("id"),
+                    "issue_url": issue_url,
+                },
+                200,
+            )
+    return results
+
+
+async def report_repeat_cause_async(repo_name, jobs, signature):
+    # any job of the cause may have been seen before, matrix job names differ per run
+    for job in jobs:
+        known_failure = await asyncio.to_thread(
+            failure_index.lookup, repo_name, job["name"], signature
+        )
+        if known_failure:
+            break
+    else:
+        return None, None
+    others = [other for other in jobs if other is not job]
+    comment_url = await report_repeat_failure_async(
+        repo_name, job["name"], job["html_url"], signature, known_failure, others
+    )
+    return known_failure, comment_url
+
+
+def report_repeat_failure(
+    repo_name, workflow_name, logs_url, signature, known_failure, other_jobs=()
+):
+    return run_sync(
+        report_repeat_failure_async(
+            repo_name, workflow_name, logs_url, signature, known_failure, other_jobs
+        )
+    )
 
-    head_branch = None
-    if "head_branch" in data["workflow_job"]:
-        head_branch = data["workflow_job"]["head_branch"]
 
-    analysis = analyze_logs(logs_url, head_branch)
-    if not analysis:
-        return jsonify({"status": "error", "data": data, "issue_url": None}), 500
+async def report_repeat_failure_async(
+    repo_name, workflow_name, logs_url, signature, known_failure, other_jobs=()
+):
+    issue_number = known_failure["issue_number"]
+    if not issue_number or not await is_issue_open_async(repo_name, issue_number):
+        # the issue was closed, so this is a regression worth a fresh analysis
+        await asyncio.to_thread(
+            failure_index.forget, repo_name, workflow_name, signature
+        )
+        return None
 
-    issue_url = create_github_issue(repo_name, workflow_name, logs_url, analysis)
-    return jsonify({"status": "received", "data": data, "issue_url": issue_url}), 200
+    count = await asyncio.to_thread(
+        failure_index.seen_again, repo_name, workflow_name, signature
+    )
+    repo_owner, repo = repo_name.split("/", 1)
+    comment = (
+        f"GitFailGuard saw this failure again in `{workflow_name}`: [View Logs]({logs_url})\n\n"
+        f"Seen {count} times so far."
+    )
+    if other_jobs:
+        comment += "\n\nAlso failing with the same error in this run:\n" + "\n".join(
+            f"- [{job['name']}]({job['html_url']})" for job in other_jobs
+        )
+    with job_queue.timed("post_comment_to_github"):
+        return await post_comment_to_github_async(
+            repo_owner, repo, issue_number, comment
+        )
 
 
 def is_issue_comment(data):
     return data.get("action") == "created" and "comment" in data
 
 
+def mentions_gitfailguard(data):
+    return "@GitFailGuard" in data["comment"]["body"]
+
+
 def handle_issue_comment_event(data):
-    if "@GitFailGuard" not in data["comment"]["body"]:
-        return (
-            jsonify({"status": "GitFailGuard not mentioned in comment", "data": data}),
-            200,
-        )
+    body, status = run_sync(handle_issue_comment_event_async(data))
+    return jsonify(body), status
+
 
-    comment_url = process_issue_comment(data)
+async def handle_issue_comment_event_async(data):
+    if not mentions_gitfailguard(data):
+        return {"status": "GitFailGuard not mentioned in comment"}, 200
+
+    comment_id = data["comment"].get("id")
+    comment_url = await process_issue_comment_async(data)
     if not comment_url:
-        return jsonify({"status": "error", "data": data, "comment_url": None}), 500
+        return {"status": "error", "comment_id": comment_id, "comment_url": None}, 500
 
-    return (
-        jsonify({"status": "received", "data": data, "comment_url": comment_url}),
-        200,
-    )
+    return {
+        "status": "received",
+        "comment_id": comment_id,
+        "comment_url": comment_url,
+    }, 200
 
 
 def process_issue_comment(data):
+    return run_sync(process_issue_comment_async(data))
+
+
+async def process_issue_comment_async(data):
     repo_owner = data["repository"]["owner"]["login"]
     repo_name = data["repository"]["name"]
+    full_name = data["repository"]["full_name"]
     issue_number = data["issue"]["number"]
     comment_body = data["comment"]["body"]
     issue_body = data["issue"]["body"]
     issue_title = data["issue"]["title"]
 
-    response = respond_to_issue_comment(issue_title, issue_body, comment_body)
-    return post_comment_to_github(repo_owner, repo_name, issue_number, response)
+    # earlier exchanges of the thread, kept condensed so long threads stay cheap
+    with job_queue.timed("open_conversation"):
+        conversation = await conversation_store.open(
+            full_name, issue_number, issue_body, summarize_thread_async
+        )
+    with job_queue.timed("respond_to_issue_comment"):
+        response = await respond_to_issue_comment_async(
+            issue_title, issue_body, comment_body, conversation
+        )
+    with job_queue.timed("post_comment_to_github"):
+        comment_url = await post_comment_to_github_async(
+            repo_owner, repo_name, issue_number, response
+        )
+    if comment_url:
+        try:
+            with job_queue.timed("record_conversation"):
+                await conversation_store.add_turn(
+                    full_name,
+                    issue_number,
+                    comment_body,
+                    response,
+                    summarize_thread_async,
+                )
+        except Exception as e:
+            # the reply is posted, the next one only misses this exchange
+            logger.error(
+                "Unable to record the conversation of %s#%s: %r",
+                full_name,
+                issue_number,
+                e,
+            )
+    return comment_url
 
 
 def post_comment_to_github(repo_owner, repo_name, issue_number, comment):
-    github_token = os.getenv("GITHUB_TOKEN")
+    return run_sync(
+        post_comment_to_github_async(repo_owner, repo_name, issue_number, comment)
+    )
+
+
+async def post_comment_to_github_async(repo_owner, repo_name, issue_number, comment):
     github_api_url = f"https://api.github.com/repos/{repo_owner}/{repo_name}/issues/{issue_number}/comments"
-    headers = {
-        "Authorization": f"token {github_token}",
-        "Accept": "application/vnd.github.v3+json",
-    }
     data = {"body": comment}
-    response = requests.post(github_api_url, headers=headers, json=data)
+    response = await github_post_async(github_api_url, json=data)
     if response.status_code == 201:
-        print("Comment posted successfully.")
-        return response.json().get("html_url")
+        comment_url = response.json().get("html_url")
+        logger.info("Comment posted: %s", comment_url)
+        return comment_url
     else:
-        print(f"Failed to post comment on PR {github_api_url}: {response.content}")
+        logger.error(
+            "Failed to post comment on %s: %s", github_api_url, response.content
+        )
         return False
+
+
+EVENT_HANDLERS = {
+    "workflow_job": handle_failed_workflow_async,
+    "issue_comment": handle_issue_comment_event_async,
+}
+
+consumer = None
+if work_queue is not None:
+    consumer = WorkQueueConsumer(
+        work_queue,
+        dispatch_claimed,
+        int(os.getenv("WORK_QUEUE_CONCURRENCY", 8)),
+        int(os.getenv("WORK_QUEUE_BATCH_SIZE", 50)),
+    )
@@ -0,0 +1,66 @@
+import json
+
+# the parts of each event the handlers and the journal use, payloads carry
+# ten to a hundred times more (full repository, sender and organization objects)
+EVENT_FIELDS = {
+    "workflow_job": {
+        "action": None,
+        "workflow_job": {
+            "id": None,
+            "run_id": None,
+            "name": None,
+            "workflow_name": None,
+            "html_url": None,
+            "head_branch": None,
+            "conclusion": None,
+        },
+        "repository": {"full_name": None},
+    },
+    "issue_comment": {
+        "action": None,
+        "issue": {"number": None, "title": None, "body": None},
+        "comment": {"id": None, "html_url": None, "body": None},
+        "repository": {"full_name": None, "name": None, "owner": {"login": None}},
+    },
+}
+
+# a byte string each event type must contain to be acted on, JSON doesn't
+# escape these characters so their absence rules the event out unparsed
+ACTION_MARKERS = {
+    "workflow_job": b'"failure"',
+    "issue_comment": b"@GitFailGuard",
+}
+
+
+def may_need_action(event, body):
+    """False when the raw body of an event can't lead to any work."""
+    marker = ACTION_MARKERS.get(event)
+    return marker is None or marker in body
+
+
+def project(data, fields):
+    """Copy of the fields of a payload named in a nested field spec."""
+    result = {}
+    for key, subfields in fields.items():
+        if key not in data:
+            continue
+        value = data[key]
+        if subfields and isinstance(value, dict):
+            value = project(value, subfields)
+        result[key] = value
+    return result
+
+
+def parse_event(event, body):
+    """Parse a webhook body, keeping only the fields its handler uses."""
+    data = json.loads(body)
+    if not isinstance(data, dict):
+        raise ValueError("webhook payload is not a JSON object")
+    if event is None:
+        # without the X-GitHub-Event header, tell the type by its top-level objects
+        if "workflow_job" in data:
+            event = "workflow_job"
+        elif "comment" in data:
+            event = "issue_comment"
+    fields = EVENT_FIELDS.get(event)
+    return project(data, fields) if fields else data
@@ -0,0 +1,406 @@
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+
+
+class SqliteWorkQueue:
+    """Work queue shared by the processes of one node through a SQLite file.
+
+    Events are keyed by their delivery ID, so a delivery put twice is only
+    queued once, and grouped under an ordering key (the repository). A claim
+    leases a key and returns its pending events in arrival order; until the
+    lease is released or expires no other consumer gets events of that key.
+    """
+
+    def __init__(self, path, lease=60, settle=0, retention=7 * 24 * 3600):
+        self.path = path
+        self.lease = lease
+        self.settle = settle
+        self.retention = retention
+        self.lock = threading.Lock()
+        self.conn = None
+        self.pruned_at = 0
+
+    def connect(self):
+        if self.conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # autocommit, claims take the write lock explicitly
+            self.conn = sqlite3.connect(
+                self.path, timeout=30, check_same_thread=False, isolation_level=None
+            )
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS events ("
+                " id TEXT PRIMARY KEY, key TEXT NOT NULL, kind TEXT NOT NULL,"
+                " payload TEXT NOT NULL, state TEXT NOT NULL,"
+                " enqueued_at REAL NOT NULL, finished_at REAL)"
+            )
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS events_by_state"
+                " ON events (state, key, enqueued_at)"
+            )
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS leases ("
+                " key TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL)"
+                " WITHOUT ROWID"
+            )
+        return self.conn
+
+    def put(self, event_id, kind, key, payload):
+        """Queue an event, returning False if its ID was already queued."""
+        with self.lock:
+            cursor = self.connect().execute(
+                "INSERT OR IGNORE INTO events (id, key, kind, payload, state, enqueued_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (event_id, key, kind, json.dumps(payload), PENDING, time.time()),
+            )
+        return cursor.rowcount == 1
+
+    def claim(self, owner, max_events):
+        """Lease the key with the oldest settled pending event, returning it and its events."""
+        now = time.time()
+        with self.lock:
+            conn = self.connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT key, MIN(enqueued_at) AS oldest FROM events"
+                    " WHERE state = ? AND key NOT IN"
+                    " (SELECT key FROM leases WHERE expires_at > ?)"
+                    " GROUP BY key HAVING oldest <= ? ORDER BY oldest LIMIT 1",
+                    (PENDING, now, now - self.settle),
+                ).fetchone()
+                if row is None:
+                    conn.execute("COMMIT")
+                    return None
+                key = row[0]
+                conn.execute(
+                    "INSERT OR REPLACE INTO leases (key, owner, expires_at)"
+                    " VALUES (?, ?, ?)",
+                    (key, owner, now + self.lease),
+                )
+                rows = conn.execute(
+                    "SELECT id, kind, payload FROM events WHERE state = ? AND key = ?"
+                    " ORDER BY enqueued_at, rowid LIMIT ?",
+                    (PENDING, key, max_events),
+                ).fetchall()
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return key, [
+            {"id": event_id, "kind": kind, "payload": json.loads(payload)}
+            for event_id, kind, payload in rows
+        ]
+
+    def renew(self, key, owner):
+        with self.lock:
+            cursor = self.connect().execute(
+                "UPDATE leases SET expires_at = ? WHERE key = ? AND owner = ?",
+                (time.time() + self.lease, key, owner),
+            )
+        return cursor.rowcount == 1
+
+    def finish(self, event_id, key, state):
+        with self.lock:
+            self.connect().execute(
+                "UPDATE events SET state = ?, finished_at = ? WHERE id = ? AND state = ?",
+                (state, time.time(), event_id, PENDING),
+            )
+
+    def release(self, key, owner):
+        now = time.time()
+        with self.lock:
+            conn = self.connect()
+            conn.execute("DELETE FROM leases WHERE key = ? AND owner = ?", (key, owner))
+            # finished events are kept for the retention to drop late redeliveries
+            if now - self.pruned_at > 60:
+                self.pruned_at = now
+                conn.execute(
+                    "DELETE FROM events WHERE state != ? AND finished_at < ?",
+                    (PENDING, now - self.retention),
+                )
+
+    def stats(self):
+        with self.lock:
+            conn = self.connect()
+            states = dict(
+                conn.execute("SELECT state, COUNT(*) FROM events GROUP BY state")
+            )
+            leased = conn.execute(
+                "SELECT COUNT(*) FROM leases WHERE expires_at > ?", (time.time(),)
+            ).fetchone()[0]
+        return {
+            "backend": "sqlite",
+            "path": self.path,
+            "events": states,
+            "leased_keys": leased,
+        }
+
+
+# compare-and-set of a lease, so a lease that expired and went to another
+# replica is never extended or deleted by its previous owner
+RENEW_LEASE = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("PEXPIRE", KEYS[1], ARGV[2])
+end
+return 0
+"""
+RELEASE_LEASE = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("DEL", KEYS[1])
+end
+return 0
+"""
+
+
+class RedisWorkQueue:
+    """Work queue shared by any number of replicas through Redis.
+
+    Same semantics as SqliteWorkQueue, using plain commands and two short Lua
+    scripts so any Redis-compatible server (or client stand-in) works: a SET NX
+    marker per delivery, a list of event IDs per key, a sorted set of keys with
+    pending events scored by their oldest one, and a SET NX PX lease per key
+    that only its owner renews or releases.
+    """
+
+    def __init__(
+        self, client, prefix="gitfailguard", lease=60, settle=0, retention=7 * 24 * 3600
+    ):
+        self.client = client
+        self.prefix = prefix
+        self.lease = lease
+        self.settle = settle
+        self.retention = retention
+        self.events = f"{prefix}:events"
+        self.ready = f"{prefix}:ready"
+        self.renew_lease = client.register_script(RENEW_LEASE)
+        self.release_lease = client.register_script(RELEASE_LEASE)
+
+    def put(self, event_id, kind, key, payload):
+        """Queue an event, returning False if its ID was already queued."""
+        if not self.client.set(
+            f"{self.prefix}:seen:{event_id}", 1, nx=True, ex=int(self.retention)
+        ):
+            return False
+        now = time.time()
+        event = json.dumps({"kind": kind, "payload": payload, "ts": now})
+        pipe = self.client.pipeline()
+        pipe.hset(self.events, event_id, event)
+        pipe.rpush(self._queue(key), event_id)
+        pipe.zadd(self.ready, {key: now}, nx=True)
+        pipe.execute()
+        return True
+
+    def claim(self, owner, max_events):
+        """Lease the key with the oldest settled pending event, returning it and its events."""
+        settled = time.time() - self.settle
+        start, page = 0, 32
+        # keys stay in the ready set while leased, so they are skipped over
+        while True:
+            keys = self.client.zrangebyscore(
+                self.ready, "-inf", settled, start=start, num=page
+            )
+            if not keys:
+                return None
+            for key in keys:
+                if not self.client.set(
+                    self._lease(key), owner, nx=True, px=int(self.lease * 1000)
+                ):
+                    continue
+                events = []
+                ids = self.client.lrange(self._queue(key), 0, max_events - 1)
+                if ids:
+                    for event_id, event in zip(
+                        ids, self.client.hmget(self.events, ids)
+                    ):
+                        if event is not None:
+                            event = json.loads(event)
+                            events.append(
+                                {
+                                    "id": event_id,
+                                    "kind": event["kind"],
+                                    "payload": event["payload"],
+                                }
+                            )
+                if events:
+                    return key, events
+                self.release(key, owner)
+            start += page
+
+    def renew(self, key, owner):
+        return bool(
+            self.renew_lease(
+                keys=[self._lease(key)], args=[owner, int(self.lease * 1000)]
+            )
+        )
+
+    def finish(self, event_id, key, state):
+        # a MULTI/EXEC transaction, the event leaves the list and the hash together
+        pipe = self.client.pipeline()
+        pipe.lrem(self._queue(key), 1, event_id)
+        pipe.hdel(self.events, event_id)
+        pipe.execute()
+
+    def release(self, key, owner):
+        self.release_lease(keys=[self._lease(key)], args=[owner])
+        # rescore the key by its new oldest event, or drop it once empty; removing
+        # first means an event put meanwhile re-adds it rather than being missed
+        self.client.zrem(self.ready, key)
+        head = self.client.lindex(self._queue(key), 0)
+        if head is not None:
+            event = self.client.hmget(self.events, [head])[0]
+            ts = json.loads(event)["ts"] if event else time.time()
+            self.client.zadd(self.ready, {key: ts}, nx=True)
+
+    def stats(self):
+        return {
+            "backend": "redis",
+            "pending_events": self.client.hlen(self.events),
+            "pending_keys": self.client.zcard(self.ready),
+        }
+
+    def _queue(self, key):
+        return f"{self.prefix}:queue:{key}"
+
+    def _lease(self, key):
+        return f"{self.prefix}:lease:{key}"
+
+
+class WorkQueueConsumer:
+    """Claim batches of events from a shared work queue and keep their leases alive.
+
+    dispatch(key, events) starts a batch and returns False if it can't; whoever
+    runs the batch calls done(key) once all its events are finished.
+    """
+
+    def __init__(
+        self, work_queue, dispatch, concurrency, batch_size=50, poll_interval=0.5
+    ):
+        self.work_queue = work_queue
+        self.dispatch = dispatch
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.owner = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.slots = threading.BoundedSemaphore(concurrency)
+        self.stopped = threading.Event()
+        self.held = set()
+        self.lock = threading.Lock()
+        self.threads = []
+        self.counters = {"batches": 0, "events": 0, "lost_leases": 0}
+
+    def start(self):
+        with self.lock:
+            if self.threads:
+                return
+            for target, name in (
+                (self._claimer, "work-queue-claimer"),
+                (self._renewer, "work-queue-renewer"),
+            ):
+                thread = threading.Thread(target=target, name=name, daemon=True)
+                thread.start()
+                self.threads.append(thread)
+
+    def stop(self):
+        """Stop claiming, batches already dispatched still finish."""
+        self.stopped.set()
+
+    def done(self, key):
+        with self.lock:
+            self.held.discard(key)
+        try:
+            self.work_queue.release(key, self.owner)
+        except Exception as e:
+            # the lease expires on its own
+            logger.error("Unable to release work queue key %s: %s", key, e)
+        self.slots.release()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "owner": self.owner,
+                "held_keys": len(self.held),
+                "concurrency": self.concurrency,
+                **self.counters,
+            }
+
+    def _claimer(self):
+        while not self.stopped.is_set():
+            self.slots.acquire()
+            try:
+                claimed = None
+                if not self.stopped.is_set():
+                    claimed = self.work_queue.claim(self.owner, self.batch_size)
+            except Exception as e:
+                logger.error("Unable to claim from the work queue: %s", e)
+            if claimed is None:
+                self.slots.release()
+                self.stopped.wait(self.poll_interval)
+                continue
+            key, events = claimed
+            with self.lock:
+                self.held.add(key)
+                self.counters["batches"] += 1
+                self.counters["events"] += len(events)
+            if not self.dispatch(key, events):
+                # left pending for this or another replica to claim again
+                self.done(key)
+                self.stopped.wait(self.poll_interval)
+
+    def _renewer(self):
+        interval = self.work_queue.lease / 3
+        while True:
+            time.sleep(interval)
+            with self.lock:
+                held = list(self.held)
+            for key in held:
+                try:
+                    renewed = self.work_queue.renew(key, self.owner)
+                except Exception as e:
+                    logger.error("Unable to renew work queue lease %s: %s", key, e)
+                    continue
+                if not renewed:
+                    with self.lock:
+                        self.counters["lost_leases"] += 1
+                    logger.warning("Lost the work queue lease of %s", key)
+
+
+def create_work_queue():
+    """Shared work queue of WORK_QUEUE_URL, or None to keep events in-process."""
+    url = os.getenv("WORK_QUEUE_URL")
+    if not url:
+        return None
+    options = {
+        "lease": float(os.getenv("WORK_QUEUE_LEASE", 60)),
+        # let the failed jobs of a run arrive so one replica gets them together
+        "settle": float(
+            os.getenv("WORK_QUEUE_SETTLE", os.getenv("COALESCE_WINDOW", 5))
+        ),
+        "retention": float(os.getenv("WORK_QUEUE_RETENTION", 7 * 24 * 3600)),
+    }
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        import redis
+
+        client = redis.Redis.from_url(url, decode_responses=True)
+        return RedisWorkQueue(client, **options)
+    if url == "sqlite":
+        path = os.path.join(
+            os.getenv("GITFAILGUARD_DATA_DIR", "data"), "work_queue.sqlite3"
+        )
+    elif url.startswith("sqlite:///"):
+        path = url[len("sqlite:///") :]
+    else:
+        raise ValueError(f"Unsupported WORK_QUEUE_URL: {url}")
+    return SqliteWorkQueue(path, **options)
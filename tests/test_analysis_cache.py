@@ -0,0 +1,75 @@
+import os
+import tempfile
+import time
+import unittest
+from src.analysis_cache import (
+    AnalysisCache,
+    MemoryCache,
+    SQLiteCache,
+    cache_key,
+    normalize_window,
+)
+
+WINDOW = (
+    "2024-05-21T18:04:11.1234567Z ##[group]Run pytest\n"
+    "2024-05-21T18:04:15.0000000Z FAILED tests/test_app.py::test_login in 1.52s\n"
+    "2024-05-21T18:04:15.1000000Z wrote /tmp/pytest-of-runner/pytest-12/report.xml\n"
+    "2024-05-21T18:04:15.2000000Z ##[error]Process completed with exit code 1."
+)
+
+
+class TestAnalysisCache(unittest.TestCase):
+    def test_normalize_window_strips_volatile_parts(self):
+        rerun = (
+            WINDOW.replace("2024-05-21T18:04", "2024-06-02T09:31")
+            .replace("1.52s", "1.61s")
+            .replace("pytest-12", "pytest-40")
+        )
+        self.assertEqual(normalize_window(WINDOW), normalize_window(rerun))
+        self.assertNotIn("2024-05-21", normalize_window(WINDOW))
+
+    def test_cache_key_depends_on_model_and_prompt(self):
+        key = cache_key(WINDOW, "gpt-3.5-turbo", "prompt")
+        self.assertNotEqual(key, cache_key(WINDOW, "gpt-4", "prompt"))
+        self.assertNotEqual(key, cache_key(WINDOW, "gpt-3.5-turbo", "other prompt"))
+        self.assertNotEqual(key, cache_key("other error", "gpt-3.5-turbo", "prompt"))
+
+    def test_memory_cache_evicts_least_recently_used(self):
+        cache = MemoryCache(max_entries=2)
+        cache.set("a", "1")
+        cache.set("b", "2")
+        cache.get("a")
+        cache.set("c", "3")
+        self.assertEqual(cache.get("a"), "1")
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(len(cache), 2)
+
+    def test_memory_cache_expires_entries(self):
+        cache = MemoryCache(ttl=0.01)
+        cache.set("a", "1")
+        time.sleep(0.02)
+        self.assertIsNone(cache.get("a"))
+
+    def test_sqlite_cache_persists_and_evicts(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "cache", "analyses.sqlite3")
+            cache = SQLiteCache(path, max_entries=2)
+            cache.set("a", "1")
+            cache.set("b", "2")
+            cache.set("c", "3")
+            reopened = SQLiteCache(path, max_entries=2)
+            self.assertIsNone(reopened.get("a"))
+            self.assertEqual(reopened.get("c"), "3")
+            self.assertEqual(len(reopened), 2)
+
+    def test_hit_and_miss_counters(self):
+        cache = AnalysisCache(MemoryCache())
+        self.assertIsNone(cache.get(WINDOW, "model", "prompt"))
+        cache.set(WINDOW, "model", "prompt", "analysis")
+        self.assertEqual(cache.get(WINDOW, "model", "prompt"), "analysis")
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
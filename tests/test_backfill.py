@@ -0,0 +1,201 @@
+import asyncio
+import io
+import json
+import os
+import tempfile
+import unittest
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock, MagicMock, patch
+from src.backfill import Checkpoint, Progress, analyze_run, backfill, iter_pages
+
+
+def page(body):
+    response = MagicMock()
+    response.json.return_value = body
+    return response
+
+
+def job(job_id, run_id=5, name=None):
+    return {
+        "id": job_id,
+        "run_id": run_id,
+        "name": name or f"test ({job_id})",
+        "workflow_name": "CI",
+        "html_url": f"https://github.com/org/app/actions/runs/{run_id}/job/{job_id}",
+        "head_branch": "main",
+        "conclusion": "failure",
+    }
+
+
+class TestBackfill(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    @patch("src.backfill.PER_PAGE", 2)
+    @patch("src.backfill.github_get_async")
+    def test_iter_pages(self, mock_get):
+        mock_get.side_effect = [
+            page({"jobs": [1, 2]}),
+            page({"jobs": [3]}),
+        ]
+
+        async def collect():
+            return [item async for item in iter_pages("/jobs", "jobs", {"a": 1})]
+
+        self.assertEqual(asyncio.run(collect()), [1, 2, 3])
+        self.assertEqual(
+            mock_get.call_args.kwargs["params"], {"a": 1, "per_page": 2, "page": 2}
+        )
+
+    @patch("src.backfill.analyze_error_window_async")
+    @patch("src.backfill.get_error_windows_async")
+    def test_analyze_run_analyzes_each_cause_once(self, mock_windows, mock_analyze):
+        mock_windows.return_value = [
+            "error: disk full",
+            "error: disk full",
+            None,
+            "AssertionError",
+        ]
+        mock_analyze.side_effect = ["Disk is full", RuntimeError("boom")]
+        records = asyncio.run(analyze_run("org/app", [job(i) for i in range(4)]))
+        self.assertEqual(mock_analyze.call_count, 2)
+        self.assertEqual(
+            [record["status"] for record in records],
+            ["analyzed", "analyzed", "no logs", "error"],
+        )
+        self.assertEqual(records[1]["analysis"], "Disk is full")
+        self.assertEqual(records[0]["signature"], records[1]["signature"])
+        self.assertEqual(records[2]["job_id"], 2)
+
+    @patch.dict(os.environ, {"ENABLE_CODERABBIT": "true"})
+    @patch("github_client.github_request_async", new_callable=AsyncMock)
+    @patch("openai.ChatCompletion.acreate")
+    @patch("src.backfill.get_error_windows_async")
+    def test_analyze_run_posts_nothing(self, mock_windows, mock_create, mock_request):
+        mock_windows.return_value = ["##[error]Segmentation fault in libfoo"]
+        mock_create.return_value.choices = [
+            MagicMock(message={"content": "analysis result"})
+        ]
+        records = asyncio.run(analyze_run("org/app", [job(1)]))
+        self.assertEqual(records[0]["status"], "analyzed")
+        # no CodeRabbit ping on the branch's pull request
+        mock_request.assert_not_called()
+
+    def test_checkpoint_survives_a_torn_line(self):
+        path = os.path.join(self.tmp.name, "backfill.checkpoint")
+        checkpoint = Checkpoint(path)
+        checkpoint.add("org/app", 1)
+        checkpoint.close()
+        with open(path, "a") as f:
+            f.write('{"repo": "org/app", "run')
+        checkpoint = Checkpoint(path)
+        self.assertIn(("org/app", 1), checkpoint)
+        self.assertNotIn(("org/app", 2), checkpoint)
+        checkpoint.close()
+
+    @patch("src.backfill.failed_jobs")
+    @patch("src.backfill.failed_runs")
+    def test_backfill_resumes_from_checkpoint(self, mock_runs, mock_jobs):
+        async def runs(repo, since):
+            for run_id in (1, 2, 3):
+                yield {"id": run_id}
+
+        async def jobs(repo, run_id):
+            if run_id == 3:
+                raise RuntimeError("boom")
+            return [job(run_id * 10, run_id)]
+
+        async def handle_run(repo, jobs):
+            return [{"job_id": j["id"], "status": "analyzed"} for j in jobs]
+
+        mock_runs.side_effect = runs
+        mock_jobs.side_effect = jobs
+        checkpoint = Checkpoint(os.path.join(self.tmp.name, "backfill.checkpoint"))
+        checkpoint.add("org/app", 1)
+        output = io.StringIO()
+        progress = Progress()
+        asyncio.run(
+            backfill(
+                ["org/app"],
+                datetime.now(timezone.utc),
+                handle_run,
+                output,
+                checkpoint,
+                progress,
+                concurrency=2,
+            )
+        )
+        checkpoint.close()
+        self.assertEqual(
+            [json.loads(line) for line in output.getvalue().splitlines()],
+            [{"job_id": 20, "status": "analyzed"}],
+        )
+        # the failed run stays out of the checkpoint to be tried again
+        self.assertNotIn(("org/app", 3), checkpoint)
+        self.assertIn(("org/app", 2), checkpoint)
+        self.assertEqual(progress.counts["skipped_runs"], 1)
+        self.assertEqual(progress.counts["failed_runs"], 1)
+        self.assertEqual(progress.counts["analyzed"], 1)
+        self.assertIn("jobs/min", progress.report())
+
+    @patch("src.backfill.analyze_error_window_async")
+    @patch("src.backfill.get_error_windows_async")
+    @patch("src.backfill.failed_jobs")
+    @patch("src.backfill.failed_runs")
+    def test_backfill_retries_runs_that_failed_to_analyze(
+        self, mock_runs, mock_jobs, mock_windows, mock_analyze
+    ):
+        async def runs(repo, since):
+            for run_id in (1, 2):
+                yield {"id": run_id}
+
+        async def jobs(repo, run_id):
+            return [job(run_id * 10, run_id)]
+
+        mock_runs.side_effect = runs
+        mock_jobs.side_effect = jobs
+        # an OpenAI outage on run 1, a dropped log download on run 2
+        mock_windows.side_effect = [["error: disk full"], [TimeoutError()]]
+        mock_analyze.side_effect = RuntimeError("503 Service Unavailable")
+        path = os.path.join(self.tmp.name, "backfill.checkpoint")
+
+        def run_backfill():
+            checkpoint = Checkpoint(path)
+            output = io.StringIO()
+            progress = Progress()
+            asyncio.run(
+                backfill(
+                    ["org/app"],
+                    datetime.now(timezone.utc),
+                    analyze_run,
+                    output,
+                    checkpoint,
+                    progress,
+                    concurrency=1,
+                )
+            )
+            checkpoint.close()
+            return output.getvalue().splitlines(), progress
+
+        lines, progress = run_backfill()
+        self.assertEqual(lines, [])
+        self.assertEqual(progress.counts["failed_runs"], 2)
+
+        # resumed once the outage is over, both runs are tried again
+        mock_windows.side_effect = [["error: disk full"], ["error: disk full"]]
+        mock_analyze.side_effect = None
+        mock_analyze.return_value = "Disk is full"
+        lines, progress = run_backfill()
+        self.assertEqual(
+            [json.loads(line)["status"] for line in lines], ["analyzed", "analyzed"]
+        )
+        self.assertEqual(progress.counts["skipped_runs"], 0)
+        lines, progress = run_backfill()
+        self.assertEqual(progress.counts["skipped_runs"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,45 @@
+import asyncio
+import unittest
+from src.coalescer import Coalescer
+
+
+class TestCoalescer(unittest.TestCase):
+    def test_items_within_window_are_handled_as_one_batch(self):
+        coalescer = Coalescer(0.05)
+        batches = []
+
+        async def handle_batch(items):
+            batches.append(items)
+            return [item * 10 for item in items]
+
+        async def run():
+            return await asyncio.gather(
+                coalescer.submit("run-1", 1, handle_batch),
+                coalescer.submit("run-1", 2, handle_batch),
+                coalescer.submit("run-2", 3, handle_batch),
+            )
+
+        self.assertEqual(asyncio.run(run()), [10, 20, 30])
+        self.assertEqual(sorted(batches), [[1, 2], [3]])
+        self.assertEqual(coalescer.stats()["batches"], 2)
+        self.assertEqual(coalescer.stats()["open"], 0)
+
+    def test_batch_errors_reach_every_submitter(self):
+        coalescer = Coalescer(0.01)
+
+        async def handle_batch(items):
+            raise RuntimeError("boom")
+
+        async def run():
+            return await asyncio.gather(
+                coalescer.submit("run-1", 1, handle_batch),
+                coalescer.submit("run-1", 2, handle_batch),
+                return_exceptions=True,
+            )
+
+        results = asyncio.run(run())
+        self.assertTrue(all(isinstance(result, RuntimeError) for result in results))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,129 @@
+import asyncio
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import AsyncMock
+from src.conversation_store import (
+    ISSUE_SUMMARY_PROMPT,
+    THREAD_SUMMARY_PROMPT,
+    ConversationStore,
+)
+
+ISSUE = "The GitHub Action `CI` failed.\n\nAnalysis:\nThe login test expects a 200."
+
+
+class TestConversationStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "conversations.sqlite3")
+        self.summarize = AsyncMock(return_value="condensed")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def reply(self, store, comment, reply):
+        return asyncio.run(store.add_turn("org/app", 7, comment, reply, self.summarize))
+
+    def test_issue_is_condensed_once(self):
+        store = ConversationStore(self.path, issue_budget=5)
+        conversation = asyncio.run(store.open("org/app", 7, ISSUE, self.summarize))
+        self.assertEqual(conversation["issue"], "condensed")
+        self.assertEqual(self.summarize.call_args[0][:2], (ISSUE_SUMMARY_PROMPT, ISSUE))
+
+        # another process opening the same thread reuses it
+        store = ConversationStore(self.path, issue_budget=5)
+        conversation = asyncio.run(store.open("org/app", 7, ISSUE, self.summarize))
+        self.assertEqual(conversation["issue"], "condensed")
+        self.assertEqual(self.summarize.call_count, 1)
+        self.assertEqual(store.stats()["continued"], 1)
+
+    def test_short_issue_is_kept_as_is(self):
+        store = ConversationStore(self.path)
+        conversation = asyncio.run(store.open("org/app", 7, None, self.summarize))
+        self.assertEqual(conversation["issue"], "")
+        conversation = asyncio.run(store.open("org/app", 7, ISSUE, self.summarize))
+        self.assertEqual(conversation["issue"], ISSUE)
+        self.summarize.assert_not_called()
+
+    def test_old_exchanges_are_folded_into_the_summary(self):
+        store = ConversationStore(self.path, max_turns=2)
+        asyncio.run(store.open("org/app", 7, ISSUE, self.summarize))
+        self.reply(store, "why?", "because")
+        conversation = self.reply(store, "how?", "like this")
+        self.assertEqual(len(conversation["turns"]), 4)
+        self.summarize.assert_not_called()
+
+        conversation = self.reply(store, "and now?", "retry")
+        self.assertEqual(conversation["summary"], "condensed")
+        self.assertEqual(
+            [turn["content"] for turn in conversation["turns"]],
+            ["how?", "like this", "and now?", "retry"],
+        )
+        prompt, text, _ = self.summarize.call_args[0]
+        self.assertEqual(prompt, THREAD_SUMMARY_PROMPT)
+        self.assertEqual(text, "User: why?\n\nGitFailGuard: because")
+
+        self.summarize.return_value = "condensed again"
+        self.reply(store, "still failing", "check the token")
+        self.assertIn("Summary so far:\ncondensed", self.summarize.call_args[0][1])
+        self.assertEqual(store.get("org/app", 7)["summary"], "condensed again")
+        self.assertEqual(store.stats()["folded"], 2)
+
+    def test_turns_are_kept_within_the_budget(self):
+        store = ConversationStore(self.path, max_turns=10, turns_budget=50)
+        asyncio.run(store.open("org/app", 7, ISSUE, self.summarize))
+        self.reply(store, "word " * 40, "answer " * 40)
+        conversation = self.reply(store, "short", "reply")
+        # only the latest exchange is never folded, however long
+        self.assertEqual(
+            [turn["content"] for turn in conversation["turns"]], ["short", "reply"]
+        )
+        conversation = self.reply(store, "word " * 40, "answer " * 40)
+        self.assertEqual(len(conversation["turns"]), 2)
+
+    def test_edited_issue_keeps_its_thread(self):
+        store = ConversationStore(self.path)
+        asyncio.run(store.open("org/app", 7, ISSUE, self.summarize))
+        self.reply(store, "why?", "because")
+        conversation = asyncio.run(
+            store.open("org/app", 7, ISSUE + "\nUpdate: fixed", self.summarize)
+        )
+        self.assertTrue(conversation["issue"].endswith("Update: fixed"))
+        self.assertEqual(len(conversation["turns"]), 2)
+        self.assertIsNone(store.get("org/app", 8))
+
+    def test_sqlite_waits_off_the_event_loop(self):
+        store = ConversationStore(self.path)
+        asyncio.run(store.open("org/app", 7, ISSUE, self.summarize))
+        update = store._update
+
+        def slow_update(*args):
+            # another process holding the write lock
+            time.sleep(0.2)
+            return update(*args)
+
+        store._update = slow_update
+
+        async def reply_and_tick():
+            ticks = []
+
+            async def tick():
+                for _ in range(5):
+                    ticks.append(time.monotonic())
+                    await asyncio.sleep(0.02)
+
+            ticker = asyncio.ensure_future(tick())
+            await asyncio.sleep(0)
+            await store.add_turn("org/app", 7, "why?", "because", self.summarize)
+            await ticker
+            return ticks
+
+        ticks = asyncio.run(reply_and_tick())
+        # the loop kept ticking while the reply waited on the database
+        self.assertLess(ticks[-1] - ticks[0], 0.18)
+        self.assertEqual(len(store.get("org/app", 7)["turns"]), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,196 @@
+import asyncio
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+from src.event_journal import (
+    COMPLETED,
+    FAILED,
+    PENDING,
+    REJECTED,
+    EventJournal,
+    read_journal,
+)
+from src.replay import replay, select_entries
+
+
+class TestEventJournal(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.directory = self.tmp.name
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def crash(self, journal):
+        # closing the file drops the flock like a dead process would
+        journal.flush()
+        journal.file.close()
+
+    def test_unfinished_entries_are_adopted_after_a_crash(self):
+        journal = EventJournal(self.directory)
+        done = journal.append("workflow_job", {"n": 1})
+        journal.append("workflow_job", {"n": 2}, entry_id="delivery-2")
+        journal.finish(done, COMPLETED)
+        self.crash(journal)
+
+        recovered = EventJournal(self.directory)
+        unfinished = recovered.unfinished()
+        self.assertEqual(recovered.path, journal.path)
+        self.assertEqual([record["id"] for record in unfinished], ["delivery-2"])
+        self.assertEqual(unfinished[0]["payload"], {"n": 2})
+
+    def test_accepted_ids_skip_rejected_and_failed_entries(self):
+        journal = EventJournal(self.directory)
+        journal.append("workflow_job", {}, entry_id="delivery-1")
+        journal.append("workflow_job", {}, entry_id="delivery-2")
+        journal.append("issue_comment", {}, entry_id="delivery-3")
+        journal.append("workflow_job", {}, entry_id="delivery-4")
+        journal.finish("delivery-2", REJECTED)
+        journal.finish("delivery-3", COMPLETED)
+        journal.finish("delivery-4", FAILED)
+        self.crash(journal)
+
+        recovered = EventJournal(self.directory)
+        self.assertEqual(recovered.accepted_ids(), ["delivery-1", "delivery-3"])
+
+    def test_each_process_gets_its_own_file(self):
+        first = EventJournal(self.directory)
+        second = EventJournal(self.directory)
+        first.append("workflow_job", {})
+        second.append("workflow_job", {})
+        self.assertNotEqual(first.path, second.path)
+        self.assertEqual(len(read_journal(self.directory)), 2)
+
+    def test_torn_record_is_dropped(self):
+        journal = EventJournal(self.directory)
+        journal.append("workflow_job", {"n": 1}, entry_id="a")
+        self.crash(journal)
+        with open(journal.path, "ab") as f:
+            f.write(b'{"op":"accept","id":"b","ts":')
+
+        recovered = EventJournal(self.directory)
+        recovered.append("workflow_job", {"n": 3}, entry_id="c")
+        self.assertEqual(
+            [record["id"] for record in recovered.unfinished()], ["a", "c"]
+        )
+
+    def test_concurrent_appends_share_fsyncs(self):
+        journal = EventJournal(self.directory)
+        threads = [
+            threading.Thread(
+                target=lambda: [journal.append("workflow_job", {}) for _ in range(20)]
+            )
+            for _ in range(20)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        stats = journal.stats()
+        self.assertEqual(stats["appends"], 400)
+        self.assertLessEqual(stats["fsyncs"], 400)
+        self.assertEqual(stats["entries"], {PENDING: 400})
+
+    def test_compaction_drops_old_finished_entries(self):
+        journal = EventJournal(self.directory, compact_bytes=10**9, retention=0)
+        ids = [journal.append("workflow_job", {"pad": "x" * 100}) for _ in range(30)]
+        for entry_id in ids[:-1]:
+            journal.finish(entry_id, COMPLETED)
+        journal.flush()
+        journal.compact_bytes = 2048
+        journal.append("workflow_job", {"pad": "x" * 100}, entry_id="last")
+        journal.flush()
+        self.assertEqual(journal.stats()["compactions"], 1)
+        self.assertLess(os.path.getsize(journal.path), 2048)
+        self.assertEqual(
+            {record["id"] for record in journal.unfinished()}, {ids[-1], "last"}
+        )
+        self.assertEqual(len(read_journal(self.directory)), 2)
+
+    def test_replay_selection(self):
+        journal = EventJournal(self.directory)
+        failed = journal.append("workflow_job", {"n": 1})
+        journal.finish(failed, FAILED)
+        journal.append("issue_comment", {"n": 2})
+        journal.append("workflow_job", {"n": 3})
+        journal.flush()
+        entries = read_journal(self.directory)
+        self.assertEqual(
+            [e["payload"] for e in select_entries(entries, states=[FAILED])],
+            [{"n": 1}],
+        )
+        self.assertEqual(
+            [e["payload"] for e in select_entries(entries, since=entries[1]["ts"])],
+            [{"n": 3}],
+        )
+
+    @patch("src.replay.journal")
+    @patch("src.replay.handle_failed_jobs_async")
+    def test_replay_keeps_its_rate_while_events_run(self, mock_handle, mock_journal):
+        async def handle(events):
+            await asyncio.sleep(0.3)
+            if events[0]["n"] == 2:
+                raise RuntimeError("boom")
+            return [({"status": "received", "issue_url": None}, 200)]
+
+        mock_handle.side_effect = handle
+        entries = [
+            {
+                "id": f"e{n}",
+                "ts": 0,
+                "state": FAILED,
+                "payload": {"n": n, "workflow_job": {"html_url": "http://x"}},
+            }
+            for n in range(5)
+        ]
+        start = time.monotonic()
+        counts = replay(entries, rate=50)
+        # one at a time would take 1.5s
+        self.assertLess(time.monotonic() - start, 0.9)
+        self.assertEqual(counts, {"received": 4, "error": 1})
+        self.assertEqual(
+            [call.args[1] for call in mock_journal.record_replay.call_args_list],
+            [COMPLETED, COMPLETED, FAILED, COMPLETED, COMPLETED],
+        )
+
+    @patch("src.replay.handle_failed_jobs_async")
+    def test_replayed_entries_are_not_resumed_again(self, mock_handle):
+        async def handle(events):
+            return [({"status": "received", "issue_url": None}, 200)]
+
+        mock_handle.side_effect = handle
+        owner = EventJournal(self.directory)
+        owner.append("workflow_job", {"workflow_job": {"html_url": "http://x/1"}}, "d1")
+        owner.append("workflow_job", {"workflow_job": {"html_url": "http://x/2"}}, "d2")
+        owner.flush()
+
+        # replayed while the owner still runs, so into a file of its own
+        replayer = EventJournal(self.directory)
+        entries = select_entries(read_journal(self.directory), states=[PENDING])
+        with patch("src.replay.journal", replayer):
+            replay([entry for entry in entries if entry["id"] == "d1"], rate=100)
+        self.assertNotEqual(replayer.path, owner.path)
+        self.assertEqual(
+            {e["id"]: e["state"] for e in read_journal(self.directory)},
+            {"d1": COMPLETED, "d2": PENDING},
+        )
+        self.crash(owner)
+        self.crash(replayer)
+
+        recovered = EventJournal(self.directory)
+        self.assertEqual([record["id"] for record in recovered.unfinished()], ["d2"])
+        self.assertEqual(recovered.path, owner.path)
+        # the outcome is copied into the owning file, it outlives the other one
+        self.crash(recovered)
+        os.remove(replayer.path)
+        self.assertEqual(
+            [record["id"] for record in EventJournal(self.directory).unfinished()],
+            ["d2"],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
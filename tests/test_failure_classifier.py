@@ -0,0 +1,144 @@
+import re
+import unittest
+from unittest.mock import patch
+from src.failure_classifier import (
+    FailureClassifier,
+    create_failure_classifier,
+    trie_pattern,
+)
+
+
+class TestFailureClassifier(unittest.TestCase):
+    def test_trie_pattern_matches_exactly_the_literals(self):
+        literals = ["npm ERR!", "npm error", "npx", "n", "ETIMEDOUT"]
+        pattern = re.compile(f"(?:{trie_pattern(literals)})$")
+        for literal in literals:
+            self.assertTrue(pattern.match(literal), literal)
+        for other in ["np", "npm", "npm ER", "ETIMEDOU", "npxx"]:
+            self.assertIsNone(pattern.match(other), other)
+
+    def test_first_rule_wins_whatever_the_match_order(self):
+        classifier = FailureClassifier(
+            [
+                {"name": "oom", "literals": ["exit code 137"], "analysis": "OOM"},
+                {"name": "npm", "literals": ["npm ERR!"], "analysis": "npm: {line}"},
+            ]
+        )
+        logs = (
+            "npm ERR! code ELIFECYCLE\n##[error]Process completed with exit code 137."
+        )
+        self.assertTrue(classifier.classify(logs).startswith("OOM\n\n"))
+        analysis = classifier.classify("npm ERR! code ELIFECYCLE\nnpm ERR! errno 1")
+        self.assertTrue(analysis.startswith("npm: npm ERR! code ELIFECYCLE\n\n"))
+        self.assertIn("`npm`", analysis)
+        self.assertIsNone(classifier.classify("error TS2322: Type 'string'"))
+        self.assertEqual(
+            classifier.stats(),
+            {
+                "rules": 2,
+                "classified": 2,
+                "unclassified": 1,
+                "by_rule": {"oom": 1, "npm": 1},
+            },
+        )
+
+    def test_earlier_regex_rule_wins_over_later_literal_rule(self):
+        classifier = FailureClassifier(
+            [
+                {"name": "module", "regex": r"No module named \S+", "analysis": "m"},
+                {"name": "no", "literals": ["No module"], "analysis": "n"},
+                {"name": "named", "literals": ["module named"], "analysis": "d"},
+            ]
+        )
+        self.assertEqual(
+            classifier.match("E   ImportError: No module named yaml")["rule"], "module"
+        )
+        # overlapping matches of later rules don't hide it either
+        classifier = FailureClassifier(
+            [
+                {"name": "named", "regex": r"named \S+", "analysis": ""},
+                {"name": "no", "literals": ["No module named"], "analysis": ""},
+            ]
+        )
+        self.assertEqual(classifier.match("No module named yaml")["rule"], "named")
+
+    def test_only_the_tail_before_the_error_is_matched(self):
+        classifier = create_failure_classifier()
+        logs = "\n".join(
+            ["##[group]Run npm ci", "npm ERR! code ETIMEDOUT", "retrying"]
+            + [f"src/module{i}.ts compiled" for i in range(20)]
+            + [
+                "src/app.ts(12,5): error TS2322: Type 'string' is not assignable",
+                "##[error]Process completed with exit code 2.",
+                "##[group]Post job cleanup",
+            ]
+        )
+        self.assertIsNone(classifier.match(logs))
+        self.assertEqual(
+            classifier.match(
+                logs.replace("src/module19.ts compiled", "npm ERR! code ETIMEDOUT")
+            )["rule"],
+            "network-error",
+        )
+
+    def test_regex_and_case_insensitive_rules(self):
+        classifier = FailureClassifier(
+            [
+                {
+                    "name": "dns",
+                    "literals": ["could not resolve host"],
+                    "ignore_case": True,
+                    "analysis": "dns {match}",
+                },
+                {
+                    "name": "module",
+                    "regex": "No module named '[^']+'",
+                    "analysis": "missing {match}",
+                },
+            ]
+        )
+        self.assertTrue(
+            classifier.classify("fatal: Could Not Resolve Host: github.com").startswith(
+                "dns Could Not Resolve Host"
+            )
+        )
+        self.assertTrue(
+            classifier.classify(
+                "ModuleNotFoundError: No module named 'yaml'"
+            ).startswith("missing No module named 'yaml'")
+        )
+
+    def test_thousands_of_literals(self):
+        rules = [
+            {"name": f"rule-{i}", "literals": [f"E{i:05d}: failure"], "analysis": ""}
+            for i in range(5000)
+        ]
+        classifier = FailureClassifier(rules)
+        self.assertEqual(
+            classifier.match("x\nerror E04321: failure in step\n")["rule"], "rule-4321"
+        )
+        self.assertIsNone(classifier.match("error E99999: failure"))
+
+    def test_bundled_rules(self):
+        classifier = create_failure_classifier()
+        samples = {
+            "FATAL ERROR: Reached heap limit Allocation failed - JavaScript heap out of memory": "out-of-memory",
+            "##[error]Process completed with exit code 137.": "out-of-memory",
+            "toomanyrequests: You have reached your pull rate limit. You may increase the limit": "docker-pull-rate-limit",
+            "========= 2 failed, 118 passed in 12.31s =========": "pytest-failures",
+            "npm ERR! code ETIMEDOUT": "network-error",
+            'npm ERR! Missing script: "build"': "npm-error",
+        }
+        for logs, rule in samples.items():
+            self.assertEqual(classifier.match(logs)["rule"], rule, logs)
+        self.assertIsNone(
+            classifier.match("src/app.ts(12,5): error TS2322: Type 'string'")
+        )
+
+    @patch.dict("os.environ", {"FAILURE_RULES_PATH": ""})
+    def test_empty_rules_path_disables_the_classifier(self):
+        self.assertIsNone(create_failure_classifier().classify("exit code 137"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+import os
+import tempfile
+import unittest
+from src.failure_index import FailureIndex, failure_signature, issue_number_from_url
+
+
+class TestFailureIndex(unittest.TestCase):
+    def test_failure_signature_ignores_noise(self):
+        first = (
+            "2024-05-21T18:04:11.1Z ##[group]Run npm test\n"
+            "2024-05-21T18:04:12.1Z downloading 120 packages\n"
+            "2024-05-21T18:04:13.1Z Error: Cannot find module 'left-pad'\n"
+            "2024-05-21T18:04:13.2Z ##[error]Process completed with exit code 1."
+        )
+        second = (
+            "2024-06-01T10:00:00.1Z ##[group]Run npm test\n"
+            "2024-06-01T10:00:01.1Z downloading 121 packages from a mirror\n"
+            "2024-06-01T10:00:02.1Z Error: Cannot find module 'left-pad'\n"
+            "2024-06-01T10:00:02.2Z ##[error]Process completed with exit code 1."
+        )
+        other = first.replace("left-pad", "right-pad")
+        self.assertEqual(failure_signature(first), failure_signature(second))
+        self.assertNotEqual(failure_signature(first), failure_signature(other))
+
+    def test_issue_number_from_url(self):
+        self.assertEqual(
+            issue_number_from_url("https://github.com/test/repo/issues/42"), 42
+        )
+        self.assertIsNone(issue_number_from_url(None))
+
+    def test_index_survives_restart(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "failures.sqlite3")
+            index = FailureIndex(path)
+            self.assertIsNone(index.lookup("test/repo", "build", "abc"))
+            index.record(
+                "test/repo", "build", "abc", "https://github.com/test/repo/issues/9"
+            )
+            self.assertEqual(index.seen_again("test/repo", "build", "abc"), 2)
+
+            reopened = FailureIndex(path)
+            known = reopened.lookup("test/repo", "build", "abc")
+            self.assertEqual(known["issue_number"], 9)
+            self.assertEqual(known["count"], 2)
+            self.assertIsNone(reopened.lookup("test/repo", "deploy", "abc"))
+            reopened.forget("test/repo", "build", "abc")
+            self.assertEqual(len(reopened), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,181 @@
+import asyncio
+import unittest
+import aiohttp
+import requests
+from unittest.mock import patch, AsyncMock, MagicMock
+from src.github_client import (
+    GITHUB_RETRIES,
+    GITHUB_SECONDS,
+    create_session,
+    github_endpoint,
+    github_request,
+    github_request_async,
+    is_rate_limited,
+)
+
+
+def make_response(status_code, headers=None, text=""):
+    response = MagicMock()
+    response.status_code = status_code
+    response.headers = headers or {}
+    response.text = text
+    return response
+
+
+def make_raw_response(status, headers=None, body=b""):
+    raw = MagicMock(status=status, headers=headers or {}, charset="utf-8")
+    raw.read = AsyncMock(return_value=body)
+    return raw
+
+
+class TestGitHubClient(unittest.TestCase):
+    @patch.dict("os.environ", {"GITHUB_TOKEN": "secret"})
+    def test_create_session_sets_auth_headers(self):
+        session = create_session(pool_size=4)
+        self.assertEqual(session.headers["Authorization"], "token secret")
+        self.assertEqual(session.headers["Accept"], "application/vnd.github.v3+json")
+        self.assertEqual(session.get_adapter("https://api.github.com")._pool_maxsize, 4)
+
+    @patch("src.github_client.time.sleep")
+    @patch("src.github_client.get_session")
+    def test_retries_server_errors(self, mock_get_session, mock_sleep):
+        mock_get_session.return_value.request.side_effect = [
+            make_response(502),
+            make_response(200),
+        ]
+        retries = GITHUB_RETRIES.value("status")
+        errors = GITHUB_SECONDS.count("GET", "/repos/:owner/:repo", "502")
+        response = github_request("GET", "/repos/test/repo", max_retries=3)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(GITHUB_RETRIES.value("status"), retries + 1)
+        self.assertEqual(
+            GITHUB_SECONDS.count("GET", "/repos/:owner/:repo", "502"), errors + 1
+        )
+        self.assertEqual(mock_get_session.return_value.request.call_count, 2)
+        args, kwargs = mock_get_session.return_value.request.call_args
+        self.assertEqual(args, ("GET", "https://api.github.com/repos/test/repo"))
+        self.assertIn("timeout", kwargs)
+        mock_sleep.assert_called_once()
+
+    @patch("src.github_client.time.sleep")
+    @patch("src.github_client.get_session")
+    def test_post_is_not_retried_on_server_error(self, mock_get_session, mock_sleep):
+        mock_get_session.return_value.request.return_value = make_response(502)
+        response = github_request("POST", "/repos/test/repo/issues", json={})
+        self.assertEqual(response.status_code, 502)
+        mock_sleep.assert_not_called()
+
+    @patch("src.github_client.time.sleep")
+    @patch("src.github_client.get_session")
+    def test_post_is_not_sent_twice_after_a_read_timeout(
+        self, mock_get_session, mock_sleep
+    ):
+        request = mock_get_session.return_value.request
+        request.side_effect = requests.ReadTimeout("read timed out")
+        with self.assertRaises(requests.ReadTimeout):
+            github_request("POST", "/repos/test/repo/issues", json={}, max_retries=3)
+        self.assertEqual(request.call_count, 1)
+
+        # a connection that was never made is safe to try again
+        request.reset_mock()
+        request.side_effect = [
+            requests.ConnectTimeout("connect timed out"),
+            make_response(201),
+        ]
+        response = github_request("POST", "/repos/test/repo/issues", json={})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(request.call_count, 2)
+
+    @patch("src.github_client.asyncio.sleep", new_callable=AsyncMock)
+    @patch("src.github_client.get_async_session")
+    def test_async_post_is_not_sent_twice_after_a_timeout(
+        self, mock_get_session, mock_sleep
+    ):
+        mock_get_session.return_value.request = AsyncMock(
+            side_effect=aiohttp.ServerTimeoutError("read timed out")
+        )
+        with self.assertRaises(aiohttp.ServerTimeoutError):
+            asyncio.run(
+                github_request_async("POST", "/repos/test/repo/issues", json={})
+            )
+        self.assertEqual(mock_get_session.return_value.request.call_count, 1)
+        mock_sleep.assert_not_awaited()
+
+    @patch("src.github_client.scheduler")
+    @patch("src.github_client.time.sleep")
+    @patch("src.github_client.get_session")
+    def test_secondary_rate_limit_waits_on_scheduler(
+        self, mock_get_session, mock_sleep, mock_scheduler
+    ):
+        limited = make_response(403, {"Retry-After": "7"})
+        mock_get_session.return_value.request.side_effect = [
+            limited,
+            make_response(201),
+        ]
+        response = github_request(
+            "POST", "/repos/test/repo/issues", json={}, priority="batch"
+        )
+        self.assertEqual(response.status_code, 201)
+        mock_sleep.assert_not_called()
+        self.assertEqual(mock_scheduler.acquire.call_count, 2)
+        mock_scheduler.acquire.assert_called_with("batch")
+        mock_scheduler.update.assert_any_call(limited, rate_limited=True)
+
+    @patch("src.github_client.asyncio.sleep", new_callable=AsyncMock)
+    @patch("src.github_client.get_async_session")
+    def test_async_request_retries_server_errors(self, mock_get_session, mock_sleep):
+        mock_get_session.return_value.request = AsyncMock(
+            side_effect=[
+                make_raw_response(502),
+                make_raw_response(200, body=b'{"state": "open"}'),
+            ]
+        )
+        response = asyncio.run(
+            github_request_async("GET", "/repos/test/repo/issues/1", max_retries=3)
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"state": "open"})
+        self.assertEqual(mock_get_session.return_value.request.call_count, 2)
+        args, kwargs = mock_get_session.return_value.request.call_args
+        self.assertEqual(
+            args, ("GET", "https://api.github.com/repos/test/repo/issues/1")
+        )
+        self.assertIn("timeout", kwargs)
+        mock_sleep.assert_awaited_once()
+
+    @patch("src.github_client.get_async_session")
+    def test_async_stream_leaves_body_unread(self, mock_get_session):
+        raw = make_raw_response(200)
+        mock_get_session.return_value.request = AsyncMock(return_value=raw)
+        response = asyncio.run(github_request_async("GET", "/logs", stream=True))
+        raw.read.assert_not_awaited()
+        response.close()
+        raw.release.assert_called_once()
+
+    def test_github_endpoint(self):
+        self.assertEqual(
+            github_endpoint(
+                "https://api.github.com/repos/octo/app/actions/jobs/25250914650/logs"
+            ),
+            "/repos/:owner/:repo/actions/jobs/:id/logs",
+        )
+        self.assertEqual(
+            github_endpoint("https://api.github.com/repos/octo/app/pulls?state=open"),
+            "/repos/:owner/:repo/pulls",
+        )
+
+    def test_is_rate_limited(self):
+        self.assertTrue(is_rate_limited(make_response(429)))
+        self.assertTrue(
+            is_rate_limited(
+                make_response(403, text="You have exceeded a secondary rate limit")
+            )
+        )
+        self.assertFalse(
+            is_rate_limited(make_response(403, text="Resource not accessible"))
+        )
+        self.assertFalse(is_rate_limited(make_response(500)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,12 +1,12 @@
 import unittest
 from unittest.mock import patch, MagicMock
-from src.github_issue_creator import create_github_issue
+from src.github_issue_creator import create_github_issue, respond_to_issue_comment
 
 
 class TestGitHubIssueCreator(unittest.TestCase):
-    @patch("src.github_issue_creator.requests.post")
+    @patch("src.github_issue_creator.github_post_async")
     def test_create_github_issue(self, mock_post):
-        mock_post.return_value.status_code = 201
+        mock_post.return_value = MagicMock(status_code=201)
         repo_name = "test/repo"
         workflow_name = "Test Workflow"
         logs_url = "http://example.com/logs"
@@ -15,7 +15,6 @@ class TestGitHubIssueCreator(unittest.TestCase):
         mock_post.assert_called_once()
         args, kwargs = mock_post.call_args
         self.assertIn("https://api.github.com/repos/test/repo/issues", args)
-        self.assertEqual(kwargs["headers"]["Authorization"], "token None")
         self.assertEqual(kwargs["json"]["title"], "Failed GitHub Action: Test Workflow")
         self.assertIn(
             "The GitHub Action `Test Workflow` failed.", kwargs["json"]["body"]
@@ -25,6 +24,31 @@ class TestGitHubIssueCreator(unittest.TestCase):
         )
         self.assertIn("Analysis:\nanalysis result", kwargs["json"]["body"])
 
+    @patch("openai.ChatCompletion.acreate")
+    def test_respond_to_issue_comment_with_conversation(self, mock_create):
+        mock_create.return_value.choices = [MagicMock(message={"content": "reply"})]
+        conversation = {
+            "issue": "condensed issue",
+            "summary": "asked about the token",
+            "turns": [
+                {"role": "user", "content": "why?"},
+                {"role": "assistant", "content": "because"},
+            ],
+        }
+        reply = respond_to_issue_comment(
+            "CI failed", "full issue body", "and now?", conversation
+        )
+        self.assertEqual(reply, "reply")
+        messages = mock_create.call_args.kwargs["messages"]
+        self.assertEqual(
+            [message["role"] for message in messages],
+            ["system", "user", "assistant", "user"],
+        )
+        self.assertIn("condensed issue", messages[0]["content"])
+        self.assertIn("asked about the token", messages[0]["content"])
+        self.assertNotIn("full issue body", messages[0]["content"])
+        self.assertEqual(messages[-1]["content"], "and now?")
+
 
 if __name__ == "__main__":
     unittest.main()
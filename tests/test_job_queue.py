@@ -0,0 +1,104 @@
+import asyncio
+import contextvars
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock
+from src.job_queue import JobQueue
+
+
+class TestJobQueue(unittest.TestCase):
+    def test_submit_runs_handler_in_worker(self):
+        job_queue = JobQueue(max_size=10, concurrency=2)
+        handler = MagicMock()
+        self.assertTrue(job_queue.submit("workflow_job", handler, {"id": 1}))
+        job_queue.join()
+        handler.assert_called_once_with({"id": 1})
+        stats = job_queue.stats()
+        self.assertEqual(stats["completed"], 1)
+        self.assertEqual(stats["queue_depth"], 0)
+        self.assertIn("queue_wait", stats["latency"])
+        self.assertIn("workflow_job", stats["latency"])
+
+    def test_submit_rejects_when_full(self):
+        job_queue = JobQueue(max_size=1, concurrency=1)
+        release = threading.Event()
+        started = threading.Event()
+
+        def blocking_handler():
+            started.set()
+            release.wait(5)
+
+        self.assertTrue(job_queue.submit("workflow_job", blocking_handler))
+        started.wait(5)
+        self.assertTrue(job_queue.submit("workflow_job", blocking_handler))
+        self.assertFalse(job_queue.submit("workflow_job", blocking_handler))
+        self.assertEqual(job_queue.stats()["rejected"], 1)
+        release.set()
+        job_queue.join()
+
+    def test_failed_job_is_counted(self):
+        job_queue = JobQueue(max_size=10, concurrency=1)
+        job_queue.submit("issue_comment", MagicMock(side_effect=ValueError("boom")))
+        job_queue.join()
+        self.assertEqual(job_queue.stats()["failed"], 1)
+
+    def test_jobs_run_in_the_submitters_context(self):
+        job_queue = JobQueue(max_size=10, concurrency=1)
+        delivery = contextvars.ContextVar("delivery", default=None)
+        seen = []
+        delivery.set("delivery-1")
+        job_queue.submit("workflow_job", lambda: seen.append(delivery.get()))
+        delivery.set(None)
+        job_queue.join()
+        self.assertEqual(seen, ["delivery-1"])
+
+    def test_coroutine_handlers_run_concurrently_on_the_loop(self):
+        job_queue = JobQueue(max_size=10, concurrency=1, async_concurrency=5)
+        handled = []
+
+        async def handler(i):
+            await asyncio.sleep(0.1)
+            handled.append(i)
+
+        start = time.monotonic()
+        for i in range(5):
+            job_queue.submit("workflow_job", handler, i)
+        job_queue.join()
+        # a single worker thread, yet the five jobs overlap
+        self.assertLess(time.monotonic() - start, 0.4)
+        self.assertEqual(sorted(handled), [0, 1, 2, 3, 4])
+        self.assertEqual(job_queue.stats()["completed"], 5)
+        self.assertEqual(job_queue.stats()["busy_workers"], 0)
+
+    def test_failed_coroutine_is_counted(self):
+        job_queue = JobQueue(max_size=10, concurrency=1)
+
+        async def handler():
+            raise ValueError("boom")
+
+        job_queue.submit("issue_comment", handler)
+        job_queue.join()
+        self.assertEqual(job_queue.stats()["failed"], 1)
+
+    def test_shutdown_drains_queue_and_rejects_new_jobs(self):
+        job_queue = JobQueue(max_size=10, concurrency=1)
+        handler = MagicMock()
+        for i in range(3):
+            job_queue.submit("workflow_job", handler, i)
+        self.assertTrue(job_queue.shutdown(timeout=5))
+        self.assertEqual(handler.call_count, 3)
+        self.assertFalse(job_queue.is_ready())
+        self.assertFalse(job_queue.submit("workflow_job", handler, 4))
+        self.assertTrue(job_queue.is_alive())
+
+    def test_shutdown_times_out(self):
+        job_queue = JobQueue(max_size=10, concurrency=1)
+        release = threading.Event()
+        job_queue.submit("workflow_job", release.wait, 5)
+        self.assertFalse(job_queue.shutdown(timeout=0.05))
+        release.set()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+import numpy as np
+from src.knowledge_base import RECORD, KnowledgeBase, simhash
+
+WINDOW = "\n".join(
+    [
+        "2024-05-21T18:04:11.1234567Z ##[group]Run pytest",
+        "collected 212 items",
+        "tests/test_app.py ....F....",
+        "def test_login(client):",
+        "    response = client.post('/login', data={'user': 'admin'})",
+        ">   assert response.status_code == 200",
+        "E   assert 302 == 200",
+        "FAILED tests/test_app.py::test_login - assert 302 == 200",
+        "2024-05-21T18:04:15.2000000Z ##[error]Process completed with exit code 1.",
+    ]
+)
+UNRELATED = "\n".join(
+    [
+        "##[group]Run npm ci",
+        "npm WARN deprecated inflight@1.0.6: This module is not supported",
+        "npm ERR! code ERESOLVE",
+        "npm ERR! ERESOLVE unable to resolve dependency tree",
+        "npm ERR! Found: react@18.2.0",
+        "npm ERR! Could not resolve dependency: peer react@17 from enzyme-adapter",
+        "##[error]Process completed with exit code 1.",
+    ]
+)
+
+
+class TestKnowledgeBase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.directory = os.path.join(self.tmp.name, "knowledge_base")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_simhash_is_close_for_close_windows(self):
+        rerun = WINDOW.replace("2024-05-21T18:04", "2024-06-02T09:31")
+        self.assertEqual(simhash(WINDOW), simhash(rerun))
+        variant = WINDOW + "\nwarning: coverage data not collected"
+        distance = bin(simhash(WINDOW) ^ simhash(variant)).count("1")
+        unrelated = bin(simhash(WINDOW) ^ simhash(UNRELATED)).count("1")
+        self.assertLess(distance, unrelated)
+        self.assertIsNone(simhash("  \n"))
+
+    def test_nearest_finds_recorded_windows(self):
+        knowledge_base = KnowledgeBase(self.directory)
+        self.assertEqual(knowledge_base.nearest(WINDOW), [])
+        login = knowledge_base.record(WINDOW, "The login test expects a 200")
+        knowledge_base.record(UNRELATED, "Peer dependency conflict")
+
+        matches = knowledge_base.nearest(WINDOW + "\nwarning: coverage not collected")
+        self.assertEqual(matches[0]["id"], login)
+        self.assertEqual(matches[0]["analysis"], "The login test expects a 200")
+        self.assertIn("assert 302 == 200", matches[0]["window"])
+        self.assertTrue(all(match["distance"] <= 12 for match in matches))
+        self.assertEqual(knowledge_base.nearest(WINDOW, max_distance=-1), [])
+        self.assertEqual(knowledge_base.stats()["entries"], 2)
+
+    def test_records_are_shared_between_instances(self):
+        writer = KnowledgeBase(self.directory)
+        reader = KnowledgeBase(self.directory)
+        self.assertEqual(reader.nearest(WINDOW), [])
+        writer.record(WINDOW, "analysis")
+        # the reader remaps the sketches once the file grew
+        self.assertEqual(reader.nearest(WINDOW)[0]["distance"], 0)
+
+    def test_torn_record_is_cut_off(self):
+        knowledge_base = KnowledgeBase(self.directory)
+        knowledge_base.record(UNRELATED, "Peer dependency conflict")
+        with open(knowledge_base.sketch_path, "ab") as f:
+            f.write(b"\x01\x02\x03")
+        self.assertEqual(knowledge_base.stats()["entries"], 1)
+        knowledge_base.record(WINDOW, "The login test expects a 200")
+        self.assertEqual(
+            os.path.getsize(knowledge_base.sketch_path), 2 * RECORD.itemsize
+        )
+        records = np.fromfile(knowledge_base.sketch_path, dtype=RECORD)
+        self.assertEqual(int(records["sketch"][1]), simhash(WINDOW))
+        self.assertEqual(
+            KnowledgeBase(self.directory).nearest(WINDOW)[0]["analysis"],
+            "The login test expects a 200",
+        )
+
+    def test_only_the_same_repository_answers(self):
+        knowledge_base = KnowledgeBase(self.directory)
+        knowledge_base.record(
+            WINDOW, "Fix tests/test_app.py in org/app", repo="org/app"
+        )
+        matches = knowledge_base.nearest(WINDOW)
+        self.assertEqual(matches[0]["repo"], "org/app")
+        self.assertEqual(knowledge_base.answer(matches, "org/app"), matches[0])
+        # another repository gets it as an example, not as its answer
+        self.assertIsNone(knowledge_base.answer(matches, "org/web"))
+        self.assertIsNone(knowledge_base.answer(matches, None))
+        self.assertIsNone(
+            knowledge_base.answer([{**matches[0], "distance": 9}], "org/app")
+        )
+        shared = KnowledgeBase(self.directory, shared=True)
+        self.assertEqual(shared.answer(matches, "org/web"), matches[0])
+
+    def test_base_without_repositories_is_migrated(self):
+        # a base recorded before entries had a repository
+        os.makedirs(self.directory)
+        conn = sqlite3.connect(os.path.join(self.directory, "entries.sqlite3"))
+        conn.execute(
+            "CREATE TABLE entries (id INTEGER PRIMARY KEY, window TEXT NOT NULL,"
+            " analysis TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        conn.commit()
+        conn.close()
+        knowledge_base = KnowledgeBase(self.directory)
+        knowledge_base.record(WINDOW, "analysis", repo="org/app")
+        self.assertEqual(knowledge_base.nearest(WINDOW)[0]["repo"], "org/app")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,15 +1,36 @@
+import asyncio
+import time
 import unittest
 from unittest.mock import patch, MagicMock
 from src.log_analyzer import (
+    aiter_log_lines,
+    extract_error_window_async,
     analyze_logs,
     fetch_logs,
+    fetch_error_window,
     extract_info_from_url,
     cleanup_logs,
+    analyze_error_window,
+    extract_error_window,
+    split_log_lines,
+    get_error_windows_async,
 )
+from src.token_budget import count_tokens
+
+
+def stream_response(chunks):
+    async def iter_content(chunk_size):
+        for chunk in chunks:
+            response.bytes_read += len(chunk)
+            yield chunk
+
+    response = MagicMock(status_code=200, encoding=None, bytes_read=0)
+    response.iter_content = iter_content
+    return response
 
 
 class TestLogAnalyzer(unittest.TestCase):
-    @patch("src.log_analyzer.requests.get")
+    @patch("src.log_analyzer.github_get")
     def test_fetch_logs(self, mock_get):
         mock_get.return_value.status_code = 200
         mock_get.return_value.text = "log content"
@@ -20,31 +41,166 @@ class TestLogAnalyzer(unittest.TestCase):
         logs = fetch_logs(repo_owner, repo_name, run_id, job_id)
         self.assertEqual(logs, "log content")
         mock_get.assert_called_once_with(
-            f"https://api.github.com/repos/{repo_owner}/{repo_name}/actions/jobs/{job_id}/logs",
-            headers={
-                "Authorization": "token None",
-                "Accept": "application/vnd.github.v3+json",
-            },
+            f"https://api.github.com/repos/{repo_owner}/{repo_name}/actions/jobs/{job_id}/logs"
         )
 
-    @patch("src.log_analyzer.fetch_logs")
-    @patch("openai.ChatCompletion.create")
-    def test_analyze_logs(self, mock_create, mock_fetch_logs):
-        mock_fetch_logs.return_value = "log content"
+    @patch("src.log_analyzer.github_get_async")
+    def test_fetch_error_window_streams_logs(self, mock_get):
+        mock_get.return_value = stream_response(
+            [
+                b"##[group]Run setup\nstep o",
+                b"utput\n##[gro",
+                b"up]Run tests\ntest output\n",
+                b"##[error]Process completed with exit code 1.\n##[group]Post job",
+            ]
+        )
+        window = fetch_error_window("owner", "repo", "1", "2", "http://example.com")
+        self.assertEqual(
+            window,
+            "##[group]Run tests\ntest output\n##[error]Process completed with exit code 1.",
+        )
+        mock_get.return_value.close.assert_called_once()
+
+    @patch("src.log_analyzer.fetch_error_window_async")
+    @patch("openai.ChatCompletion.acreate")
+    def test_analyze_logs(self, mock_create, mock_fetch_error_window):
+        mock_fetch_error_window.return_value = "log content"
         mock_create.return_value.choices = [
             MagicMock(message={"content": "analysis result"})
         ]
         logs_url = "https://github.com/ff14-advanced-market-search/saddlebag-with-pockets/actions/runs/9182309032/job/25250914650"
-        analysis = analyze_logs(logs_url)
+        analysis = analyze_logs(logs_url, None)
         self.assertEqual(analysis, "analysis result")
-        mock_fetch_logs.assert_called_once_with(
+        mock_fetch_error_window.assert_awaited_once_with(
             "ff14-advanced-market-search",
             "saddlebag-with-pockets",
             "9182309032",
             "25250914650",
+            logs_url,
         )
         mock_create.assert_called_once()
 
+    @patch.dict("os.environ", {"ENABLE_CODERABBIT": "true"})
+    @patch("src.log_analyzer.analysis_cache")
+    @patch("src.log_analyzer.ping_coderabbit_async")
+    @patch("src.log_analyzer.analyze_error_window_async")
+    def test_analyze_logs_pings_coderabbit_during_analysis(
+        self, mock_analyze, mock_ping, mock_cache
+    ):
+        async def analyze(logs, repo):
+            await asyncio.sleep(0.1)
+            return "analysis result"
+
+        async def ping(*args):
+            await asyncio.sleep(0.1)
+            return "http://example.com/pull/1#comment"
+
+        mock_analyze.side_effect = analyze
+        mock_ping.side_effect = ping
+        logs_url = "https://github.com/owner/repo/actions/runs/1/job/2"
+        start = time.monotonic()
+        analysis = analyze_logs(logs_url, "feature", "log content")
+        self.assertLess(time.monotonic() - start, 0.18)
+        self.assertTrue(analysis.startswith("analysis result\n\n[CodeRabbit"))
+        self.assertIn("http://example.com/pull/1#comment", analysis)
+
+        # a failed ping doesn't lose the analysis
+        mock_ping.side_effect = RuntimeError("404 Not Found")
+        self.assertEqual(
+            analyze_logs(logs_url, "feature", "log content"), "analysis result"
+        )
+
+    @patch("src.log_analyzer.analysis_cache")
+    @patch("openai.ChatCompletion.acreate")
+    def test_analyze_error_window_uses_cache(self, mock_create, mock_cache):
+        mock_cache.get.return_value = "cached analysis"
+        self.assertEqual(analyze_error_window("log content"), "cached analysis")
+        mock_create.assert_not_called()
+
+        mock_cache.get.return_value = None
+        mock_create.return_value.choices = [
+            MagicMock(message={"content": "analysis result"})
+        ]
+        self.assertEqual(analyze_error_window("log content"), "analysis result")
+        mock_cache.set.assert_called_once()
+        self.assertEqual(mock_cache.set.call_args[0][-1], "analysis result")
+
+    @patch("src.log_analyzer.knowledge_base")
+    @patch("src.log_analyzer.analysis_cache")
+    @patch("openai.ChatCompletion.acreate")
+    def test_analyze_error_window_recalls_similar_failures(
+        self, mock_create, mock_cache, mock_knowledge_base
+    ):
+        mock_cache.get.return_value = None
+        past = {"distance": 2, "window": "past window", "analysis": "past analysis"}
+        mock_knowledge_base.nearest.return_value = [past]
+        mock_knowledge_base.answer.return_value = past
+        self.assertTrue(
+            analyze_error_window("log content", "org/app").startswith("past analysis")
+        )
+        mock_knowledge_base.answer.assert_called_once_with([past], "org/app")
+        mock_create.assert_not_called()
+
+        # farther matches become examples ahead of the window
+        mock_knowledge_base.nearest.return_value = [{**past, "distance": 9}]
+        mock_knowledge_base.answer.return_value = None
+        mock_create.return_value.choices = [
+            MagicMock(message={"content": "analysis result"})
+        ]
+        self.assertEqual(
+            analyze_error_window("log content", "org/app"), "analysis result"
+        )
+        messages = mock_create.call_args.kwargs["messages"]
+        self.assertEqual(
+            [message["role"] for message in messages], ["user", "assistant", "user"]
+        )
+        self.assertIn("past window", messages[0]["content"])
+        self.assertEqual(messages[1]["content"], "past analysis")
+        self.assertIn("log content", messages[2]["content"])
+        mock_knowledge_base.record.assert_called_once()
+        self.assertEqual(mock_knowledge_base.record.call_args.kwargs["repo"], "org/app")
+        self.assertEqual(
+            mock_knowledge_base.record.call_args[0][:2],
+            ("log content", "analysis result"),
+        )
+
+    @patch("src.log_analyzer.LLM_TOKEN_BUDGET", 400)
+    @patch("src.log_analyzer.knowledge_base")
+    @patch("src.log_analyzer.analysis_cache")
+    @patch("openai.ChatCompletion.acreate")
+    def test_knowledge_base_examples_count_against_the_budget(
+        self, mock_create, mock_cache, mock_knowledge_base
+    ):
+        mock_cache.get.return_value = None
+        mock_knowledge_base.answer.return_value = None
+        example = {"distance": 8, "window": "error line\n" * 30, "analysis": "fix"}
+        big = {"distance": 9, "window": "error line\n" * 300, "analysis": "fix"}
+        mock_knowledge_base.nearest.return_value = [example, big]
+        mock_create.return_value.choices = [
+            MagicMock(message={"content": "analysis result"})
+        ]
+        analyze_error_window("test output\n" * 500 + "##[error]boom")
+        messages = mock_create.call_args.kwargs["messages"]
+        # the big example is left out and the window shrinks to what's left
+        self.assertEqual(len(messages), 3)
+        total = sum(count_tokens(message["content"]) for message in messages)
+        self.assertLessEqual(total, 400)
+        self.assertIn("##[error]boom", messages[-1]["content"])
+
+    @patch("src.log_analyzer.analysis_cache")
+    @patch("openai.ChatCompletion.acreate")
+    def test_analyze_error_window_skips_model_for_known_failures(
+        self, mock_create, mock_cache
+    ):
+        analysis = analyze_error_window(
+            "##[group]Run docker pull node:20\n"
+            "toomanyrequests: You have reached your pull rate limit.\n"
+            "##[error]Process completed with exit code 1."
+        )
+        self.assertIn("docker-pull-rate-limit", analysis)
+        mock_cache.get.assert_not_called()
+        mock_create.assert_not_called()
+
     def test_extract_info_from_url(self):
         url = "https://github.com/ff14-advanced-market-search/saddlebag-with-pockets/actions/runs/9182309032/job/25250914650"
         repo_owner, repo_name, run_id, job_id = extract_info_from_url(url)
@@ -70,6 +226,47 @@ class TestLogAnalyzer(unittest.TestCase):
         """
         self.assertEqual(cleaned_logs.strip(), expected_logs.strip())
 
+    @patch("src.log_analyzer.RUN_ARCHIVE_MIN_JOBS", 0)
+    @patch("src.log_analyzer.get_error_window_async")
+    def test_error_windows_survive_one_failed_download(self, mock_window):
+        mock_window.side_effect = [RuntimeError("connection reset"), "##[error]boom"]
+        run_url = "https://github.com/test/repo/actions/runs/5/job/"
+        windows = asyncio.run(
+            get_error_windows_async([(f"{run_url}1", "a"), (f"{run_url}2", "b")])
+        )
+        self.assertEqual(windows, [False, "##[error]boom"])
+        mock_window.side_effect = [RuntimeError("connection reset"), "##[error]boom"]
+        windows = asyncio.run(
+            get_error_windows_async(
+                [(f"{run_url}1", "a"), (f"{run_url}2", "b")], return_exceptions=True
+            )
+        )
+        self.assertIsInstance(windows[0], RuntimeError)
+
+    def test_streamed_window_matches_cleanup_logs(self):
+        logs = "prefix\r\n##[group]a\n\nline\n##[group]b\nmore\n\n##[error]boom\ntail\n"
+        for chunk_size in (1, 3, 7, 1024):
+            chunks = [
+                logs.encode()[i : i + chunk_size]
+                for i in range(0, len(logs), chunk_size)
+            ]
+            self.assertEqual(list(split_log_lines(chunks)), logs.split("\n"))
+            self.assertEqual(
+                extract_error_window(split_log_lines(chunks), "url"),
+                cleanup_logs(logs, "url"),
+            )
+            self.assertEqual(
+                asyncio.run(
+                    extract_error_window_async(
+                        aiter_log_lines(stream_response(chunks)), "url"
+                    )
+                ),
+                cleanup_logs(logs, "url"),
+            )
+
+    def test_extract_error_window_without_error(self):
+        self.assertFalse(extract_error_window(["##[group]a", "ok"], "url"))
+
 
 if __name__ == "__main__":
     unittest.main()
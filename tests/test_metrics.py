@@ -0,0 +1,76 @@
+import unittest
+from unittest.mock import MagicMock
+from src.metrics import Registry, record_llm_usage, LLM_TOKENS
+
+
+class TestMetrics(unittest.TestCase):
+    def test_counter_per_label_values(self):
+        registry = Registry()
+        retries = registry.counter("retries_total", "Retries.", ("reason",))
+        retries.inc("error")
+        retries.inc("status", amount=2)
+        retries.inc("error")
+        self.assertEqual(retries.value("error"), 2)
+        self.assertEqual(
+            registry.render(),
+            "# HELP retries_total Retries.\n"
+            "# TYPE retries_total counter\n"
+            'retries_total{reason="error"} 2\n'
+            'retries_total{reason="status"} 2\n',
+        )
+
+    def test_histogram_buckets_are_cumulative(self):
+        registry = Registry()
+        latency = registry.histogram(
+            "latency_seconds", "Latency.", ("stage",), buckets=(0.1, 1)
+        )
+        for value in (0.05, 0.1, 0.5, 3):
+            latency.observe(value, "fetch")
+        self.assertEqual(latency.count("fetch"), 4)
+        lines = registry.render().splitlines()
+        self.assertEqual(
+            lines[2:],
+            [
+                'latency_seconds_bucket{stage="fetch",le="0.1"} 2',
+                'latency_seconds_bucket{stage="fetch",le="1"} 3',
+                'latency_seconds_bucket{stage="fetch",le="+Inf"} 4',
+                'latency_seconds_sum{stage="fetch"} 3.65',
+                'latency_seconds_count{stage="fetch"} 4',
+            ],
+        )
+
+    def test_histogram_time(self):
+        registry = Registry()
+        latency = registry.histogram("latency_seconds", "Latency.")
+        with self.assertRaises(RuntimeError):
+            with latency.time():
+                raise RuntimeError("boom")
+        self.assertEqual(latency.count(), 1)
+
+    def test_label_values_are_escaped(self):
+        registry = Registry()
+        registry.counter("errors_total", "Errors.", ("message",)).inc('a "b"\\\n')
+        self.assertIn('errors_total{message="a \\"b\\"\\\\\\n"} 1', registry.render())
+
+    def test_gauge_and_duplicate_names(self):
+        registry = Registry()
+        registry.gauge("queue_depth", "Queued events.", lambda: 3)
+        self.assertTrue(registry.render().endswith("queue_depth 3\n"))
+        with self.assertRaises(ValueError):
+            registry.counter("queue_depth", "Queued events.")
+
+    def test_record_llm_usage(self):
+        response = MagicMock()
+        response.usage.prompt_tokens = 120
+        response.usage.completion_tokens = 30
+        before = LLM_TOKENS.value("test-model", "analysis", "prompt")
+        record_llm_usage(response, "test-model", "analysis")
+        record_llm_usage(MagicMock(usage=None), "test-model", "analysis")
+        self.assertEqual(
+            LLM_TOKENS.value("test-model", "analysis", "prompt") - before, 120
+        )
+        self.assertEqual(LLM_TOKENS.value("test-model", "analysis", "completion"), 30)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+import asyncio
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock
+from src.rate_limiter import RateLimitScheduler, INTERACTIVE, BATCH
+
+
+def make_response(status_code=200, headers=None):
+    response = MagicMock()
+    response.status_code = status_code
+    response.headers = headers or {}
+    return response
+
+
+class TestRateLimitScheduler(unittest.TestCase):
+    def test_token_bucket_paces_requests(self):
+        scheduler = RateLimitScheduler(rate=50, burst=2, batch_reserve=0)
+        start = time.monotonic()
+        for _ in range(4):
+            scheduler.acquire()
+        # two requests from the burst, two more at 50 requests per second
+        self.assertGreaterEqual(time.monotonic() - start, 0.03)
+        self.assertEqual(scheduler.stats()["requests"], 4)
+
+    def test_acquire_async_paces_requests(self):
+        scheduler = RateLimitScheduler(rate=50, burst=2, batch_reserve=0)
+
+        async def acquire_all():
+            await asyncio.gather(*(scheduler.acquire_async() for _ in range(4)))
+
+        start = time.monotonic()
+        asyncio.run(acquire_all())
+        self.assertGreaterEqual(time.monotonic() - start, 0.03)
+        stats = scheduler.stats()
+        self.assertEqual(stats["requests"], 4)
+        self.assertEqual(stats["waiting"][INTERACTIVE], 0)
+
+    def test_retry_after_blocks_callers(self):
+        scheduler = RateLimitScheduler(rate=100, burst=10, batch_reserve=0)
+        scheduler.update(make_response(403, {"Retry-After": "0.1"}), rate_limited=True)
+        waited = scheduler.acquire()
+        self.assertGreaterEqual(waited, 0.09)
+        self.assertEqual(scheduler.stats()["limited"], 1)
+
+    def test_batch_yields_reserve_to_interactive(self):
+        scheduler = RateLimitScheduler(rate=100, burst=10, batch_reserve=0.5)
+        scheduler.update(
+            make_response(
+                200,
+                {
+                    "X-RateLimit-Limit": "100",
+                    "X-RateLimit-Remaining": "10",
+                    "X-RateLimit-Reset": str(time.time() + 0.2),
+                },
+            )
+        )
+        start = time.monotonic()
+        scheduler.acquire(INTERACTIVE)
+        self.assertLess(time.monotonic() - start, 0.05)
+        scheduler.acquire(BATCH)
+        self.assertGreaterEqual(time.monotonic() - start, 0.15)
+
+    def test_interactive_goes_ahead_of_batch(self):
+        scheduler = RateLimitScheduler(rate=20, burst=1, batch_reserve=0)
+        scheduler.acquire()
+        order = []
+        batch = threading.Thread(
+            target=lambda: (scheduler.acquire(BATCH), order.append(BATCH))
+        )
+        batch.start()
+        time.sleep(0.01)
+        scheduler.acquire(INTERACTIVE)
+        order.append(INTERACTIVE)
+        batch.join(5)
+        self.assertEqual(order, [INTERACTIVE, BATCH])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime, timezone
+from reporting.report_state import ReportState
+
+PR = {"number": 3, "updated_at": "2024-05-21T18:04:11Z", "body": "Adds a cache"}
+COMMENTS = [{"id": 11, "updated_at": "2024-05-21T18:00:00Z"}]
+
+
+class TestReportState(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "report-state.sqlite3")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_validators_and_cursors_survive_restart(self):
+        state = ReportState(self.path)
+        state.set_validators("url?page=1", '"etag"', None, "[]")
+        state.set_cursor("repo", "2024-05-21T18:04:11Z")
+
+        reopened = ReportState(self.path)
+        self.assertEqual(reopened.get_validators("url?page=1"), ('"etag"', None, "[]"))
+        self.assertIsNone(reopened.get_validators("url?page=2"))
+        self.assertEqual(reopened.get_cursor("repo"), "2024-05-21T18:04:11Z")
+
+    def test_since_is_the_later_of_cursor_and_default(self):
+        state = ReportState(self.path)
+        day_ago = datetime(2024, 5, 21, 12, 0, tzinfo=timezone.utc)
+        self.assertEqual(state.since("repo", day_ago), day_ago)
+        state.set_cursor("repo", "2024-05-21T18:04:11Z")
+        self.assertEqual(
+            state.since("repo", day_ago),
+            datetime(2024, 5, 21, 18, 4, 11, tzinfo=timezone.utc),
+        )
+        later = datetime(2024, 5, 22, 12, 0, tzinfo=timezone.utc)
+        self.assertEqual(state.since("repo", later), later)
+
+    def test_pr_summary_reused_until_body_or_comments_change(self):
+        state = ReportState(self.path)
+        state.set_pr_summary("repo", PR, COMMENTS, "summary", ["insight"], {"bob"})
+        self.assertEqual(
+            state.get_pr_summary("repo", PR, COMMENTS),
+            ("summary", ["insight"], {"bob"}),
+        )
+        # labels and reviewers move updated_at, not the summaries
+        self.assertIsNotNone(
+            state.get_pr_summary(
+                "repo", {**PR, "updated_at": "2024-05-22T10:00:00Z"}, COMMENTS
+            )
+        )
+        self.assertIsNone(
+            state.get_pr_summary("repo", {**PR, "body": "Edited"}, COMMENTS)
+        )
+        self.assertIsNone(
+            state.get_pr_summary(
+                "repo",
+                PR,
+                COMMENTS + [{"id": 12, "updated_at": "2024-05-22T10:00:00Z"}],
+            )
+        )
+        edited = [{**COMMENTS[0], "updated_at": "2024-05-22T10:00:00Z"}]
+        self.assertIsNone(state.get_pr_summary("repo", PR, edited))
+        self.assertEqual(state.counters["reused_prs"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,118 @@
+import asyncio
+import io
+import os
+import tempfile
+import unittest
+import zipfile
+from unittest.mock import patch, AsyncMock, MagicMock
+from src.log_analyzer import get_error_windows_async
+from src.run_archive import RunArchive, RunArchiveCache
+
+RUN_URL = "https://github.com/owner/repo/actions/runs/5/job/"
+
+
+def make_archive():
+    # GitHub puts each job's full log at the top level and its steps in a folder
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr(
+            "0_test (3.11).txt",
+            "##[group]Run pytest\n" + "ok\n" * 50000 + "##[error]exit code 1\ntail\n",
+        )
+        archive.writestr("test (3.11)/1_Set up job.txt", "setup\n")
+        archive.writestr("1_lint.txt", "##[group]Run black\nall good\n")
+    return buffer.getvalue()
+
+
+def spool(data):
+    fd, path = tempfile.mkstemp(suffix=".zip")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    return path
+
+
+def archive_response(data):
+    async def iter_content(chunk_size):
+        for i in range(0, len(data), chunk_size):
+            await asyncio.sleep(0)
+            yield data[i : i + chunk_size]
+
+    response = MagicMock(status_code=200)
+    response.iter_content = iter_content
+    return response
+
+
+class TestRunArchive(unittest.TestCase):
+    def test_job_members_are_matched_by_name(self):
+        path = spool(make_archive())
+        archive = RunArchive(path)
+        self.assertFalse(os.path.exists(path))
+        with archive.open_job_log("test (3.11)") as stream:
+            self.assertTrue(stream.read(100).startswith(b"##[group]Run pytest"))
+        self.assertIsNotNone(archive.open_job_log("Lint"))
+        self.assertIsNone(archive.open_job_log("test (3.12)"))
+
+    def test_similar_job_names_keep_their_own_logs(self):
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w") as archive:
+            archive.writestr("0_test (3.1, a).txt", "first")
+            archive.writestr("1_test (3.1a).txt", "second")
+            archive.writestr("2_Lint.txt", "third")
+            archive.writestr("3_lint.txt", "fourth")
+            archive.writestr("4_deploy prod.txt", "fifth")
+        archive = RunArchive(spool(buffer.getvalue()))
+        for job_name, log in [
+            ("test (3.1, a)", b"first"),
+            ("test (3.1a)", b"second"),
+            ("Lint", b"third"),
+            ("lint", b"fourth"),
+            # characters file names can't hold are dropped from the member name
+            ("deploy: prod", b"fifth"),
+        ]:
+            with archive.open_job_log(job_name) as stream:
+                self.assertEqual(stream.read(), log)
+        self.assertIsNone(archive.open_job_log("test (3.1 a)"))
+        # two members fit and neither is exact, the job is fetched on its own
+        self.assertIsNone(archive.open_job_log("LINT"))
+
+    @patch("src.run_archive.github_get_async")
+    def test_concurrent_callers_share_one_download(self, mock_get):
+        mock_get.return_value = archive_response(make_archive())
+        cache = RunArchiveCache(ttl=60, max_entries=2, chunk_size=1024)
+
+        async def get_all():
+            return await asyncio.gather(
+                *(cache.get("owner", "repo", 5) for _ in range(5))
+            )
+
+        archives = asyncio.run(get_all())
+        self.assertEqual(mock_get.await_count, 1)
+        self.assertTrue(all(archive is archives[0] for archive in archives))
+        self.assertIs(asyncio.run(cache.get("owner", "repo", "5")), archives[0])
+        self.assertEqual(cache.stats()["downloads"], 1)
+        self.assertEqual(cache.stats()["hits"], 5)
+
+    @patch("src.log_analyzer.get_error_window_async")
+    @patch("src.log_analyzer.run_archives")
+    def test_error_windows_come_from_the_archive(self, mock_archives, mock_get_window):
+        mock_archives.get = AsyncMock(return_value=RunArchive(spool(make_archive())))
+        mock_get_window.return_value = "##[error]fetched on its own"
+        windows = asyncio.run(
+            get_error_windows_async(
+                [
+                    (f"{RUN_URL}1", "test (3.11)"),
+                    (f"{RUN_URL}2", "lint"),
+                    (f"{RUN_URL}3", "test (3.12)"),
+                ]
+            )
+        )
+        self.assertTrue(windows[0].startswith("##[group]Run pytest"))
+        self.assertTrue(windows[0].endswith("##[error]exit code 1"))
+        self.assertFalse(windows[1])
+        self.assertEqual(windows[2], "##[error]fetched on its own")
+        mock_get_window.assert_awaited_once_with(f"{RUN_URL}3")
+        mock_archives.get.assert_awaited_once_with("owner", "repo", "5")
+
+
+if __name__ == "__main__":
+    unittest.main()
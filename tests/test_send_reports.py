@@ -0,0 +1,344 @@
+import importlib.util
+import json
+import os
+import sys
+import tempfile
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+REPORTING = os.path.join(os.path.dirname(__file__), "..", "reporting")
+
+
+def load_send_reports(state_path):
+    # send-reports.py is a script: it reads its settings and opens its state on import
+    env = {
+        "GITHUB_TOKEN": "token",
+        "OPENAI_API_KEY": "key",
+        "SLACK_WEBHOOK": "http://slack.example.com",
+        "DISCORD_WEBHOOK_URL": "http://discord.example.com",
+        "MS_TEAMS_WEBHOOK": "http://teams.example.com",
+        "REPORT_STATE_PATH": state_path,
+    }
+    sys.path.insert(0, REPORTING)
+    try:
+        spec = importlib.util.spec_from_file_location(
+            "send_reports", os.path.join(REPORTING, "send-reports.py")
+        )
+        module = importlib.util.module_from_spec(spec)
+        with patch.dict("os.environ", env):
+            spec.loader.exec_module(module)
+    finally:
+        sys.path.remove(REPORTING)
+    return module
+
+
+def pull_request(number, **fields):
+    return {
+        "number": number,
+        "title": f"PR {number}",
+        "body": f"Body of {number}",
+        "state": "open",
+        "draft": False,
+        "merged_at": None,
+        "mergeable": True,
+        "html_url": f"https://github.com/org/app/pull/{number}",
+        "updated_at": "2024-05-21T18:04:11Z",
+        "requested_reviewers": [],
+        **fields,
+    }
+
+
+COMMENT = {
+    "id": 11,
+    "updated_at": "2024-05-21T18:00:00Z",
+    "user": {"login": "bob"},
+    "body": "Needs a test",
+}
+
+
+class TestSendReports(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.reports = load_send_reports(
+            os.path.join(self.tmp.name, "report-state.sqlite3")
+        )
+        self.pools = ThreadPoolExecutor(4), ThreadPoolExecutor(4)
+
+    def tearDown(self):
+        for pool in self.pools:
+            pool.shutdown()
+        self.reports.state.conn.close()
+        self.tmp.cleanup()
+
+    def build(self, pr):
+        return self.reports.build_pr_report("org", "app", pr, *self.pools)
+
+    def test_metadata_change_reuses_the_summaries(self):
+        with patch.object(
+            self.reports, "get_issue_comments", return_value=[COMMENT]
+        ), patch.object(
+            self.reports, "get_review_comments", return_value=[]
+        ), patch.object(
+            self.reports, "summarize_text", return_value="Adds a cache"
+        ) as summarize, patch.object(
+            self.reports,
+            "summarize_conversations",
+            return_value=(["bob asks for a test"], {"bob"}),
+        ) as conversations:
+            self.build(pull_request(3))
+            # a new label or reviewer moves updated_at and nothing else
+            section, _ = self.build(
+                pull_request(
+                    3,
+                    updated_at="2024-05-22T10:00:00Z",
+                    requested_reviewers=[{"login": "alice"}],
+                )
+            )
+            self.assertEqual(summarize.call_count, 1)
+            self.assertEqual(conversations.call_count, 1)
+            self.assertEqual(self.reports.state.counters["reused_prs"], 1)
+            summary = section["fields"][1]
+            self.assertTrue(summary["value"].startswith("Adds a cache"))
+
+            # a new comment is summarized again
+            with patch.object(
+                self.reports,
+                "get_review_comments",
+                return_value=[{**COMMENT, "id": 12, "body": "Done"}],
+            ):
+                self.build(pull_request(3, updated_at="2024-05-22T11:00:00Z"))
+            self.assertEqual(conversations.call_count, 2)
+
+    def test_cursor_waits_for_every_sink(self):
+        repos = [{"name": "app", "owner": {"login": "org"}}]
+        sent = {"messages": 1, "bytes": 10, "failed": 0}
+        with patch.object(
+            self.reports, "get_repositories", return_value=repos
+        ), patch.object(
+            self.reports, "get_pull_requests", return_value=[pull_request(3)]
+        ), patch.object(
+            self.reports,
+            "build_pr_report",
+            side_effect=lambda owner, repo, pr, *pools: (
+                {"updated_at": pr["updated_at"], "title": pr["title"]},
+                [],
+            ),
+        ), patch.object(
+            self.reports, "send_to_slack", return_value=sent
+        ), patch.object(
+            self.reports, "send_to_teams", return_value=sent
+        ), patch.object(
+            self.reports, "send_to_discord", return_value={**sent, "failed": 1}
+        ) as discord:
+            # Discord being down keeps the activity for the next run
+            self.reports.generate_report()
+            self.assertIsNone(self.reports.state.get_cursor("app"))
+            discord.return_value = sent
+            self.reports.generate_report()
+            self.assertEqual(
+                self.reports.state.get_cursor("app"), "2024-05-21T18:04:11Z"
+            )
+
+    def test_report_keeps_pr_order_whatever_finishes_first(self):
+        repos = [
+            {"name": name, "owner": {"login": "org"}} for name in ("api", "app", "web")
+        ]
+        prs = {
+            "api": [pull_request(1), pull_request(2), pull_request(3)],
+            "app": [],
+            "web": [pull_request(4)],
+        }
+
+        def summarize(text):
+            # the first PRs take the longest
+            time.sleep(0.05 * (5 - int(text.split()[-1])))
+            return f"Summary of {text.split()[-1]}"
+
+        sent = []
+
+        def send(report_name, report_sections):
+            sent.append((report_name, [section["url"] for section in report_sections]))
+            return {"messages": 1, "bytes": 10, "failed": 0}
+
+        with patch.object(
+            self.reports, "get_repositories", return_value=repos
+        ), patch.object(
+            self.reports,
+            "get_pull_requests",
+            side_effect=lambda owner, repo: prs[repo],
+        ), patch.object(
+            self.reports, "get_issue_comments", return_value=[COMMENT]
+        ), patch.object(
+            self.reports, "get_review_comments", return_value=[]
+        ), patch.object(
+            self.reports, "summarize_text", side_effect=summarize
+        ), patch.object(
+            self.reports,
+            "summarize_conversations",
+            return_value=(["bob asks for a test"], {"bob"}),
+        ), patch.object(
+            self.reports, "send_to_slack", side_effect=send
+        ), patch.object(
+            self.reports, "send_to_discord", return_value=None
+        ), patch.object(
+            self.reports, "send_to_teams", return_value=None
+        ):
+            start = time.monotonic()
+            self.reports.generate_report()
+            # the four summaries ran side by side
+            self.assertLess(time.monotonic() - start, 0.35)
+        self.assertEqual(
+            sent,
+            [
+                ("api", [pull_request(n)["html_url"] for n in (1, 2, 3)]),
+                ("web", [pull_request(4)["html_url"]]),
+            ],
+        )
+
+    def test_one_failed_sink_does_not_stop_the_others(self):
+        calls = []
+
+        def sender(sink, result):
+            def send(report_name, report_sections):
+                calls.append(sink)
+                if isinstance(result, Exception):
+                    raise result
+                return result
+
+            return send
+
+        with patch.object(
+            self.reports,
+            "send_to_discord",
+            sender("Discord", RuntimeError("connection reset")),
+        ), patch.object(
+            self.reports,
+            "send_to_slack",
+            sender("Slack", {"messages": 2, "bytes": 300, "failed": 0}),
+        ), patch.object(
+            self.reports,
+            "send_to_teams",
+            sender("Microsoft Teams", {"messages": 1, "bytes": 100, "failed": 1}),
+        ):
+            totals = {"Slack": {"messages": 1, "bytes": 50, "failed": 0}}
+            delivered = self.reports.dispatch_report("app", [], totals)
+        self.assertFalse(delivered)
+        self.assertEqual(sorted(calls), ["Discord", "Microsoft Teams", "Slack"])
+        self.assertEqual(
+            totals,
+            {
+                "Slack": {"messages": 3, "bytes": 350, "failed": 0},
+                "Microsoft Teams": {"messages": 1, "bytes": 100, "failed": 1},
+            },
+        )
+
+
+def report_section(number, summary="Adds a cache", insights="- bob asks for a test"):
+    return {
+        "repo": "app",
+        "updated_at": "2024-05-21T18:04:11Z",
+        "title": f"🟢 Open PR {number}",
+        "url": f"https://github.com/org/app/pull/{number}",
+        "color": 0x28A745,
+        "fields": [
+            {"name": "Blockers", "value": "Waiting for merge", "inline": False},
+            {"name": "Summary", "value": summary, "inline": False},
+            {
+                "name": "Conversations (Participants: bob)",
+                "value": insights,
+                "inline": False,
+            },
+        ],
+    }
+
+
+class TestSendReportsPacking(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.reports = load_send_reports(
+            os.path.join(cls.tmp.name, "report-state.sqlite3")
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.reports.state.conn.close()
+        cls.tmp.cleanup()
+
+    def test_slack_messages_keep_each_pr_whole(self):
+        sections = [report_section(n) for n in range(23)]
+        messages = self.reports.slack_messages(sections)
+        # five blocks a PR, so ten PRs a message
+        self.assertEqual([len(m["blocks"]) for m in messages], [50, 50, 15])
+        titles = []
+        for message in messages:
+            blocks = message["blocks"]
+            # header, summary, blockers, conversations and divider of each PR
+            self.assertEqual(len(blocks) % 5, 0)
+            self.assertTrue(all(b == {"type": "divider"} for b in blocks[4::5]))
+            titles += [block["text"]["text"] for block in blocks[::5]]
+        self.assertEqual(
+            titles,
+            [f"*<{section['url']}|{section['title']}>*" for section in sections],
+        )
+
+    def test_slack_cuts_an_oversized_text(self):
+        messages = self.reports.slack_messages([report_section(1, "x" * 5000)])
+        texts = [block["text"]["text"] for block in messages[0]["blocks"][:-1]]
+        self.assertTrue(all(len(text) <= 3000 for text in texts))
+        self.assertTrue(texts[1].startswith("*Summary:*\nxxx"))
+        self.assertTrue(texts[1].endswith("…"))
+
+    def test_discord_messages_stay_under_embed_and_character_limits(self):
+        sections = [
+            report_section(n, "s" * (100 + 40 * n), "- " + "i" * 300) for n in range(30)
+        ]
+        messages = self.reports.discord_messages(sections)
+        urls = []
+        for message in messages:
+            self.assertLessEqual(len(message["embeds"]), 10)
+            self.assertLessEqual(
+                sum(self.reports.discord_embed_size(e) for e in message["embeds"]),
+                6000,
+            )
+            urls += [embed["url"] for embed in message["embeds"]]
+        self.assertEqual(urls, [section["url"] for section in sections])
+        # the character limit splits them before the embed limit does
+        self.assertGreater(len(messages), 3)
+
+    def test_discord_cuts_an_oversized_section(self):
+        section = report_section(1, "s" * 5000, "- " + "i" * 5000)
+        messages = self.reports.discord_messages([report_section(0), section])
+        self.assertEqual(len(messages), 1)
+        embed = messages[0]["embeds"][1]
+        self.assertTrue(all(len(field["value"]) <= 1024 for field in embed["fields"]))
+        self.assertEqual(embed["fields"][0]["value"], "Waiting for merge")
+        self.assertLessEqual(self.reports.discord_embed_size(embed), 6000)
+
+    def test_teams_messages_stay_under_28kb(self):
+        sections = [report_section(n, "s" * 3000, "- " + "é" * 500) for n in range(40)]
+        messages = self.reports.teams_messages("app", sections)
+        titles = []
+        for message in messages:
+            self.assertLessEqual(len(json.dumps(message).encode("utf-8")), 28000)
+            titles += [section["activityTitle"] for section in message["sections"]]
+        self.assertEqual(len(titles), 40)
+        self.assertTrue(titles[0].endswith("(https://github.com/org/app/pull/0)"))
+        self.assertTrue(titles[-1].endswith("(https://github.com/org/app/pull/39)"))
+        self.assertGreater(len(messages), 1)
+
+    def test_teams_cuts_an_oversized_section(self):
+        section = report_section(1, "s" * 40000, "- " + "i" * 40000)
+        messages = self.reports.teams_messages("app", [report_section(0), section])
+        for message in messages:
+            self.assertLessEqual(len(json.dumps(message).encode("utf-8")), 28000)
+        sections = [s for message in messages for s in message["sections"]]
+        self.assertEqual(len(sections), 2)
+        self.assertTrue(sections[1]["text"].startswith("**Summary:** sss"))
+        self.assertEqual(sections[1]["facts"][0]["value"], "Waiting for merge")
+
+
+if __name__ == "__main__":
+    unittest.main()
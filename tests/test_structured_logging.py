@@ -0,0 +1,91 @@
+import asyncio
+import io
+import json
+import logging
+import queue
+import unittest
+from src.structured_logging import (
+    ContextQueueHandler,
+    JsonFormatter,
+    SamplingFilter,
+    bind,
+    configure_logging,
+    log_context,
+    stop_logging,
+)
+
+
+class TestStructuredLogging(unittest.TestCase):
+    def test_bind_nests_and_skips_none(self):
+        with bind(delivery_id="d-1", run_id=5):
+            with bind(job_id=7, run_id=None):
+                self.assertEqual(
+                    log_context.get(), {"delivery_id": "d-1", "run_id": 5, "job_id": 7}
+                )
+            self.assertEqual(log_context.get(), {"delivery_id": "d-1", "run_id": 5})
+        self.assertEqual(log_context.get(), {})
+
+    def test_context_follows_tasks_and_threads(self):
+        async def run():
+            with bind(delivery_id="d-1"):
+                return await asyncio.gather(
+                    asyncio.to_thread(log_context.get),
+                    asyncio.ensure_future(asyncio.sleep(0, log_context.get())),
+                )
+
+        self.assertEqual(asyncio.run(run()), [{"delivery_id": "d-1"}] * 2)
+
+    def test_json_record_has_context_extra_and_traceback(self):
+        records = queue.SimpleQueue()
+        logger = logging.getLogger("test_structured_logging")
+        logger.addHandler(ContextQueueHandler(records))
+        try:
+            with bind(delivery_id="d-1", job_id=7):
+                try:
+                    raise ValueError("boom")
+                except ValueError:
+                    logger.exception(
+                        "job %s failed", 7, extra={"payload": {"action": "completed"}}
+                    )
+        finally:
+            logger.handlers = []
+        entry = json.loads(JsonFormatter().format(records.get_nowait()))
+        self.assertEqual(entry["message"], "job 7 failed")
+        self.assertEqual(entry["level"], "ERROR")
+        self.assertEqual(entry["delivery_id"], "d-1")
+        self.assertEqual(entry["job_id"], 7)
+        self.assertEqual(entry["payload"], {"action": "completed"})
+        self.assertIn("ValueError: boom", entry["exc"])
+
+    def test_sampling_keeps_all_or_none_of_an_event(self):
+        sampler = SamplingFilter(0.5)
+        info = logging.makeLogRecord({"levelno": logging.INFO})
+        warning = logging.makeLogRecord({"levelno": logging.WARNING})
+        kept = 0
+        for delivery in range(200):
+            with bind(delivery_id=f"delivery-{delivery}"):
+                decisions = {sampler.filter(info) for _ in range(5)}
+                self.assertEqual(len(decisions), 1)
+                kept += decisions.pop()
+                self.assertTrue(sampler.filter(warning))
+        self.assertTrue(50 < kept < 150)
+
+    def test_configure_logging_writes_json_lines(self):
+        root = logging.getLogger()
+        handlers, level = root.handlers, root.level
+        stream = io.StringIO()
+        try:
+            configure_logging(level="DEBUG", stream=stream)
+            with bind(run_id=5):
+                logging.getLogger("webhook_handler").info("queued %s", "workflow_job")
+            stop_logging()
+        finally:
+            root.handlers, root.level = handlers, level
+        entry = json.loads(stream.getvalue())
+        self.assertEqual(entry["message"], "queued workflow_job")
+        self.assertEqual(entry["logger"], "webhook_handler")
+        self.assertEqual(entry["run_id"], 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
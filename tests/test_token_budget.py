@@ -0,0 +1,64 @@
+import unittest
+from unittest.mock import MagicMock
+from src.token_budget import (
+    collapse_repeats,
+    count_tokens,
+    map_reduce_window,
+    reduce_window,
+)
+
+WINDOW = "\n".join(
+    ["##[group]Run npm test"]
+    + [f"2024-05-21T18:04:{i % 60:02d}.0Z compiling module {i}" for i in range(2000)]
+    + [
+        "Error: Cannot find module 'left-pad'",
+        "##[error]Process completed with exit code 1.",
+    ]
+)
+
+
+class TestTokenBudget(unittest.TestCase):
+    def test_collapse_repeats(self):
+        lines = [
+            "2024-05-21T18:04:11.0Z retrying download",
+            "2024-05-21T18:04:12.0Z retrying download",
+            "2024-05-21T18:04:13.0Z retrying download",
+            "done",
+        ]
+        self.assertEqual(
+            collapse_repeats(lines),
+            [
+                "2024-05-21T18:04:11.0Z retrying download",
+                "... previous line repeated 2 more times",
+                "done",
+            ],
+        )
+
+    def test_small_window_is_unchanged(self):
+        logs = "##[group]Run tests\nok\n##[error]boom"
+        self.assertEqual(reduce_window(logs, 1000), logs)
+
+    def test_reduce_window_keeps_header_and_error(self):
+        reduced = reduce_window(WINDOW, 300)
+        self.assertLessEqual(count_tokens(reduced), 300)
+        lines = reduced.split("\n")
+        self.assertEqual(lines[0], "##[group]Run npm test")
+        self.assertIn("lines omitted", lines[1])
+        self.assertEqual(lines[-1], "##[error]Process completed with exit code 1.")
+        self.assertIn("Error: Cannot find module 'left-pad'", reduced)
+
+    def test_map_reduce_window_summarizes_head(self):
+        summarize_chunk = MagicMock(return_value="compiled modules")
+        reduced = map_reduce_window(
+            WINDOW, 600, summarize_chunk, chunk_budget=2000, max_workers=2
+        )
+        self.assertLessEqual(count_tokens(reduced), 600)
+        self.assertGreater(summarize_chunk.call_count, 1)
+        self.assertIn("Summary of earlier output:", reduced)
+        self.assertTrue(
+            reduced.endswith("##[error]Process completed with exit code 1.")
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,40 @@
+import hashlib
+import hmac
+import unittest
+from src.webhook_guard import RecentDeliveries, verify_signature
+
+
+def sign(secret, body):
+    return "sha256=" + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+class TestWebhookGuard(unittest.TestCase):
+    def test_verify_signature(self):
+        body = b'{"action": "completed"}'
+        self.assertTrue(verify_signature("secret", body, sign("secret", body)))
+        self.assertFalse(verify_signature("secret", body, sign("other", body)))
+        self.assertFalse(verify_signature("secret", body + b" ", sign("secret", body)))
+        self.assertFalse(verify_signature("secret", body, None))
+        self.assertFalse(
+            verify_signature("secret", body, sign("secret", body).replace("256", "1"))
+        )
+
+    def test_recent_deliveries_evicts_oldest(self):
+        deliveries = RecentDeliveries(2)
+        self.assertTrue(deliveries.add("a"))
+        self.assertTrue(deliveries.add("b"))
+        self.assertFalse(deliveries.add("a"))
+        self.assertTrue(deliveries.add("c"))
+        self.assertTrue(deliveries.add("a"))
+        self.assertEqual(deliveries.stats(), {"size": 2, "max_size": 2})
+
+    def test_discarded_delivery_is_let_through(self):
+        deliveries = RecentDeliveries(10)
+        deliveries.add("a")
+        deliveries.discard("a")
+        deliveries.discard("missing")
+        self.assertTrue(deliveries.add("a"))
+
+
+if __name__ == "__main__":
+    unittest.main()
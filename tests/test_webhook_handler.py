@@ -1,34 +1,485 @@
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import tempfile
 import unittest
 from unittest.mock import patch, MagicMock
 from flask import Flask
-from src.webhook_handler import webhook
+from src.conversation_store import ConversationStore
+from src.webhook_guard import RecentDeliveries
+from src.webhook_handler import (
+    webhook,
+    handle_failed_workflow,
+    handle_failed_jobs_async,
+    handle_failed_workflow_async,
+    process_issue_comment,
+    run_claimed_batch,
+    run_journaled,
+)
+
+FAILED_JOB_PAYLOAD = {
+    "action": "completed",
+    "workflow_job": {
+        "conclusion": "failure",
+        "name": "Test Workflow",
+        "html_url": "http://example.com/logs",
+        "head_branch": "feature",
+    },
+    "repository": {"full_name": "test/repo"},
+}
 
 
 class TestWebhookHandler(unittest.TestCase):
-    @patch("src.webhook_handler.request")
-    @patch("src.webhook_handler.create_github_issue")
-    @patch("src.webhook_handler.analyze_logs")
-    def test_webhook(self, mock_analyze_logs, mock_create_github_issue, mock_request):
+    @patch("src.webhook_handler.journal")
+    @patch("src.webhook_handler.job_queue")
+    def test_webhook(self, mock_job_queue, mock_journal):
         app = Flask(__name__)
+        mock_job_queue.submit.return_value = True
+        mock_journal.append.return_value = "delivery-1"
         with app.test_request_context(
             "/webhook",
-            json={
-                "action": "completed",
-                "workflow_run": {
-                    "conclusion": "failure",
-                    "name": "Test Workflow",
-                    "logs_url": "http://example.com/logs",
+            json=FAILED_JOB_PAYLOAD,
+            headers={"X-GitHub-Delivery": "delivery-1"},
+        ):
+            response = webhook()
+            self.assertEqual(response[1], 202)
+            mock_journal.append.assert_called_once_with(
+                "workflow_job", FAILED_JOB_PAYLOAD, "delivery-1"
+            )
+            mock_job_queue.submit.assert_called_once_with(
+                "workflow_job",
+                run_journaled,
+                "delivery-1",
+                handle_failed_workflow_async,
+                FAILED_JOB_PAYLOAD,
+            )
+
+    @patch("src.webhook_handler.journal")
+    @patch("src.webhook_handler.job_queue")
+    def test_webhook_queue_full(self, mock_job_queue, mock_journal):
+        app = Flask(__name__)
+        mock_job_queue.submit.return_value = False
+        mock_journal.append.return_value = "entry-1"
+        with app.test_request_context("/webhook", json=FAILED_JOB_PAYLOAD):
+            response = webhook()
+            self.assertEqual(response[1], 503)
+            mock_journal.finish.assert_called_once_with("entry-1", "rejected")
+
+    @patch("src.webhook_handler.journal")
+    @patch("src.webhook_handler.job_queue")
+    def test_webhook_answers_compactly(self, mock_job_queue, mock_journal):
+        app = Flask(__name__)
+        mock_job_queue.submit.return_value = True
+        mock_journal.append.return_value = "delivery-3"
+        payload = {
+            **FAILED_JOB_PAYLOAD,
+            "sender": {"login": "octocat"},
+            "workflow_job": {**FAILED_JOB_PAYLOAD["workflow_job"], "steps": []},
+        }
+        with app.test_request_context(
+            "/webhook",
+            json=payload,
+            headers={"X-GitHub-Event": "workflow_job", "X-GitHub-Delivery": "d-3"},
+        ):
+            response, status = webhook()
+        self.assertEqual(status, 202)
+        self.assertEqual(
+            response.json,
+            {"status": "queued", "event": "workflow_job", "delivery": "delivery-3"},
+        )
+        # only the fields the handlers use are journaled and queued
+        mock_journal.append.assert_called_once_with(
+            "workflow_job", FAILED_JOB_PAYLOAD, "d-3"
+        )
+
+        succeeded = {**payload, "workflow_job": {"conclusion": "success"}}
+        with app.test_request_context(
+            "/webhook",
+            json=succeeded,
+            headers={"X-GitHub-Event": "workflow_job", "X-GitHub-Delivery": "d-4"},
+        ):
+            response, status = webhook()
+        self.assertEqual(status, 200)
+        self.assertEqual(response.json["status"], "no action taken")
+        self.assertNotIn("data", response.json)
+        self.assertEqual(mock_journal.append.call_count, 1)
+
+    @patch("src.webhook_handler.journal")
+    @patch("src.webhook_handler.job_queue")
+    def test_webhook_ignores_unhandled_events(self, mock_job_queue, mock_journal):
+        app = Flask(__name__)
+        with app.test_request_context(
+            "/webhook", data="not json", headers={"X-GitHub-Event": "push"}
+        ):
+            response = webhook()
+            self.assertEqual(response[1], 200)
+            self.assertEqual(response[0].json["status"], "ignored")
+        mock_journal.append.assert_not_called()
+
+    @patch.dict("os.environ", {"GITHUB_WEBHOOK_SECRET": "secret"})
+    @patch("src.webhook_handler.journal")
+    @patch("src.webhook_handler.job_queue")
+    def test_webhook_signature(self, mock_job_queue, mock_journal):
+        app = Flask(__name__)
+        mock_job_queue.submit.return_value = True
+        mock_journal.append.return_value = "entry-1"
+        body = json.dumps(FAILED_JOB_PAYLOAD).encode()
+        signature = "sha256=" + hmac.new(b"secret", body, hashlib.sha256).hexdigest()
+        for header, status in (("sha256=0", 401), (signature, 202)):
+            with app.test_request_context(
+                "/webhook",
+                data=body,
+                content_type="application/json",
+                headers={
+                    "X-GitHub-Event": "workflow_job",
+                    "X-Hub-Signature-256": header,
                 },
-                "repository": {"full_name": "test/repo"},
-            },
+            ):
+                self.assertEqual(webhook()[1], status)
+        mock_journal.append.assert_called_once()
+
+    @patch("src.webhook_handler.recent_deliveries", RecentDeliveries(10))
+    @patch("src.webhook_handler.journal")
+    @patch("src.webhook_handler.job_queue")
+    def test_webhook_drops_redeliveries(self, mock_job_queue, mock_journal):
+        app = Flask(__name__)
+        mock_job_queue.submit.side_effect = [False, True]
+        mock_journal.append.return_value = "delivery-2"
+        statuses = []
+        for _ in range(3):
+            with app.test_request_context(
+                "/webhook",
+                json=FAILED_JOB_PAYLOAD,
+                headers={"X-GitHub-Delivery": "delivery-2"},
+            ):
+                statuses.append(webhook()[1])
+        # a delivery rejected while the queue was full is taken when redelivered
+        self.assertEqual(statuses, [503, 202, 200])
+        self.assertEqual(mock_journal.append.call_count, 2)
+
+    @patch("src.webhook_handler.recent_deliveries")
+    @patch("src.webhook_handler.work_queue")
+    @patch("src.webhook_handler.journal")
+    @patch("src.webhook_handler.job_queue")
+    def test_webhook_shares_events_across_replicas(
+        self, mock_job_queue, mock_journal, mock_work_queue, mock_recent_deliveries
+    ):
+        app = Flask(__name__)
+        # each delivery lands on a replica that hasn't seen it, the second one
+        # finds it on the shared queue already
+        mock_recent_deliveries.add.return_value = True
+        mock_work_queue.put.side_effect = [True, False]
+        statuses = []
+        for _ in range(2):
+            with app.test_request_context(
+                "/webhook",
+                json=FAILED_JOB_PAYLOAD,
+                headers={"X-GitHub-Delivery": "delivery-5"},
+            ):
+                statuses.append(webhook()[1])
+        self.assertEqual(statuses, [202, 200])
+        mock_work_queue.put.assert_called_with(
+            "delivery-5", "workflow_job", "test/repo", FAILED_JOB_PAYLOAD
+        )
+        mock_journal.append.assert_not_called()
+        mock_job_queue.submit.assert_not_called()
+
+    @patch("src.webhook_handler.consumer")
+    @patch("src.webhook_handler.work_queue")
+    @patch("src.webhook_handler.journal")
+    def test_run_claimed_batch(self, mock_journal, mock_work_queue, mock_consumer):
+        async def handler(data):
+            if data["n"] == 2:
+                raise RuntimeError("boom")
+            return {"status": "received"}, 500 if data["n"] == 1 else 200
+
+        events = [
+            {"id": f"delivery-{n}", "kind": "workflow_job", "payload": {"n": n}}
+            for n in range(3)
+        ]
+        with patch.dict(
+            "src.webhook_handler.EVENT_HANDLERS", {"workflow_job": handler}
         ):
+            asyncio.run(run_claimed_batch("test/repo", events))
+        self.assertEqual(
+            [call.args for call in mock_work_queue.finish.call_args_list],
+            [
+                ("delivery-0", "test/repo", "completed"),
+                ("delivery-1", "test/repo", "failed"),
+                ("delivery-2", "test/repo", "failed"),
+            ],
+        )
+        self.assertEqual(mock_journal.append.call_count, 3)
+        mock_consumer.done.assert_called_once_with("test/repo")
+
+    @patch("src.webhook_handler.consumer")
+    @patch("src.webhook_handler.work_queue")
+    @patch("src.webhook_handler.journal")
+    def test_run_claimed_batch_keeps_claim_order(
+        self, mock_journal, mock_work_queue, mock_consumer
+    ):
+        log = []
+
+        async def handler(data):
+            log.append(("start", data["n"]))
+            await asyncio.sleep(0.01)
+            log.append(("end", data["n"]))
+            return {"status": "received"}, 200
+
+        def job(n, run_id):
+            url = f"https://github.com/test/repo/actions/runs/{run_id}/job/{n}"
+            return {
+                "n": n,
+                "workflow_job": {"html_url": url},
+                "repository": {"full_name": "test/repo"},
+            }
+
+        payloads = [job(0, 5), job(1, 5), {"n": 2}, job(3, 5), job(4, 6)]
+        kinds = ["workflow_job", "workflow_job", "issue_comment"] + ["workflow_job"] * 2
+        events = [
+            {"id": f"delivery-{data['n']}", "kind": kind, "payload": data}
+            for kind, data in zip(kinds, payloads)
+        ]
+        handlers = {"workflow_job": handler, "issue_comment": handler}
+        with patch.dict("src.webhook_handler.EVENT_HANDLERS", handlers):
+            asyncio.run(run_claimed_batch("test/repo", events))
+        # only the jobs of run 5 claimed back to back run together
+        self.assertEqual(
+            log,
+            [("start", 0), ("start", 1), ("end", 0), ("end", 1)]
+            + [(step, n) for n in (2, 3, 4) for step in ("start", "end")],
+        )
+
+    @patch("src.webhook_handler.failure_index")
+    @patch("src.webhook_handler.get_error_windows_async")
+    @patch("src.webhook_handler.create_github_issue_async")
+    @patch("src.webhook_handler.analyze_logs_async")
+    def test_handle_failed_workflow(
+        self,
+        mock_analyze_logs,
+        mock_create_github_issue,
+        mock_get_error_window,
+        mock_failure_index,
+    ):
+        app = Flask(__name__)
+        with app.app_context():
+            mock_get_error_window.return_value = ["##[error]boom"]
+            mock_failure_index.lookup.return_value = None
             mock_analyze_logs.return_value = "Mock analysis"
-            response = webhook()
+            mock_create_github_issue.return_value = "http://example.com/issues/1"
+            response = handle_failed_workflow(FAILED_JOB_PAYLOAD)
             self.assertEqual(response[1], 200)
-            mock_analyze_logs.assert_called_once_with("http://example.com/logs")
+            mock_analyze_logs.assert_called_once_with(
+                "http://example.com/logs", "feature", "##[error]boom"
+            )
             mock_create_github_issue.assert_called_once_with(
                 "test/repo", "Test Workflow", "http://example.com/logs", "Mock analysis"
             )
+            mock_failure_index.record.assert_called_once()
+
+    @patch("src.webhook_handler.post_comment_to_github_async")
+    @patch("src.webhook_handler.is_issue_open_async")
+    @patch("src.webhook_handler.failure_index")
+    @patch("src.webhook_handler.get_error_windows_async")
+    @patch("src.webhook_handler.analyze_logs_async")
+    def test_handle_failed_workflow_duplicate(
+        self,
+        mock_analyze_logs,
+        mock_get_error_window,
+        mock_failure_index,
+        mock_is_issue_open,
+        mock_post_comment,
+    ):
+        app = Flask(__name__)
+        with app.app_context():
+            mock_get_error_window.return_value = ["##[error]boom"]
+            mock_failure_index.lookup.return_value = {
+                "issue_url": "http://example.com/issues/7",
+                "issue_number": 7,
+            }
+            mock_failure_index.seen_again.return_value = 3
+            mock_is_issue_open.return_value = True
+            mock_post_comment.return_value = "http://example.com/issues/7#comment"
+            response = handle_failed_workflow(FAILED_JOB_PAYLOAD)
+            self.assertEqual(response[1], 200)
+            self.assertEqual(response[0].json["status"], "duplicate")
+            mock_analyze_logs.assert_not_called()
+            args = mock_post_comment.call_args[0]
+            self.assertEqual(args[:3], ("test", "repo", 7))
+            self.assertIn("Seen 3 times", args[3])
+
+    @patch("src.webhook_handler.post_comment_to_github_async")
+    @patch("src.webhook_handler.respond_to_issue_comment_async")
+    def test_issue_comment_replies_carry_the_thread(self, mock_respond, mock_post):
+        comment = {
+            "issue": {"number": 7, "title": "CI failed", "body": "analysis"},
+            "comment": {"id": 1, "body": "@GitFailGuard why?"},
+            "repository": {
+                "full_name": "test/repo",
+                "name": "repo",
+                "owner": {"login": "test"},
+            },
+        }
+        mock_respond.side_effect = ["because", "retry"]
+        mock_post.return_value = "http://example.com/issues/7#comment"
+        with tempfile.TemporaryDirectory() as directory:
+            store = ConversationStore(os.path.join(directory, "conversations.sqlite3"))
+            with patch("src.webhook_handler.conversation_store", store):
+                process_issue_comment(comment)
+                comment["comment"]["body"] = "@GitFailGuard and now?"
+                process_issue_comment(comment)
+            conversation = mock_respond.call_args[0][3]
+            self.assertEqual(conversation["issue"], "analysis")
+            self.assertEqual(
+                [turn["content"] for turn in conversation["turns"]],
+                ["@GitFailGuard why?", "because"],
+            )
+            self.assertEqual(len(store.get("test/repo", 7)["turns"]), 4)
+
+    @patch("src.webhook_handler.failure_index")
+    @patch("src.webhook_handler.get_error_windows_async")
+    @patch("src.webhook_handler.create_run_issue_async")
+    @patch("src.webhook_handler.analyze_logs_async")
+    def test_matrix_run_gets_one_analysis_per_cause(
+        self,
+        mock_analyze_logs,
+        mock_create_run_issue,
+        mock_get_error_window,
+        mock_failure_index,
+    ):
+        run_url = "https://github.com/test/repo/actions/runs/5/job/"
+        events = [
+            {
+                "repository": {"full_name": "test/repo"},
+                "workflow_job": {
+                    "name": f"test ({version})",
+                    "workflow_name": "CI",
+                    "html_url": f"{run_url}{job_id}",
+                    "head_branch": "feature",
+                },
+            }
+            for job_id, version in enumerate(["3.9", "3.10", "3.11", "3.12"])
+        ]
+        windows = {
+            f"{run_url}0": "##[error]ImportError: no module named foo",
+            f"{run_url}1": "##[error]ImportError: no module named foo",
+            f"{run_url}2": "##[error]AssertionError in test_bar",
+            f"{run_url}3": False,
+        }
+        mock_get_error_window.side_effect = lambda jobs: [
+            windows[url] for url, _ in jobs
+        ]
+        mock_failure_index.lookup.return_value = None
+        mock_analyze_logs.return_value = "Mock analysis"
+        mock_create_run_issue.return_value = "http://example.com/issues/9"
+
+        results = asyncio.run(handle_failed_jobs_async(events))
+
+        mock_get_error_window.assert_awaited_once_with(
+            [
+                (f"{run_url}{job_id}", f"test ({version})")
+                for job_id, version in enumerate(["3.9", "3.10", "3.11", "3.12"])
+            ]
+        )
+        self.assertEqual(mock_analyze_logs.await_count, 2)
+        repo_name, run_name, causes = mock_create_run_issue.call_args[0]
+        self.assertEqual((repo_name, run_name), ("test/repo", "CI"))
+        self.assertEqual(
+            [[job["name"] for job in jobs] for jobs, _ in causes],
+            [["test (3.9)", "test (3.10)"], ["test (3.11)"]],
+        )
+        self.assertEqual([status for _, status in results], [200, 200, 200, 500])
+        self.assertEqual(results[0][0]["issue_url"], "http://example.com/issues/9")
+        self.assertEqual(mock_failure_index.record.call_count, 3)
+
+    @patch("src.webhook_handler.failure_index")
+    @patch("src.webhook_handler.get_error_windows_async")
+    @patch("src.webhook_handler.create_github_issue_async")
+    @patch("src.webhook_handler.analyze_logs_async")
+    def test_one_failed_analysis_still_opens_the_issue(
+        self,
+        mock_analyze_logs,
+        mock_create_github_issue,
+        mock_get_error_window,
+        mock_failure_index,
+    ):
+        run_url = "https://github.com/test/repo/actions/runs/5/job/"
+        events = [
+            {
+                "repository": {"full_name": "test/repo"},
+                "workflow_job": {
+                    "name": f"test {job_id}",
+                    "html_url": f"{run_url}{job_id}",
+                },
+            }
+            for job_id in (1, 2)
+        ]
+        mock_get_error_window.return_value = [
+            "##[error]ImportError: no module named foo",
+            "##[error]AssertionError in test_bar",
+        ]
+        mock_failure_index.lookup.return_value = None
+        mock_analyze_logs.side_effect = [RuntimeError("model timeout"), "Mock analysis"]
+        mock_create_github_issue.return_value = "http://example.com/issues/9"
+
+        results = asyncio.run(handle_failed_jobs_async(events))
+
+        mock_create_github_issue.assert_awaited_once_with(
+            "test/repo", "test 2", f"{run_url}2", "Mock analysis"
+        )
+        self.assertEqual([status for _, status in results], [500, 200])
+        self.assertEqual(results[1][0]["issue_url"], "http://example.com/issues/9")
+
+    @patch("src.webhook_handler.bind")
+    @patch("src.webhook_handler.journal")
+    def test_run_journaled_binds_correlation_ids(self, mock_journal, mock_bind):
+        async def handler(data):
+            return {"status": "received"}, 200
+
+        payload = {
+            **FAILED_JOB_PAYLOAD,
+            "workflow_job": {
+                **FAILED_JOB_PAYLOAD["workflow_job"],
+                "id": 7,
+                "run_id": 5,
+            },
+        }
+        asyncio.run(run_journaled("delivery-1", handler, payload))
+        mock_bind.assert_called_once_with(
+            delivery_id="delivery-1", repo="test/repo", run_id=5, job_id=7, issue=None
+        )
+        mock_journal.finish.assert_called_once_with("delivery-1", "completed")
+
+    @patch("src.webhook_handler.recent_deliveries", RecentDeliveries(10))
+    @patch("src.webhook_handler.journal")
+    @patch("src.webhook_handler.job_queue")
+    def test_webhook_takes_redeliveries_of_failed_events(
+        self, mock_job_queue, mock_journal
+    ):
+        async def handler(data):
+            raise RuntimeError("OpenAI is down")
+
+        app = Flask(__name__)
+        mock_job_queue.submit.return_value = True
+        mock_journal.append.return_value = "delivery-3"
+
+        def deliver():
+            with app.test_request_context(
+                "/webhook",
+                json=FAILED_JOB_PAYLOAD,
+                headers={"X-GitHub-Delivery": "delivery-3"},
+            ):
+                return webhook()[1]
+
+        self.assertEqual(deliver(), 202)
+        with self.assertRaises(RuntimeError):
+            asyncio.run(run_journaled("delivery-3", handler, FAILED_JOB_PAYLOAD))
+        mock_journal.finish.assert_called_once_with("delivery-3", "failed")
+        # redelivered by hand once the outage is over
+        self.assertEqual(deliver(), 202)
+        self.assertEqual(deliver(), 200)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,66 @@
+import json
+import os
+import unittest
+from src.webhook_payload import may_need_action, parse_event, project
+
+PAYLOAD_DIR = os.path.join(os.path.dirname(__file__), "..", "benchmarks", "payloads")
+
+
+def read_payload(name):
+    with open(os.path.join(PAYLOAD_DIR, name), "rb") as f:
+        return f.read()
+
+
+class TestWebhookPayload(unittest.TestCase):
+    def test_project_keeps_named_fields(self):
+        data = {"a": {"b": 1, "c": 2}, "d": [1], "e": 3}
+        self.assertEqual(
+            project(data, {"a": {"b": None}, "d": None, "missing": None}),
+            {"a": {"b": 1}, "d": [1]},
+        )
+        # a field spec'd as an object but sent as something else is kept as is
+        self.assertEqual(project({"a": None}, {"a": {"b": None}}), {"a": None})
+
+    def test_parse_workflow_job(self):
+        body = read_payload("workflow_job_failure.json")
+        data = parse_event("workflow_job", body)
+        full = json.loads(body)
+        self.assertEqual(
+            data["workflow_job"]["html_url"], full["workflow_job"]["html_url"]
+        )
+        self.assertEqual(
+            data["repository"], {"full_name": full["repository"]["full_name"]}
+        )
+        self.assertNotIn("steps", data["workflow_job"])
+        self.assertEqual(parse_event(None, body), data)
+
+    def test_parse_issue_comment(self):
+        body = read_payload("issue_comment.json")
+        data = parse_event("issue_comment", body)
+        self.assertEqual(set(data), {"action", "issue", "comment", "repository"})
+        self.assertIn("@GitFailGuard", data["comment"]["body"])
+        self.assertIn("login", data["repository"]["owner"])
+        self.assertEqual(parse_event(None, body), data)
+
+    def test_invalid_payloads(self):
+        for body in (b"not json", b"[1, 2]", b"\xff"):
+            with self.assertRaises(ValueError):
+                parse_event("workflow_job", body)
+
+    def test_may_need_action(self):
+        body = read_payload("workflow_job_failure.json")
+        self.assertTrue(may_need_action("workflow_job", body))
+        self.assertFalse(
+            may_need_action("workflow_job", body.replace(b'"failure"', b'"success"'))
+        )
+        self.assertTrue(
+            may_need_action("issue_comment", read_payload("issue_comment.json"))
+        )
+        self.assertFalse(
+            may_need_action("issue_comment", b'{"comment": {"body": "hi"}}')
+        )
+        self.assertTrue(may_need_action("ping", b"{}"))
+
+
+if __name__ == "__main__":
+    unittest.main()
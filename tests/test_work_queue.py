@@ -0,0 +1,309 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from src.work_queue import (
+    RELEASE_LEASE,
+    RENEW_LEASE,
+    RedisWorkQueue,
+    SqliteWorkQueue,
+    WorkQueueConsumer,
+)
+
+
+class FakeRedis:
+    """In-process stand-in for the Redis commands RedisWorkQueue uses."""
+
+    def __init__(self):
+        self.data = {}
+        self.expires = {}
+        self.lock = threading.RLock()
+
+    def _get(self, name, default=None):
+        if name in self.expires and self.expires[name] <= time.time():
+            del self.data[name], self.expires[name]
+        return self.data.get(name, default)
+
+    def set(self, name, value, nx=False, ex=None, px=None):
+        with self.lock:
+            if nx and self._get(name) is not None:
+                return None
+            self.data[name] = str(value)
+            self.expires.pop(name, None)
+            if ex or px:
+                self.expires[name] = time.time() + (ex if ex else px / 1000)
+            return True
+
+    def get(self, name):
+        with self.lock:
+            return self._get(name)
+
+    def delete(self, name):
+        with self.lock:
+            self.expires.pop(name, None)
+            return int(self.data.pop(name, None) is not None)
+
+    def pexpire(self, name, ms):
+        with self.lock:
+            if self._get(name) is None:
+                return False
+            self.expires[name] = time.time() + ms / 1000
+            return True
+
+    def hset(self, name, key, value):
+        with self.lock:
+            self.data.setdefault(name, {})[key] = value
+
+    def hmget(self, name, keys):
+        with self.lock:
+            return [self._get(name, {}).get(key) for key in keys]
+
+    def hdel(self, name, key):
+        with self.lock:
+            return int(self._get(name, {}).pop(key, None) is not None)
+
+    def hlen(self, name):
+        with self.lock:
+            return len(self._get(name, {}))
+
+    def rpush(self, name, value):
+        with self.lock:
+            values = self.data.setdefault(name, [])
+            values.append(value)
+            return len(values)
+
+    def lrange(self, name, start, end):
+        with self.lock:
+            return list(self._get(name, [])[start : end + 1])
+
+    def lindex(self, name, index):
+        with self.lock:
+            values = self._get(name, [])
+            return values[index] if index < len(values) else None
+
+    def lrem(self, name, count, value):
+        with self.lock:
+            values = self._get(name, [])
+            if value in values:
+                values.remove(value)
+                return 1
+            return 0
+
+    def zadd(self, name, mapping, nx=False):
+        with self.lock:
+            scores = self.data.setdefault(name, {})
+            added = 0
+            for member, score in mapping.items():
+                if nx and member in scores:
+                    continue
+                added += member not in scores
+                scores[member] = score
+            return added
+
+    def zrem(self, name, member):
+        with self.lock:
+            return int(self._get(name, {}).pop(member, None) is not None)
+
+    def zcard(self, name):
+        with self.lock:
+            return len(self._get(name, {}))
+
+    def zrangebyscore(self, name, low, high, start=0, num=None):
+        with self.lock:
+            low = float(low)
+            members = sorted(
+                (score, member)
+                for member, score in self._get(name, {}).items()
+                if low <= score <= high
+            )
+            members = [member for _, member in members][start:]
+            return members[:num] if num is not None else members
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+    def register_script(self, script):
+        # the lease scripts, run under the lock as Redis runs scripts atomically
+        def run(keys, args):
+            with self.lock:
+                if self._get(keys[0]) != args[0]:
+                    return 0
+                if script == RENEW_LEASE:
+                    return int(self.pexpire(keys[0], int(args[1])))
+                if script == RELEASE_LEASE:
+                    return self.delete(keys[0])
+                raise NotImplementedError(script)
+
+        return run
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.calls = []
+
+    def __getattr__(self, name):
+        def call(*args, **kwargs):
+            self.calls.append((getattr(self.client, name), args, kwargs))
+
+        return call
+
+    def execute(self):
+        with self.client.lock:
+            return [method(*args, **kwargs) for method, args, kwargs in self.calls]
+
+
+class WorkQueueTests:
+    def make_queue(self, **options):
+        raise NotImplementedError
+
+    def test_deliveries_are_queued_once(self):
+        work_queue = self.make_queue()
+        self.assertTrue(work_queue.put("d1", "workflow_job", "a/b", {"n": 1}))
+        self.assertFalse(work_queue.put("d1", "workflow_job", "a/b", {"n": 1}))
+        key, events = work_queue.claim("r1", 10)
+        self.assertEqual(key, "a/b")
+        self.assertEqual(
+            events, [{"id": "d1", "kind": "workflow_job", "payload": {"n": 1}}]
+        )
+        work_queue.finish("d1", key, "completed")
+        work_queue.release(key, "r1")
+        # still remembered once handled
+        self.assertFalse(work_queue.put("d1", "workflow_job", "a/b", {"n": 1}))
+        self.assertIsNone(work_queue.claim("r1", 10))
+
+    def test_a_leased_key_is_held_back_from_other_replicas(self):
+        work_queue = self.make_queue()
+        work_queue.put("d1", "workflow_job", "a/b", {"n": 1})
+        work_queue.put("d2", "workflow_job", "c/d", {"n": 2})
+        key, _ = work_queue.claim("r1", 10)
+        self.assertEqual(key, "a/b")
+        work_queue.put("d3", "workflow_job", "a/b", {"n": 3})
+        self.assertEqual(work_queue.claim("r2", 10)[0], "c/d")
+        self.assertIsNone(work_queue.claim("r3", 10))
+
+        work_queue.finish("d1", "a/b", "completed")
+        work_queue.release("a/b", "r1")
+        key, events = work_queue.claim("r3", 10)
+        self.assertEqual((key, [event["id"] for event in events]), ("a/b", ["d3"]))
+
+    def test_events_of_a_key_come_in_order(self):
+        work_queue = self.make_queue()
+        for i in range(5):
+            work_queue.put(f"d{i}", "workflow_job", "a/b", {"n": i})
+        _, events = work_queue.claim("r1", 3)
+        self.assertEqual([event["payload"]["n"] for event in events], [0, 1, 2])
+
+    def test_expired_lease_is_claimed_again(self):
+        work_queue = self.make_queue(lease=0.05)
+        work_queue.put("d1", "workflow_job", "a/b", {})
+        work_queue.claim("r1", 10)
+        self.assertTrue(work_queue.renew("a/b", "r1"))
+        self.assertFalse(work_queue.renew("a/b", "r2"))
+        time.sleep(0.1)
+        key, events = work_queue.claim("r2", 10)
+        self.assertEqual(events[0]["id"], "d1")
+        self.assertFalse(work_queue.renew("a/b", "r1"))
+        # nor can the previous owner release it
+        work_queue.release("a/b", "r1")
+        work_queue.put("d2", "workflow_job", "a/b", {})
+        self.assertIsNone(work_queue.claim("r3", 10))
+
+    def test_settle_holds_recent_events(self):
+        work_queue = self.make_queue(settle=0.1)
+        work_queue.put("d1", "workflow_job", "a/b", {})
+        self.assertIsNone(work_queue.claim("r1", 10))
+        time.sleep(0.15)
+        work_queue.put("d2", "workflow_job", "a/b", {})
+        _, events = work_queue.claim("r1", 10)
+        self.assertEqual([event["id"] for event in events], ["d1", "d2"])
+
+    def test_replicas_handle_each_event_once_in_order(self):
+        work_queue = self.make_queue()
+        for i in range(200):
+            work_queue.put(f"d{i}", "workflow_job", f"repo/{i % 7}", {"n": i})
+        handled = []
+        lock = threading.Lock()
+
+        def replica(name):
+            replica_queue = self.replica(work_queue)
+            while True:
+                claimed = replica_queue.claim(name, 4)
+                if claimed is None:
+                    return
+                key, events = claimed
+                for event in events:
+                    with lock:
+                        handled.append((key, event["payload"]["n"]))
+                    replica_queue.finish(event["id"], key, "completed")
+                replica_queue.release(key, name)
+
+        replicas = [threading.Thread(target=replica, args=(f"r{i}",)) for i in range(4)]
+        for thread in replicas:
+            thread.start()
+        for thread in replicas:
+            thread.join()
+        self.assertEqual(sorted(n for _, n in handled), list(range(200)))
+        for repo in range(7):
+            numbers = [n for key, n in handled if key == f"repo/{repo}"]
+            self.assertEqual(numbers, sorted(numbers))
+
+
+class TestSqliteWorkQueue(WorkQueueTests, unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "work_queue.sqlite3")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def make_queue(self, **options):
+        return SqliteWorkQueue(self.path, **options)
+
+    def replica(self, work_queue):
+        # a connection of its own, like another process
+        return SqliteWorkQueue(self.path)
+
+
+class TestRedisWorkQueue(WorkQueueTests, unittest.TestCase):
+    def make_queue(self, **options):
+        return RedisWorkQueue(FakeRedis(), **options)
+
+    def replica(self, work_queue):
+        return RedisWorkQueue(work_queue.client)
+
+
+class TestWorkQueueConsumer(unittest.TestCase):
+    def test_batches_are_dispatched_and_released(self):
+        work_queue = RedisWorkQueue(FakeRedis())
+        work_queue.put("d1", "workflow_job", "a/b", {})
+        work_queue.put("d2", "workflow_job", "c/d", {})
+        dispatched = []
+        refused = []
+        finished = threading.Event()
+
+        def dispatch(key, events):
+            if key == "c/d" and not refused:
+                refused.append(key)
+                return False
+            dispatched.append(key)
+            for event in events:
+                work_queue.finish(event["id"], key, "completed")
+            consumer.done(key)
+            if len(dispatched) == 2:
+                finished.set()
+            return True
+
+        consumer = WorkQueueConsumer(work_queue, dispatch, 2, poll_interval=0.01)
+        consumer.start()
+        self.assertTrue(finished.wait(2))
+        consumer.stop()
+        # a batch that couldn't be started is claimed again
+        self.assertEqual(sorted(dispatched), ["a/b", "c/d"])
+        self.assertEqual(consumer.stats()["held_keys"], 0)
+        self.assertEqual(work_queue.stats()["pending_events"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()